@@ -2,19 +2,80 @@ import type { ImportResult } from "../types/types";
 
 const GQL_ENDPOINT = "http://localhost:5010/graphql";
 
+// Automatic persisted queries: documents are sent as their SHA-256 and the
+// text only when the server does not know the hash yet. Queries go out as GET
+// so the browser can revalidate them against the response ETag.
+const hashes = new Map<string, Promise<string | null>>();
+
+function sha256Hex(text: string): Promise<string | null> {
+  let hash = hashes.get(text);
+  if (!hash) {
+    // crypto.subtle only exists in secure contexts (https, localhost).
+    hash = globalThis.crypto?.subtle
+      ? crypto.subtle
+          .digest("SHA-256", new TextEncoder().encode(text))
+          .then((buf) =>
+            Array.from(new Uint8Array(buf), (b) =>
+              b.toString(16).padStart(2, "0"),
+            ).join(""),
+          )
+      : Promise.resolve(null);
+    hashes.set(text, hash);
+  }
+  return hash;
+}
+
+const isQuery = (query: string) => /^\s*(query\b|\{)/.test(query);
+
+async function send(
+  body: { query?: string; variables: Record<string, any>; extensions?: object },
+  get: boolean,
+  signal?: AbortSignal,
+): Promise<any> {
+  let res: Response;
+  if (get) {
+    const params = new URLSearchParams({
+      variables: JSON.stringify(body.variables),
+      extensions: JSON.stringify(body.extensions),
+    });
+    res = await fetch(`${GQL_ENDPOINT}?${params}`, {
+      method: "GET",
+      headers: { Accept: "application/json" },
+      credentials: "include",
+      signal,
+    });
+  } else {
+    res = await fetch(GQL_ENDPOINT, {
+      method: "POST",
+      headers: { "Content-Type": "application/json", Accept: "application/json" },
+      body: JSON.stringify(body),
+      credentials: "include",
+      signal,
+    });
+  }
+  return res.json();
+}
+
 export async function gql<T>(
   query: string,
   variables: Record<string, any>,
   opts?: { signal?: AbortSignal },
 ): Promise<T> {
-  const res = await fetch(GQL_ENDPOINT, {
-    method: "POST",
-    headers: { "Content-Type": "application/json", Accept: "application/json" },
-    body: JSON.stringify({ query, variables }),
-    credentials: "include",
-    signal: opts?.signal,
-  });
-  const json = await res.json();
+  const hash = await sha256Hex(query);
+  let json: any;
+  if (hash) {
+    const extensions = { persistedQuery: { version: 1, sha256Hash: hash } };
+    json = await send({ variables, extensions }, isQuery(query), opts?.signal);
+    if (
+      json.errors?.some(
+        (e: any) => e.extensions?.code === "PERSISTED_QUERY_NOT_FOUND",
+      )
+    ) {
+      json = await send({ query, variables, extensions }, false, opts?.signal);
+    }
+  } else {
+    json = await send({ query, variables }, false, opts?.signal);
+  }
   if (json.errors) {
     throw new Error(json.errors.map((e: any) => e.message).join(" | "));
   }
@@ -0,0 +1,143 @@
+"""ASGI entry point (uvicorn app.asgi:app): GraphQL reads on the async pool."""
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from strawberry.asgi import GraphQL
+from strawberry.types.unset import UNSET
+from app.config.db.connection import close_async_pool, init_async_pool, init_pool, ping_async
+from app.config.db_setup import settings
+from app.models.async_schema import async_schema
+from app.service.bulk_load import start_restore
+from app.service.csv_import import ImportLimitExceeded, import_sales_csv_async
+from app.service.import_rejects import aiter_rejects_csv
+from app.service.metrics import CONTENT_TYPE, render as render_metrics
+from app.service.persisted_queries import (
+    PersistedQueryError, body_etag, cache_control, etag_matches, resolve_persisted_query,
+)
+from app.service.sales_export import aiter_sales_csv, filter_from_args
+from app.service.upload_stream import (
+    AsyncRequestBody, StreamBusy, check_content_length, stream_options, stream_slot,
+)
+
+
+class PersistedGraphQL(GraphQL):
+    """GraphQL app taking persisted queries, with Cache-Control and ETag on GET query results."""
+
+    async def execute_single(self, request, request_adapter, sub_response, context, root_value, request_data):
+        try:
+            request_data = resolve_persisted_query(request_data)
+        except PersistedQueryError as e:
+            return e.result()
+        result = await super().execute_single(
+            request=request, request_adapter=request_adapter, sub_response=sub_response,
+            context=context, root_value=root_value, request_data=request_data,
+        )
+        if request_adapter.method == "GET" and not result.errors:
+            sub_response.headers["Cache-Control"] = cache_control()
+        return result
+
+    async def run(self, request, context=UNSET, root_value=UNSET):
+        if isinstance(request, Request) and request.method == "POST":
+            # Before Starlette spools a multipart upload that is too large.
+            try:
+                check_content_length(request.headers.get("content-length"))
+            except ImportLimitExceeded as e:
+                return JSONResponse({"error": str(e)}, status_code=413)
+        response = await super().run(request, context, root_value)
+        if isinstance(request, Request) and request.method == "GET" and "cache-control" in response.headers:
+            etag = body_etag(response.body)
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers={"ETag": f'"{etag}"', "Cache-Control": cache_control()})
+            response.headers["ETag"] = f'"{etag}"'
+        return response
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    init_pool()
+    start_restore()  # indexes an interrupted bulk load left dropped
+    await init_async_pool()
+    try:
+        yield
+    finally:
+        await close_async_pool()
+
+
+async def health_check(request: Request) -> JSONResponse:
+    ok = await ping_async()
+    return JSONResponse({"status": "ok" if ok else "degraded", "db": ok}, status_code=200 if ok else 503)
+
+
+async def metrics(request: Request) -> Response:
+    return Response(render_metrics(), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def export_rejects(request: Request):
+    source = request.query_params.get("source")
+    if not source:
+        return JSONResponse({"error": "source is required"}, status_code=400)
+    import_id = request.query_params.get("importId") or None
+    return StreamingResponse(
+        aiter_rejects_csv(source, import_id),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="rejects-{import_id or "all"}.csv"'},
+    )
+
+
+async def import_stream(request: Request):
+    try:
+        source, options = stream_options(request.query_params)
+        options.pop("workers", None)  # async imports COPY over one stream
+        check_content_length(request.headers.get("content-length"))
+        with stream_slot():
+            result = await import_sales_csv_async(
+                AsyncRequestBody(request.stream(), request.headers.get("content-type")), source, **options,
+                max_bytes=settings.upload_max_bytes, max_rows=settings.upload_max_rows,
+            )
+    except ImportLimitExceeded as e:
+        return JSONResponse({"error": str(e)}, status_code=413)
+    except StreamBusy as e:
+        return JSONResponse({"error": str(e)}, status_code=503, headers={"Retry-After": "10"})
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse(result)
+
+
+async def export_sales(request: Request):
+    args = request.query_params
+    try:
+        filter = filter_from_args(args)
+    except ValueError:
+        return JSONResponse({"error": "minProfit and maxProfit must be numbers"}, status_code=400)
+    compress = args.get("gzip", "").lower() in ("1", "true", "yes")
+    return StreamingResponse(
+        aiter_sales_csv(filter, args.get("direction", "DESC"), compress),
+        media_type="application/gzip" if compress else "text/csv",
+        headers={"Content-Disposition": f'attachment; filename="sales.csv{".gz" if compress else ""}"'},
+    )
+
+
+app = Starlette(
+    routes=[
+        Route("/health", health_check),
+        Route("/imports/rejects.csv", export_rejects),
+        Route("/imports/stream", import_stream, methods=["POST"]),
+        Route("/sales/export.csv", export_sales),
+        Route("/graphql", PersistedGraphQL(async_schema, graphql_ide="graphiql", multipart_uploads_enabled=True)),
+    ] + ([Route("/metrics", metrics)] if settings.metrics_enabled else []),
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=[settings.allowed_origin],
+            allow_credentials=True,
+            allow_headers=["Content-Type", "Accept"],
+            allow_methods=["GET", "POST", "OPTIONS"],
+            max_age=86400,
+        ),
+    ],
+    lifespan=lifespan,
+)
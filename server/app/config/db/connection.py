@@ -1,26 +1,55 @@
-from contextlib import contextmanager
-from typing import Iterator, Optional
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
 from ..db_setup import settings
 import logging
 import time
-from psycopg_pool import ConnectionPool
+from psycopg_pool import AsyncConnectionPool, ConnectionPool, PoolTimeout
 import psycopg
+from app.service.metrics import POOL_CHECKOUT_SECONDS, READ_ROUTES, AsyncTimedCursor, TimedCursor
 
 log = logging.getLogger("app.db")
 
+# _pool and _async_pool are the write pools, always on the primary. The read
+# pools serve get_read_cursor / get_async_read_cursor from the replica when
+# one is configured, else from the primary with connections of their own.
 _pool: Optional[ConnectionPool] = None
+_async_pool: Optional[AsyncConnectionPool] = None
+_read_pool: Optional[ConnectionPool] = None
+_async_read_pool: Optional[AsyncConnectionPool] = None
 _READY: bool = False
 _LAST_ERROR: Optional[Exception] = None
 
-def init_pool(min_size: int = 1, max_size: int = 10, *, wait_timeout_sec: int = 30) -> None:
-    global _pool
+# time.monotonic() deadlines: reads stay on the primary until _primary_until
+# (read-your-writes) and skip a failed replica until _replica_down_until.
+_primary_until: float = 0.0
+_replica_down_until: float = 0.0
+
+def init_pool(min_size: Optional[int] = None, max_size: Optional[int] = None, *, wait_timeout_sec: int = 30) -> None:
+    global _pool, _read_pool
     if _pool is None:
         _pool = ConnectionPool(
             conninfo=settings.database_url,
-            min_size=min_size,
-            max_size=max_size,
+            min_size=min_size or settings.pool_min_size,
+            max_size=max_size or settings.pool_max_size,
+            kwargs={"cursor_factory": TimedCursor} if settings.metrics_enabled else None,
         )
         wait_until_ready(timeout_sec=wait_timeout_sec, interval_sec=1.0)
+    if _read_pool is None:
+        # Not waited for: a replica that is down only sends reads to the primary.
+        _read_pool = ConnectionPool(
+            conninfo=settings.replica_database_url or settings.database_url,
+            min_size=settings.read_pool_min_size,
+            max_size=settings.read_pool_max_size,
+            kwargs={"cursor_factory": TimedCursor} if settings.metrics_enabled else None,
+            check=ConnectionPool.check_connection if settings.replica_database_url else None,
+        )
+        if settings.replica_database_url:
+            log.info("Reads routed to replica %s:%s", settings.replica_db_host, settings.replica_db_port)
+
+
+def pool_max_size() -> int:
+    """Connections the write pool may open (settings.pool_max_size before init_pool)."""
+    return _pool.max_size if _pool is not None else settings.pool_max_size
 
 
 def wait_until_ready(*, timeout_sec: int = 30, interval_sec: float = 1.0) -> bool:
@@ -51,7 +80,9 @@ def wait_until_ready(*, timeout_sec: int = 30, interval_sec: float = 1.0) -> boo
 def get_cursor() -> Iterator[psycopg.Cursor]:
     if _pool is None:
         raise RuntimeError("DB pool not initialized")
+    t0 = time.perf_counter()
     with _pool.connection() as conn:
+        POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - t0, "sync")
         with conn.cursor() as cur:
             try:
                 yield cur
@@ -60,6 +91,60 @@ def get_cursor() -> Iterator[psycopg.Cursor]:
                 conn.rollback()
                 raise
 
+def pin_reads_to_primary(seconds: Optional[float] = None) -> None:
+    """Send this process's reads to the primary for ``seconds`` (default read_your_writes_sec) after a write."""
+    global _primary_until
+    until = time.monotonic() + (settings.read_your_writes_sec if seconds is None else seconds)
+    _primary_until = max(_primary_until, until)
+
+def _read_route() -> str:
+    """Where the next read goes: the read pool ("read" / "replica") or the primary."""
+    if not settings.replica_database_url:
+        return "read"
+    now = time.monotonic()
+    if now < _primary_until:
+        return "primary_pinned"
+    if now < _replica_down_until:
+        return "primary_replica_down"
+    return "replica"
+
+def _replica_failed(e: Exception) -> None:
+    global _replica_down_until
+    _replica_down_until = time.monotonic() + settings.replica_retry_sec
+    READ_ROUTES.inc(1, "primary_fallback")
+    log.warning("Replica unavailable, reading from the primary for %.0fs: %r", settings.replica_retry_sec, e)
+
+@contextmanager
+def get_read_cursor() -> Iterator[psycopg.Cursor]:
+    """get_cursor for read-only work: the read pool unless reads are pinned or the replica is down."""
+    route = _read_route()
+    if _read_pool is not None and route in ("read", "replica"):
+        replica, conn = route == "replica", None
+        try:
+            t0 = time.perf_counter()
+            with _read_pool.connection(timeout=settings.replica_timeout_sec if replica else None) as conn:
+                POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - t0, "sync_read")
+                READ_ROUTES.inc(1, route)
+                with conn.cursor() as cur:
+                    try:
+                        yield cur
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+            return
+        except (PoolTimeout, psycopg.OperationalError) as e:
+            # A query error on a healthy connection (e.g. a timeout) is not the replica's fault.
+            if not replica or (conn is not None and not conn.broken):
+                raise
+            _replica_failed(e)
+            if conn is not None:
+                raise
+    else:
+        READ_ROUTES.inc(1, route)
+    with get_cursor() as cur:
+        yield cur
+
 def ping() -> bool:
     try:
         with get_cursor() as cur:
@@ -68,3 +153,94 @@ def ping() -> bool:
         return True
     except Exception:
         return False
+
+
+# Async pool for the ASGI entry point (app.asgi). Opened and closed by its
+# lifespan, inside the event loop that uses it.
+async def init_async_pool(min_size: int = 1, max_size: Optional[int] = None, *, wait_timeout_sec: int = 30) -> None:
+    global _async_pool, _async_read_pool
+    if _async_read_pool is None:
+        read_pool = AsyncConnectionPool(
+            conninfo=settings.replica_database_url or settings.database_url,
+            min_size=settings.read_pool_min_size,
+            max_size=settings.async_read_pool_max_size,
+            kwargs={"cursor_factory": AsyncTimedCursor} if settings.metrics_enabled else None,
+            check=AsyncConnectionPool.check_connection if settings.replica_database_url else None,
+            open=False,
+        )
+        await read_pool.open(wait=False)
+        _async_read_pool = read_pool
+    if _async_pool is None:
+        pool = AsyncConnectionPool(
+            conninfo=settings.database_url,
+            min_size=min_size,
+            max_size=max_size or settings.async_pool_max_size,
+            kwargs={"cursor_factory": AsyncTimedCursor} if settings.metrics_enabled else None,
+            open=False,
+        )
+        await pool.open(wait=True, timeout=wait_timeout_sec)
+        _async_pool = pool
+
+async def close_async_pool() -> None:
+    global _async_pool, _async_read_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+    if _async_read_pool is not None:
+        await _async_read_pool.close()
+        _async_read_pool = None
+
+@asynccontextmanager
+async def get_async_cursor() -> AsyncIterator[psycopg.AsyncCursor]:
+    if _async_pool is None:
+        raise RuntimeError("Async DB pool not initialized")
+    t0 = time.perf_counter()
+    async with _async_pool.connection() as conn:
+        POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - t0, "async")
+        async with conn.cursor() as cur:
+            try:
+                yield cur
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
+@asynccontextmanager
+async def get_async_read_cursor() -> AsyncIterator[psycopg.AsyncCursor]:
+    """get_read_cursor on the async pools."""
+    route = _read_route()
+    if _async_read_pool is not None and route in ("read", "replica"):
+        replica, conn = route == "replica", None
+        try:
+            t0 = time.perf_counter()
+            async with _async_read_pool.connection(timeout=settings.replica_timeout_sec if replica else None) as conn:
+                POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - t0, "async_read")
+                READ_ROUTES.inc(1, route)
+                async with conn.cursor() as cur:
+                    try:
+                        yield cur
+                        await conn.commit()
+                    except Exception:
+                        await conn.rollback()
+                        raise
+            return
+        except (PoolTimeout, psycopg.OperationalError) as e:
+            # A query error on a healthy connection (e.g. a timeout) is not the replica's fault.
+            if not replica or (conn is not None and not conn.broken):
+                raise
+            _replica_failed(e)
+            if conn is not None:
+                raise
+    else:
+        READ_ROUTES.inc(1, route)
+    async with get_async_cursor() as cur:
+        yield cur
+
+async def ping_async() -> bool:
+    try:
+        async with get_async_cursor() as cur:
+            await cur.execute("SELECT 1")
+            await cur.fetchone()
+        return True
+    except Exception:
+        return False
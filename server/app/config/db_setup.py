@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 from urllib.parse import quote_plus
 
 @dataclass(frozen=True)
@@ -10,11 +11,94 @@ class Settings:
     db_user: str = "sabata"
     db_password: str = "apptest"
 
+    # Connections per server process in the write pool (imports, the ledger,
+    # reads pinned to the primary) and in the read pool the read-only
+    # resolvers use, so heavy imports do not starve salesPage.
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+    read_pool_min_size: int = 1
+    read_pool_max_size: int = 10
+
+    # Read replica behind the read pool (None = the primary). Reads stay on the
+    # primary read_your_writes_sec after an import; a replica that times out
+    # is skipped for replica_retry_sec.
+    replica_db_host: Optional[str] = None
+    replica_db_port: int = 5432
+    read_your_writes_sec: float = 5.0
+    replica_timeout_sec: float = 1.0
+    replica_retry_sec: float = 10.0
+
+    # Number of pooled connections a single import COPYs over in parallel.
+    import_workers: int = 1
+
+    # Background import jobs: concurrent imports (streaming chunked uploads
+    # run on threads of their own and do not count), finished jobs kept for
+    # polling, and where uploads are spooled (None = system temp dir).
+    import_job_workers: int = 2
+    import_job_history: int = 100
+    spool_dir: Optional[str] = None
+
+    # maintenance_work_mem for the index rebuilds at the end of a bulk load
+    # (import with bulk_load=True; see app.service.bulk_load).
+    bulk_load_maintenance_work_mem: str = "1GB"
+
+    # Create sales range-partitioned by month of order_date (new databases;
+    # existing ones: python -m app.service.sales_partitions migrate).
+    sales_partitioned: bool = False
+
+    # In-process cache for salesPage / salesById results, per query kind.
+    # Imports invalidate it; the TTL bounds staleness across server processes.
+    query_cache_entries: int = 1024
+    query_cache_ttl_sec: float = 30.0
+
+    # salesPage(page:) with a filter the checkpoints do not cover (see
+    # app.service.sales_checkpoints) falls back to OFFSET up to this many rows.
+    page_jump_max_offset: int = 10_000
+
+    # GraphQL endpoint: parsed and validated documents kept per query text,
+    # persisted query texts kept per SHA-256 (clients resend the text when
+    # the hash is unknown), and the max-age of GET query responses, which
+    # carry an ETag either way (0 = revalidate every time).
+    graphql_document_cache_entries: int = 256
+    persisted_query_entries: int = 1024
+    graphql_get_max_age_sec: int = 0
+
+    # Chunked uploads: largest accepted chunk, how long an unfinished session
+    # is kept, and how long a streaming import waits for the next chunk.
+    upload_chunk_max_bytes: int = 64 << 20
+    upload_session_ttl_sec: float = 24 * 3600.0
+    upload_stream_idle_sec: float = 300.0
+
+    # Limits on every upload, not on local imports (None = no limit), and
+    # concurrent POST /imports/stream requests before it answers 503.
+    upload_max_bytes: Optional[int] = 4 << 30
+    upload_max_rows: Optional[int] = None
+    upload_stream_max_concurrent: int = 4
+
+    # Connections in the async pools used by the ASGI server (app.asgi).
+    async_pool_max_size: int = 50
+    async_read_pool_max_size: int = 50
+
+    # Serve /metrics and time SQL statements and root GraphQL resolvers.
+    metrics_enabled: bool = True
+
+    # Browser origin allowed to call /graphql and /imports/stream (CORS), on
+    # both the Flask and the ASGI server.
+    allowed_origin: str = "http://localhost:5173"
+
     @property
     def database_url(self) -> str:
         user = quote_plus(self.db_user)
         pwd  = quote_plus(self.db_password)
         return f"postgresql://{user}:{pwd}@{self.db_host}:{self.db_port}/{self.db_name}"
 
+    @property
+    def replica_database_url(self) -> Optional[str]:
+        if not self.replica_db_host:
+            return None
+        user = quote_plus(self.db_user)
+        pwd  = quote_plus(self.db_password)
+        return f"postgresql://{user}:{pwd}@{self.replica_db_host}:{self.replica_db_port}/{self.db_name}"
+
 settings = Settings()
 
@@ -1,28 +1,54 @@
-from flask import Flask, jsonify, request, make_response
+from flask import Flask, Response, jsonify, request, make_response
 from flask_cors import CORS, cross_origin
 from strawberry.flask.views import GraphQLView
+from werkzeug.exceptions import RequestEntityTooLarge
 from app.config.db.connection import init_pool, ping
+from app.config.db_setup import settings
 from app.models.schema import schema 
+from app.service.bulk_load import start_restore
+from app.service.csv_import import ImportLimitExceeded, import_sales_csv_detailed
+from app.service.import_rejects import iter_rejects_csv
+from app.service.metrics import CONTENT_TYPE, render as render_metrics
+from app.service.persisted_queries import PersistedQueryError, body_etag, cache_control, resolve_persisted_query
+from app.service.sales_export import filter_from_args, iter_sales_csv
+from app.service.upload_stream import RequestBody, StreamBusy, check_content_length, stream_options, stream_slot
 
 
-ALLOWED_ORIGIN = "http://localhost:5173"
+class PersistedGraphQLView(GraphQLView):
+    """GraphQLView taking persisted queries, with Cache-Control on GET query results."""
+
+    def execute_single(self, request, request_adapter, sub_response, context, root_value, request_data):
+        try:
+            request_data = resolve_persisted_query(request_data)
+        except PersistedQueryError as e:
+            return e.result()
+        result = super().execute_single(
+            request=request, request_adapter=request_adapter, sub_response=sub_response,
+            context=context, root_value=root_value, request_data=request_data,
+        )
+        if request_adapter.method == "GET" and not result.errors:
+            sub_response.headers["Cache-Control"] = cache_control()
+        return result
 
 def create_app():
     app = Flask(__name__)
+    # Werkzeug answers 413 to larger bodies, multipart GraphQL uploads included.
+    app.config["MAX_CONTENT_LENGTH"] = settings.upload_max_bytes
 
     CORS(
         app,
-        resources={r"/graphql": {"origins": [ALLOWED_ORIGIN]}},
+        resources={r"/graphql": {"origins": [settings.allowed_origin]}, r"/imports/stream": {"origins": [settings.allowed_origin]}},
         supports_credentials=True,
         allow_headers=["Content-Type", "Accept"],
         methods=["GET", "POST", "OPTIONS"],
     )
 
     init_pool()
+    start_restore()  # indexes an interrupted bulk load left dropped
 
     app.add_url_rule(
         "/graphql",
-        view_func=GraphQLView.as_view(
+        view_func=PersistedGraphQLView.as_view(
             "graphql_view",
             schema=schema,
             graphiql=True,
@@ -35,7 +61,7 @@ def create_app():
     def _graphql_preflight():
         if request.method == "OPTIONS" and request.path == "/graphql":
             resp = make_response("", 204)
-            resp.headers["Access-Control-Allow-Origin"] = ALLOWED_ORIGIN
+            resp.headers["Access-Control-Allow-Origin"] = settings.allowed_origin
             resp.headers["Vary"] = "Origin"
             resp.headers["Access-Control-Allow-Credentials"] = "true"
             resp.headers["Access-Control-Allow-Methods"] = "GET,POST,OPTIONS"
@@ -50,9 +76,12 @@ def create_app():
     @app.after_request
     def _cors_headers(resp):
         if request.path == "/graphql":
-            resp.headers.setdefault("Access-Control-Allow-Origin", ALLOWED_ORIGIN)
+            resp.headers.setdefault("Access-Control-Allow-Origin", settings.allowed_origin)
             resp.headers.setdefault("Vary", "Origin")
             resp.headers.setdefault("Access-Control-Allow-Credentials", "true")
+            if request.method == "GET" and "Cache-Control" in resp.headers:
+                resp.set_etag(body_etag(resp.get_data()))
+                resp = resp.make_conditional(request)  # 304 when If-None-Match matches
         return resp
 
     @app.get("/health")
@@ -60,5 +89,59 @@ def create_app():
         ok = ping()
         return jsonify(status=("ok" if ok else "degraded"), db=ok), (200 if ok else 503)
 
+    if settings.metrics_enabled:
+        @app.get("/metrics")
+        def metrics():
+            return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+    @app.get("/imports/rejects.csv")
+    def export_rejects():
+        source = request.args.get("source")
+        if not source:
+            return jsonify(error="source is required"), 400
+        import_id = request.args.get("importId") or None
+        return Response(
+            iter_rejects_csv(source, import_id),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="rejects-{import_id or "all"}.csv"'},
+        )
+
+    @app.post("/imports/stream")
+    def import_stream():
+        # Reads request.stream and never request.form, so the body is not buffered.
+        try:
+            source, options = stream_options(request.args)
+            check_content_length(request.content_length)
+            with stream_slot():
+                result = import_sales_csv_detailed(
+                    RequestBody(request.stream, request.content_type), source, **options,
+                    max_bytes=settings.upload_max_bytes, max_rows=settings.upload_max_rows,
+                )
+        except ImportLimitExceeded as e:
+            return jsonify(error=str(e)), 413
+        except RequestEntityTooLarge:
+            # A chunked body over MAX_CONTENT_LENGTH, cut off by Werkzeug.
+            return jsonify(error=f"Upload exceeds {settings.upload_max_bytes} bytes"), 413
+        except StreamBusy as e:
+            return jsonify(error=str(e)), 503, {"Retry-After": "10"}
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        return jsonify(result)
+
+    @app.get("/sales/export.csv")
+    def export_sales():
+        # Query parameters mirror the GraphQL SalesFilter fields.
+        args = request.args
+        try:
+            filter = filter_from_args(args)
+        except ValueError:
+            return jsonify(error="minProfit and maxProfit must be numbers"), 400
+        compress = args.get("gzip", "").lower() in ("1", "true", "yes")
+        return Response(
+            iter_sales_csv(filter, args.get("direction", "DESC"), compress),
+            mimetype="application/gzip" if compress else "text/csv",
+            headers={"Content-Disposition": f'attachment; filename="sales.csv{".gz" if compress else ""}"'},
+        )
+
     return app
 
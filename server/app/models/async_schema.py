@@ -0,0 +1,163 @@
+"""Schema served by app.asgi: ``schema`` with async resolvers on the async pool."""
+from __future__ import annotations
+import asyncio
+import strawberry
+from typing import List, Optional
+from strawberry.dataloader import DataLoader
+from strawberry.file_uploads import Upload
+from ..config.db.connection import get_async_cursor, ping_async
+from ..config.db_setup import settings
+from ..service.csv_import import import_sales_csv_async
+from ..service.sales_query import cached_sales_by_id, cached_sales_by_ids_async, cached_sales_page_async
+from ..service.sales_checkpoints import sales_page_cursor, sales_total_count
+from ..service.sales_summary import query_sales_summary
+from ..service.import_rejects import query_import_rejects
+from ..service.import_ledger import query_import_history
+from ..service import chunked_upload, import_jobs
+from .schema import (
+    ImportJob, ImportLedgerConnection, ImportLedgerEdge, ImportLedgerEntry, ImportRejectConnection, ImportRejectEdge, ImportReject, ImportResult, Long, Mutation, PageInfo, Query,
+    SCHEMA_EXTENSIONS, Sales, SalesConnection, SalesFilter, SalesSummaryFilter, SalesSummaryRow, SortDirection,
+    SummaryDimension, UploadSession,
+    _import_result, _sales_edge, _sales_node, _selected, _wants_total,
+)
+
+LOADER_KEY = "sales_dataloader"
+
+
+async def _load_sales(keys: List[int]) -> List[Optional[dict]]:
+    rows = await cached_sales_by_ids_async(keys)
+    return [rows.get(k) for k in keys]
+
+def _loader(info: strawberry.Info) -> DataLoader:
+    # One loader per request: every salesById / salesByIds key resolved in the
+    # same tick is fetched with a single query.
+    ctx = info.context
+    loader = ctx.get(LOADER_KEY)
+    if loader is None:
+        loader = ctx[LOADER_KEY] = DataLoader(load_fn=_load_sales)
+    return loader
+
+
+@strawberry.type(name="Query")
+class AsyncQuery(Query):
+    @strawberry.field
+    async def db_status(self) -> bool:
+        return await ping_async()
+
+    @strawberry.field
+    async def db_version(self) -> str:
+        async with get_async_cursor() as cur:
+            await cur.execute("SELECT version()")
+            (ver,) = await cur.fetchone()
+            return ver
+
+    @strawberry.field
+    async def sales_page(self, info: strawberry.Info, first: int = 50, after: Optional[str] = None,
+                         filter: Optional[SalesFilter] = None,
+                         direction: SortDirection = SortDirection.DESC,
+                         page: Optional[int] = None) -> SalesConnection:
+        f = {**vars(filter), "search_mode": filter.search_mode.value} if filter else None
+        fields = _selected([sel for f_ in info.selected_fields for sel in f_.selections], ("edges", "node"))
+        if page is not None:
+            if after:
+                raise ValueError("Pass either page or after, not both")
+            after = await asyncio.to_thread(sales_page_cursor, page, first, f, direction.value)
+        payload = await cached_sales_page_async(first, after, f, direction.value, fields, _sales_node, _sales_edge)
+        pi = PageInfo(end_cursor=payload["pageInfo"]["endCursor"], has_next_page=payload["pageInfo"]["hasNextPage"])
+        total, exact = await asyncio.to_thread(sales_total_count, f) if _wants_total(info) else (None, None)
+        return SalesConnection(edges=payload["edges"], page_info=pi, total_count=total, total_count_exact=exact)
+
+    @strawberry.field
+    async def sales_by_id(self, info: strawberry.Info, order_id: strawberry.ID,
+                          order_date: Optional[str] = None) -> Optional[Sales]:
+        if order_date:
+            row = await asyncio.to_thread(cached_sales_by_id, int(order_id), order_date)
+            return Sales(**row) if row else None
+        row = await _loader(info).load(int(order_id))
+        return Sales(**row) if row else None
+
+    @strawberry.field
+    async def sales_by_ids(self, info: strawberry.Info, ids: List[strawberry.ID]) -> List[Optional[Sales]]:
+        rows = await _loader(info).load_many([int(i) for i in ids])
+        return [Sales(**r) if r else None for r in rows]
+
+    @strawberry.field
+    async def sales_summary(self, group_by: List[SummaryDimension],
+                            filter: Optional[SalesSummaryFilter] = None) -> List[SalesSummaryRow]:
+        rows = await asyncio.to_thread(
+            query_sales_summary, [d.value for d in group_by], vars(filter) if filter else None
+        )
+        return [SalesSummaryRow(**r) for r in rows]
+
+    @strawberry.field
+    async def import_history(self, first: int = 50, after: Optional[str] = None,
+                             source: Optional[str] = None) -> ImportLedgerConnection:
+        payload = await asyncio.to_thread(query_import_history, first, after, source)
+        edges = [ImportLedgerEdge(cursor=e["cursor"], node=ImportLedgerEntry(**e["node"])) for e in payload["edges"]]
+        pi = PageInfo(end_cursor=payload["pageInfo"]["endCursor"], has_next_page=payload["pageInfo"]["hasNextPage"])
+        return ImportLedgerConnection(edges=edges, page_info=pi)
+
+    @strawberry.field
+    async def import_rejects(self, source: str, first: int = 100, after: Optional[str] = None,
+                             import_id: Optional[str] = None) -> ImportRejectConnection:
+        payload = await asyncio.to_thread(query_import_rejects, source, first, after, import_id)
+        edges = [ImportRejectEdge(cursor=e["cursor"], node=ImportReject(**e["node"])) for e in payload["edges"]]
+        pi = PageInfo(end_cursor=payload["pageInfo"]["endCursor"], has_next_page=payload["pageInfo"]["hasNextPage"])
+        return ImportRejectConnection(edges=edges, page_info=pi)
+
+
+@strawberry.type(name="Mutation")
+class AsyncMutation(Mutation):
+    @strawberry.mutation
+    async def import_sales(
+        self,
+        file: Upload,
+        source: str,
+        update_on_conflict: bool = False,
+        workers: Optional[int] = None,  # accepted for compatibility; async imports use one stream
+        force: bool = False,
+        bulk_load: bool = False,
+    ) -> ImportResult:
+        result = await import_sales_csv_async(
+            file,
+            source,
+            update_on_conflict=update_on_conflict,
+            speed_optimize=True,
+            force=force,
+            bulk_load=bulk_load,
+            max_bytes=settings.upload_max_bytes,
+            max_rows=settings.upload_max_rows,
+        )
+        return _import_result(result)
+
+    @strawberry.mutation
+    async def submit_import(
+        self,
+        file: Upload,
+        source: str,
+        update_on_conflict: bool = False,
+        workers: Optional[int] = None,
+        force: bool = False,
+        bulk_load: bool = False,
+    ) -> ImportJob:
+        # Spooling the upload to disk is blocking file I/O.
+        job = await asyncio.to_thread(
+            import_jobs.submit_import, file, source, update_on_conflict=update_on_conflict, workers=workers,
+            force=force, bulk_load=bulk_load,
+        )
+        return ImportJob.from_job(job)
+
+    @strawberry.mutation
+    async def append_upload_chunk(self, upload_id: strawberry.ID, offset: Long, chunk: Upload, sha256: str) -> UploadSession:
+        data = await chunk.read(settings.upload_chunk_max_bytes + 1)
+        session = await asyncio.to_thread(chunked_upload.append_chunk, str(upload_id), offset, data, sha256)
+        return UploadSession.from_session(session)
+
+    @strawberry.mutation
+    async def finalize_upload(self, upload_id: strawberry.ID, sha256: Optional[str] = None) -> ImportJob:
+        # Hashes the spooled file when the session was resumed after a restart.
+        job = await asyncio.to_thread(chunked_upload.finalize_upload, str(upload_id), sha256)
+        return ImportJob.from_job(job)
+
+
+async_schema = strawberry.Schema(query=AsyncQuery, mutation=AsyncMutation, extensions=SCHEMA_EXTENSIONS)
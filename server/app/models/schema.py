@@ -1,22 +1,152 @@
 from __future__ import annotations
 import strawberry
-from typing import Optional, List
+from typing import NewType, Optional, List
 from enum import Enum
 from strawberry.file_uploads import Upload
+from strawberry.types.nodes import SelectedField
+from strawberry.utils.str_converters import to_camel_case
 from ..config.db.connection import get_cursor, ping
+from ..config.db_setup import settings
 from ..service.csv_import import import_sales_csv_detailed
-from ..service.sales_query import query_sales_page, get_sales_by_id
+from ..service.sales_query import SALES_FIELDS, cached_sales_by_id, cached_sales_page
+from ..service.sales_checkpoints import sales_page_cursor, sales_total_count
+from ..service.sales_loader import get_loader
+from ..service.cache import cache_stats
+from ..service import chunked_upload, import_jobs
+from ..service.import_rejects import query_import_rejects
+from ..service.import_ledger import query_import_history
+from ..service.sales_summary import query_sales_summary
+from ..service.metrics import ResolverMetrics
+from ..service.persisted_queries import DocumentCache
+
+# Byte offsets and row counts of multi-GB uploads do not fit GraphQL's 32-bit Int.
+Long = strawberry.scalar(NewType("Long", int), serialize=int, parse_value=int,
+                         description="64-bit integer (byte offsets, sizes and row counts)")
+
+@strawberry.type
+class ImportPhase:
+    # read, decode, copy, dedupe, validate, insert, commit, and for bulk loads
+    # indexes and analyze (metrics.IMPORT_PHASES)
+    name: str
+    duration_ms: float
 
 @strawberry.type
 class ImportResult:
-    inserted: int
-    skipped_conflicts: int
-    dup_in_file: int
-    invalid_rows: int
-    total_rows: int
+    inserted: Long
+    skipped_conflicts: Long
+    dup_in_file: Long
+    invalid_rows: Long
+    total_rows: Long
     duration_ms: float
     source: str
     update_mode: str
+    import_id: Optional[str] = None
+    # True when identical bytes were imported before and this is that result.
+    deduplicated: bool = False
+    # Where this call's wall time went; phases that did not run are left out.
+    phases: List[ImportPhase] = strawberry.field(default_factory=list)
+    # Resident memory of the server process at its highest during the import,
+    # and how far that is above where it started (null where not measurable).
+    peak_rss_bytes: Optional[Long] = None
+    rss_growth_bytes: Optional[Long] = None
+
+
+def _import_result(result: dict) -> ImportResult:
+    return ImportResult(
+        inserted=result["inserted"],
+        skipped_conflicts=result["skipped_conflicts"],
+        dup_in_file=result["dup_in_file"],
+        invalid_rows=result["invalid_rows"],
+        total_rows=result["total_rows"],
+        duration_ms=result["duration_ms"],
+        source=result["source"],
+        update_mode=result["update_mode"],
+        import_id=result.get("import_id"),
+        deduplicated=result.get("deduplicated", False),
+        phases=[ImportPhase(name=k, duration_ms=v) for k, v in result.get("phases_ms", {}).items()],
+        peak_rss_bytes=result.get("peak_rss_bytes"),
+        rss_growth_bytes=result.get("rss_growth_bytes"),
+    )
+
+
+@strawberry.enum
+class ImportJobStatus(Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
+
+
+@strawberry.type
+class ImportJob:
+    id: strawberry.ID
+    source: str
+    status: ImportJobStatus
+    phase: str
+    bytes_total: Long
+    bytes_copied: Long
+    rows_staged: Long
+    rows_inserted: Long
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    error: Optional[str]
+    result: Optional[ImportResult]
+
+    @staticmethod
+    def from_job(job: import_jobs.ImportJob) -> "ImportJob":
+        return ImportJob(
+            id=strawberry.ID(job.id),
+            source=job.source,
+            status=ImportJobStatus(job.status),
+            phase=job.phase,
+            bytes_total=job.bytes_total,
+            bytes_copied=job.bytes_copied,
+            rows_staged=job.rows_staged,
+            rows_inserted=job.rows_inserted,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            error=job.error,
+            result=_import_result(job.result) if job.result else None,
+        )
+
+
+@strawberry.enum
+class UploadStatus(Enum):
+    OPEN = "OPEN"
+    FINALIZED = "FINALIZED"
+    ABORTED = "ABORTED"
+
+
+@strawberry.type
+class UploadSession:
+    id: strawberry.ID
+    source: str
+    filename: str
+    status: UploadStatus
+    received_bytes: Long  # resume from here after a dropped connection
+    total_bytes: Optional[Long]
+    stream: bool
+    job_id: Optional[strawberry.ID]
+    created_at: float
+    updated_at: float
+
+    @staticmethod
+    def from_session(s: chunked_upload.UploadSession) -> "UploadSession":
+        return UploadSession(
+            id=strawberry.ID(s.id),
+            source=s.source,
+            filename=s.filename,
+            status=UploadStatus(s.status),
+            received_bytes=s.received,
+            total_bytes=s.total_bytes,
+            stream=s.stream,
+            job_id=strawberry.ID(s.job_id) if s.job_id else None,
+            created_at=s.created_at,
+            updated_at=s.updated_at,
+        )
 
 
 @strawberry.type
@@ -48,12 +178,66 @@ class SalesEdge: cursor: str; node: Sales
 class SalesConnection:
     edges: List[SalesEdge]
     page_info: PageInfo = strawberry.field(name="pageInfo")
+    # Only computed when selected; exact unless total_count_exact is false,
+    # in which case it is the planner's estimate.
+    total_count: Optional[Long] = None
+    total_count_exact: Optional[bool] = None
+
+@strawberry.type
+class ImportReject:
+    id: strawberry.ID
+    import_id: str
+    source: str
+    line_no: Optional[Long]
+    reason: str
+    raw: List[Optional[str]]
+    rejected_at: str
+
+@strawberry.type
+class ImportRejectEdge: cursor: str; node: ImportReject
+@strawberry.type
+class ImportRejectConnection:
+    edges: List[ImportRejectEdge]
+    page_info: PageInfo = strawberry.field(name="pageInfo")
+
+@strawberry.type
+class ImportLedgerEntry:
+    id: strawberry.ID
+    import_id: str
+    source: str
+    content_sha256: Optional[str]
+    bytes: Optional[Long]
+    update_mode: str
+    engine: Optional[str]
+    workers: Optional[int]
+    status: str  # SUCCEEDED, FAILED, CANCELLED, DUPLICATE or REMOVED (rows deleted, not an import)
+    error: Optional[str]
+    duplicate_of: Optional[str]
+    total_rows: Optional[Long]
+    invalid_rows: Optional[Long]
+    dup_in_file: Optional[Long]
+    inserted: Optional[Long]
+    skipped_conflicts: Optional[Long]
+    duration_ms: Optional[float]
+    finished_at: str
+
+@strawberry.type
+class ImportLedgerEdge: cursor: str; node: ImportLedgerEntry
+@strawberry.type
+class ImportLedgerConnection:
+    edges: List[ImportLedgerEdge]
+    page_info: PageInfo = strawberry.field(name="pageInfo")
 
 @strawberry.enum
 class SortDirection(Enum):
     ASC = "ASC"
     DESC = "DESC"
 
+@strawberry.enum
+class SearchMode(Enum):
+    CONTAINS = "CONTAINS"  # substring match, newest first
+    RANKED = "RANKED"      # also near matches, best match first
+
 @strawberry.input
 class SalesFilter:
     region: Optional[str] = None
@@ -66,6 +250,91 @@ class SalesFilter:
     min_profit: Optional[float] = strawberry.field(name="minProfit", default=None)
     max_profit: Optional[float] = strawberry.field(name="maxProfit", default=None)
     q: Optional[str] = None
+    search_mode: SearchMode = strawberry.field(name="searchMode", default=SearchMode.CONTAINS)
+
+@strawberry.type
+class CacheStats:
+    name: str
+    size: int
+    max_entries: int
+    ttl_sec: float
+    hits: int
+    misses: int
+    evictions: int
+    expired: int
+    invalidated: int
+    generation: int
+
+@strawberry.enum
+class SummaryDimension(Enum):
+    MONTH = "month"
+    YEAR = "year"
+    REGION = "region"
+    COUNTRY = "country"
+    ITEM_TYPE = "item_type"
+    SALES_CHANNEL = "sales_channel"
+
+@strawberry.input
+class SalesSummaryFilter:
+    region: Optional[str] = None
+    country: Optional[str] = None
+    item_type: Optional[str] = strawberry.field(name="itemType", default=None)
+    sales_channel: Optional[str] = strawberry.field(name="salesChannel", default=None)
+    month_from: Optional[str] = strawberry.field(name="monthFrom", default=None)
+    month_to: Optional[str] = strawberry.field(name="monthTo", default=None)
+
+@strawberry.type
+class SalesSummaryRow:
+    # Only the dimensions named in groupBy are set; the rest stay null.
+    month: Optional[str] = None
+    year: Optional[str] = None
+    region: Optional[str] = None
+    country: Optional[str] = None
+    item_type: Optional[str] = None
+    sales_channel: Optional[str] = None
+    orders: Long = 0
+    units_sold: Long = 0
+    total_revenue: float = 0.0
+    total_cost: float = 0.0
+    total_profit: float = 0.0
+
+def _sales_node(*values) -> Sales:
+    # Strawberry types take keyword arguments only; page rows arrive as values
+    # in SALES_FIELDS order.
+    return Sales(**dict(zip(SALES_FIELDS, values)))
+
+def _sales_edge(cursor: str, node: Sales) -> SalesEdge:
+    return SalesEdge(cursor=cursor, node=node)
+
+# GraphQL field name -> Sales attribute, for pushing selections into SQL.
+_SALES_FIELDS_BY_GQL = {to_camel_case(f): f for f in SALES_FIELDS}
+
+def _selected(selections, path) -> List[str]:
+    """Sales fields selected under ``path`` (e.g. edges > node), fragments included."""
+    out: List[str] = []
+    for sel in selections:
+        if isinstance(sel, SelectedField) and path:
+            if sel.name == path[0]:
+                out += _selected(sel.selections, path[1:])
+        elif isinstance(sel, SelectedField):
+            if sel.name in _SALES_FIELDS_BY_GQL:
+                out.append(_SALES_FIELDS_BY_GQL[sel.name])
+        else:  # FragmentSpread / InlineFragment: same level
+            out += _selected(sel.selections, path)
+    return out
+
+def _wants_total(info: strawberry.Info) -> bool:
+    """Whether totalCount or totalCountExact is selected on the connection."""
+    names = set()
+    for f in info.selected_fields:
+        pending = list(f.selections)
+        while pending:
+            sel = pending.pop()
+            if isinstance(sel, SelectedField):
+                names.add(sel.name)
+            else:
+                pending += sel.selections
+    return bool(names & {"totalCount", "totalCountExact"})
 
 @strawberry.type
 class Query:
@@ -85,19 +354,79 @@ class Query:
             return ver
 
     @strawberry.field
-    def sales_page(self, first: int = 50, after: Optional[str] = None,
+    def sales_page(self, info: strawberry.Info, first: int = 50, after: Optional[str] = None,
                    filter: Optional[SalesFilter] = None,
-                   direction: SortDirection = SortDirection.DESC) -> SalesConnection:
-        payload = query_sales_page(first, after, vars(filter) if filter else None, direction.value)
-        edges = [SalesEdge(cursor=e["cursor"], node=Sales(**e["node"])) for e in payload["edges"]]
+                   direction: SortDirection = SortDirection.DESC,
+                   page: Optional[int] = None) -> SalesConnection:
+        f = {**vars(filter), "search_mode": filter.search_mode.value} if filter else None
+        fields = _selected([sel for f in info.selected_fields for sel in f.selections], ("edges", "node"))
+        if page is not None:
+            if after:
+                raise ValueError("Pass either page or after, not both")
+            after = sales_page_cursor(page, first, f, direction.value)
+        payload = cached_sales_page(first, after, f, direction.value, fields, _sales_node, _sales_edge)
+        edges = payload["edges"]
         pi = PageInfo(end_cursor=payload["pageInfo"]["endCursor"], has_next_page=payload["pageInfo"]["hasNextPage"])
-        return SalesConnection(edges=edges, page_info=pi)
+        total, exact = sales_total_count(f) if _wants_total(info) else (None, None)
+        return SalesConnection(edges=edges, page_info=pi, total_count=total, total_count_exact=exact)
 
     @strawberry.field
-    def sales_by_id(self, order_id: strawberry.ID) -> Optional[Sales]:
-        row = get_sales_by_id(int(order_id))
+    def sales_by_id(self, info: strawberry.Info, order_id: strawberry.ID,
+                    order_date: Optional[str] = None) -> Optional[Sales]:
+        # Without orderDate an id on several dates (partitioned sales) gives the latest.
+        if order_date:
+            row = cached_sales_by_id(int(order_id), order_date)
+            return Sales(**row) if row else None
+        loader = get_loader(info)
+        loader.prefetch(info)
+        row = loader.load(int(order_id))
         return Sales(**row) if row else None
 
+    @strawberry.field
+    def sales_by_ids(self, info: strawberry.Info, ids: List[strawberry.ID]) -> List[Optional[Sales]]:
+        rows = get_loader(info).load_many([int(i) for i in ids])
+        return [Sales(**r) if r else None for r in rows]
+
+    @strawberry.field
+    def sales_summary(self, group_by: List[SummaryDimension],
+                      filter: Optional[SalesSummaryFilter] = None) -> List[SalesSummaryRow]:
+        rows = query_sales_summary([d.value for d in group_by], vars(filter) if filter else None)
+        return [SalesSummaryRow(**r) for r in rows]
+
+    @strawberry.field
+    def cache_stats(self) -> List[CacheStats]:
+        return [CacheStats(**s) for s in cache_stats()]
+
+    @strawberry.field
+    def import_rejects(self, source: str, first: int = 100, after: Optional[str] = None,
+                       import_id: Optional[str] = None) -> ImportRejectConnection:
+        payload = query_import_rejects(source, first, after, import_id)
+        edges = [ImportRejectEdge(cursor=e["cursor"], node=ImportReject(**e["node"])) for e in payload["edges"]]
+        pi = PageInfo(end_cursor=payload["pageInfo"]["endCursor"], has_next_page=payload["pageInfo"]["hasNextPage"])
+        return ImportRejectConnection(edges=edges, page_info=pi)
+
+    @strawberry.field
+    def import_history(self, first: int = 50, after: Optional[str] = None,
+                       source: Optional[str] = None) -> ImportLedgerConnection:
+        payload = query_import_history(first, after, source)
+        edges = [ImportLedgerEdge(cursor=e["cursor"], node=ImportLedgerEntry(**e["node"])) for e in payload["edges"]]
+        pi = PageInfo(end_cursor=payload["pageInfo"]["endCursor"], has_next_page=payload["pageInfo"]["hasNextPage"])
+        return ImportLedgerConnection(edges=edges, page_info=pi)
+
+    @strawberry.field
+    def import_job(self, id: strawberry.ID) -> Optional[ImportJob]:
+        job = import_jobs.get_job(str(id))
+        return ImportJob.from_job(job) if job else None
+
+    @strawberry.field
+    def import_jobs(self) -> List[ImportJob]:
+        return [ImportJob.from_job(j) for j in import_jobs.list_jobs()]
+
+    @strawberry.field
+    def upload_session(self, id: strawberry.ID) -> Optional[UploadSession]:
+        session = chunked_upload.get_session(str(id))
+        return UploadSession.from_session(session) if session else None
+
 
 @strawberry.type
 class Mutation:
@@ -107,23 +436,87 @@ class Mutation:
         file: Upload,
         source: str,
         update_on_conflict: bool = False,
+        workers: Optional[int] = None,
+        force: bool = False,
+        bulk_load: bool = False,
     ) -> ImportResult:
         result = import_sales_csv_detailed(
             file,
             source,
             update_on_conflict=update_on_conflict,
             speed_optimize=True,
+            workers=workers,
+            force=force,
+            bulk_load=bulk_load,
+            max_bytes=settings.upload_max_bytes,
+            max_rows=settings.upload_max_rows,
         )
-        return ImportResult(
-            inserted=result["inserted"],
-            skipped_conflicts=result["skipped_conflicts"],
-            dup_in_file=result["dup_in_file"],
-            invalid_rows=result["invalid_rows"],
-            total_rows=result["total_rows"],
-            duration_ms=result["duration_ms"],
-            source=result["source"],
-            update_mode=result["update_mode"],
+        return _import_result(result)
+
+    @strawberry.mutation
+    def submit_import(
+        self,
+        file: Upload,
+        source: str,
+        update_on_conflict: bool = False,
+        workers: Optional[int] = None,
+        force: bool = False,
+        bulk_load: bool = False,
+    ) -> ImportJob:
+        job = import_jobs.submit_import(
+            file,
+            source,
+            update_on_conflict=update_on_conflict,
+            workers=workers,
+            force=force,
+            bulk_load=bulk_load,
+        )
+        return ImportJob.from_job(job)
+
+    @strawberry.mutation
+    def cancel_import_job(self, id: strawberry.ID) -> Optional[ImportJob]:
+        job = import_jobs.cancel_job(str(id))
+        return ImportJob.from_job(job) if job else None
+
+    @strawberry.mutation
+    def begin_upload(
+        self,
+        source: str,
+        filename: str,
+        total_bytes: Optional[Long] = None,
+        update_on_conflict: bool = False,
+        workers: Optional[int] = None,
+        stream: bool = False,
+        force: bool = False,
+        bulk_load: bool = False,
+    ) -> UploadSession:
+        session = chunked_upload.begin_upload(
+            source,
+            filename,
+            total_bytes=total_bytes,
+            update_on_conflict=update_on_conflict,
+            workers=workers,
+            stream=stream,
+            force=force,
+            bulk_load=bulk_load,
         )
+        return UploadSession.from_session(session)
+
+    @strawberry.mutation
+    def append_upload_chunk(self, upload_id: strawberry.ID, offset: Long, chunk: Upload, sha256: str) -> UploadSession:
+        session = chunked_upload.append_chunk(str(upload_id), offset, chunk, sha256)
+        return UploadSession.from_session(session)
+
+    @strawberry.mutation
+    def finalize_upload(self, upload_id: strawberry.ID, sha256: Optional[str] = None) -> ImportJob:
+        return ImportJob.from_job(chunked_upload.finalize_upload(str(upload_id), sha256))
+
+    @strawberry.mutation
+    def abort_upload(self, upload_id: strawberry.ID) -> Optional[UploadSession]:
+        session = chunked_upload.abort_upload(str(upload_id))
+        return UploadSession.from_session(session) if session else None
+
+SCHEMA_EXTENSIONS = [DocumentCache] + ([ResolverMetrics] if settings.metrics_enabled else [])
 
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+schema = strawberry.Schema(query=Query, mutation=Mutation, extensions=SCHEMA_EXTENSIONS)
 
@@ -0,0 +1,185 @@
+"""Client-side parse and validation for the ``arrow`` import engine, mirroring REJECT_REASON_EXPR."""
+from __future__ import annotations
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+import psycopg
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError as e:  # pragma: no cover - depends on the deployment
+    raise ImportError("The 'arrow' import engine requires pyarrow (pip install pyarrow)") from e
+
+BLOCK_SIZE = 8 << 20  # bytes of CSV per Arrow record batch
+
+# Typed values go over COPY as Arrow-written CSV: a hand-built FORMAT binary
+# stream measured slower (1M rows staged in 8.1 s against 7.6 s). Arrow
+# leaves nulls unquoted and empty and quotes empty strings, COPY's null rule.
+COPY_VALID_CSV = """
+COPY sales_typed (
+  line_no, raw_order_id,
+  region, country, item_type, sales_channel, order_priority,
+  order_date, order_id, ship_date, units_sold,
+  unit_price, unit_cost, total_revenue, total_cost, total_profit
+) FROM STDIN WITH (FORMAT csv)
+"""
+COPY_REJECTED_BINARY = """
+COPY sales_typed (reject_reason, line_no, raw_order_id, raw) FROM STDIN WITH (FORMAT binary)
+"""
+COPY_REJECTED_TYPES = ["text", "int8", "text", "text[]"]
+
+HEADER = [
+    "Region", "Country", "Item Type", "Sales Channel", "Order Priority",
+    "Order Date", "Order ID", "Ship Date", "Units Sold", "Unit Price",
+    "Unit Cost", "Total Revenue", "Total Cost", "Total Profit",
+]
+# Positions in the 14-column CSV header.
+(REGION, COUNTRY, ITEM_TYPE, SALES_CHANNEL, ORDER_PRIORITY, ORDER_DATE, ORDER_ID,
+ SHIP_DATE, UNITS_SOLD, UNIT_PRICE, UNIT_COST, TOTAL_REVENUE, TOTAL_COST, TOTAL_PROFIT) = range(14)
+
+DIGITS = r"^[0-9]+$"
+DECIMAL = r"^[0-9]+(\.[0-9]+)?$"
+SIGNED_DECIMAL = r"^-?[0-9]+(\.[0-9]+)?$"
+DATE = r"^(?P<m>0?[1-9]|1[0-2])/(?P<d>0?[1-9]|[12][0-9]|3[01])/(?P<y>[0-9]{4})$"
+
+# (column, pattern, reason) in the same order as REJECT_REASON_EXPR.
+PATTERN_CHECKS = [
+    (UNITS_SOLD, DIGITS, "bad_units_sold"),
+    (UNIT_PRICE, DECIMAL, "bad_unit_price"),
+    (UNIT_COST, DECIMAL, "bad_unit_cost"),
+    (TOTAL_REVENUE, DECIMAL, "bad_total_revenue"),
+    (TOTAL_COST, DECIMAL, "bad_total_cost"),
+    (TOTAL_PROFIT, SIGNED_DECIMAL, "bad_total_profit"),
+]
+# Money columns and the integer digits their NUMERIC type allows.
+MONEY_LIMITS = [(UNIT_PRICE, 8), (UNIT_COST, 8), (TOTAL_REVENUE, 16), (TOTAL_COST, 16), (TOTAL_PROFIT, 16)]
+
+
+def _matches(arr: pa.Array, pattern: str) -> pa.Array:
+    return pc.fill_null(pc.match_substring_regex(arr, pattern), False)
+
+def _parse_dates(arr: pa.Array) -> Tuple[pa.Array, pa.Array]:
+    """Return ``(ok, date32)``."""
+    ok = _matches(arr, DATE)
+    clean = pc.if_else(ok, arr, "01/01/2000")
+    ts = pc.strptime(clean, format="%m/%d/%Y", unit="s", error_is_null=True)
+    # strptime turns 02/30 into 03/02; compare the parts to catch that.
+    parts = pc.extract_regex(clean, DATE)
+    same = pc.and_(
+        pc.and_(
+            pc.equal(pc.month(ts), pc.cast(pc.struct_field(parts, "m"), pa.int64())),
+            pc.equal(pc.day(ts), pc.cast(pc.struct_field(parts, "d"), pa.int64())),
+        ),
+        pc.greater(pc.cast(pc.struct_field(parts, "y"), pa.int64()), 0),
+    )
+    return pc.and_(ok, pc.fill_null(same, False)), pc.cast(ts, pa.date32())
+
+def _parse_money(arr: pa.Array, ok: pa.Array, int_digits: int) -> Tuple[pa.Array, pa.Array]:
+    """Return ``(in_range, decimal128(18,2))`` rounded like a NUMERIC(p,2) cast."""
+    # Fraction digits past the 10th cannot change the rounding.
+    clean = pc.replace_substring_regex(pc.if_else(ok, arr, "0"), r"(\.[0-9]{10})[0-9]+$", r"\1")
+    int_part = pc.struct_field(pc.extract_regex(clean, r"^-?(?P<i>[0-9]+)"), "i")
+    too_long = pc.greater(pc.utf8_length(int_part), int_digits)
+    clean = pc.if_else(too_long, "0", clean)
+    value = pc.round(pc.cast(clean, pa.decimal128(38, 10)), ndigits=2, round_mode="half_towards_infinity")
+    limit = pa.scalar(10 ** int_digits, pa.decimal128(38, 10))
+    in_range = pc.and_(pc.invert(too_long), pc.less(pc.abs(value), limit))
+    value = pc.if_else(in_range, value, pa.scalar(0, pa.decimal128(38, 10)))
+    return in_range, pc.cast(value, pa.decimal128(18, 2))
+
+def _first_reason(checks: List[Tuple[pa.Array, str]], n: int) -> pa.Array:
+    """Reason of the first failing check per row, null when all pass."""
+    reason = pa.nulls(n, pa.string())
+    for ok, name in reversed(checks):
+        reason = pc.if_else(ok, reason, name)
+    return reason
+
+def _typed_batch(cols: List[pa.Array]) -> Tuple[pa.Array, Dict[int, pa.Array]]:
+    n = len(cols[0])
+    present = pc.and_(
+        pc.and_(pc.is_valid(cols[REGION]), pc.is_valid(cols[COUNTRY])),
+        pc.and_(pc.and_(pc.is_valid(cols[ITEM_TYPE]), pc.is_valid(cols[SALES_CHANNEL])),
+                pc.is_valid(cols[ORDER_PRIORITY])),
+    )
+    id_ok = _matches(cols[ORDER_ID], DIGITS)
+    od_ok, order_date = _parse_dates(cols[ORDER_DATE])
+    sd_ok, ship_date = _parse_dates(cols[SHIP_DATE])
+    checks = [(present, "missing_field"), (id_ok, "bad_order_id"),
+              (od_ok, "bad_order_date"), (sd_ok, "bad_ship_date")]
+    pattern_ok = {col: _matches(cols[col], pattern) for col, pattern, _ in PATTERN_CHECKS}
+    checks += [(pattern_ok[col], name) for col, _, name in PATTERN_CHECKS]
+
+    in_range = pc.and_(
+        pc.less_equal(pc.fill_null(pc.utf8_length(cols[ORDER_ID]), 0), 18),
+        pc.less_equal(pc.fill_null(pc.utf8_length(cols[UNITS_SOLD]), 0), 9),
+    )
+    typed: Dict[int, pa.Array] = {ORDER_DATE: order_date, SHIP_DATE: ship_date}
+    for col, digits in MONEY_LIMITS:
+        ok, typed[col] = _parse_money(cols[col], pattern_ok[col], digits)
+        in_range = pc.and_(in_range, pc.or_(ok, pc.invert(pattern_ok[col])))
+    checks.append((in_range, "out_of_range"))
+    reason = _first_reason(checks, n)
+
+    valid = pc.is_null(reason)
+    typed[ORDER_ID] = pc.cast(pc.if_else(valid, cols[ORDER_ID], "0"), pa.int64())
+    typed[UNITS_SOLD] = pc.cast(pc.if_else(valid, cols[UNITS_SOLD], "0"), pa.int32())
+    return reason, typed
+
+
+def stage_arrow(
+    cur: psycopg.Cursor,
+    bin_stream: BinaryIO,
+    on_batch: Optional[Callable[[int], None]] = None,
+) -> Tuple[int, int]:
+    """COPY ``bin_stream`` into ``sales_typed``; returns ``(total_rows, valid_rows)``."""
+    # Columns are positional like COPY ... HEADER true: the header record is
+    # skipped, not matched by name.
+    reader = pa_csv.open_csv(
+        bin_stream,
+        read_options=pa_csv.ReadOptions(block_size=BLOCK_SIZE, column_names=HEADER, skip_rows=1),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        # Everything is read as text with PostgreSQL's CSV null rule: only an
+        # unquoted empty field is NULL.
+        convert_options=pa_csv.ConvertOptions(
+            column_types={name: pa.string() for name in HEADER}, null_values=[""],
+            strings_can_be_null=True, quoted_strings_can_be_null=False,
+        ),
+    )
+
+    total_rows = valid_rows = 0
+    for batch in reader:
+        cols = batch.columns
+        reason, typed = _typed_batch(cols)
+        valid = pc.is_null(reason)
+        n_valid = pc.sum(valid).as_py() or 0
+        first_line = total_rows + 2  # header is record 1
+        lines = pa.array(range(first_line, first_line + batch.num_rows), pa.int64())
+
+        if n_valid:
+            good = [lines, cols[ORDER_ID]]
+            good += [cols[i] for i in (REGION, COUNTRY, ITEM_TYPE, SALES_CHANNEL, ORDER_PRIORITY)]
+            good += [typed[i] for i in (ORDER_DATE, ORDER_ID, SHIP_DATE, UNITS_SOLD)]
+            good += [typed[i] for i in (UNIT_PRICE, UNIT_COST, TOTAL_REVENUE, TOTAL_COST, TOTAL_PROFIT)]
+            table = pa.Table.from_arrays(good, names=[str(i) for i in range(len(good))])
+            if n_valid < batch.num_rows:
+                table = table.filter(valid)
+            sink = pa.BufferOutputStream()
+            pa_csv.write_csv(table, sink, pa_csv.WriteOptions(include_header=False))
+            with cur.copy(COPY_VALID_CSV) as cp:
+                cp.write(memoryview(sink.getvalue()))
+
+        if n_valid < batch.num_rows:
+            # Rare, and text[] has no CSV form Arrow can write: row by row.
+            invalid = pc.invert(valid)
+            bad = lambda a: pc.filter(a, invalid).to_pylist()
+            raw_cols = [bad(c) for c in cols]
+            with cur.copy(COPY_REJECTED_BINARY) as cp:
+                cp.set_types(COPY_REJECTED_TYPES)
+                for reason_s, line, raw in zip(bad(reason), bad(lines), zip(*raw_cols)):
+                    cp.write_row((reason_s, line, raw[ORDER_ID], list(raw)))
+
+        total_rows += batch.num_rows
+        valid_rows += n_valid
+        if on_batch:
+            on_batch(total_rows)
+    return total_rows, valid_rows
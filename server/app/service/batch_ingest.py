@@ -0,0 +1,231 @@
+"""Import directories of sales files from local disk, several at a time."""
+from __future__ import annotations
+import argparse, glob, json, logging, multiprocessing, os, sys, time, uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from fnmatch import fnmatch
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+log = logging.getLogger("app.service.batch_ingest")
+
+DEFAULT_PATTERNS = (
+    "*.csv", "*.csv.*", "*.jsonl", "*.jsonl.*", "*.ndjson", "*.parquet", "*.gz", "*.zst", "*.bz2", "*.xz",
+)
+DEFAULT_JOURNAL = "ingest-journal.jsonl"
+
+# Journal statuses --resume treats as done (import_ledger.SUCCEEDED / DUPLICATE).
+_COMPLETED = ("SUCCEEDED", "DUPLICATE")
+
+FileKey = Tuple[str, int, int]  # absolute path, size, mtime_ns
+
+
+def expand_inputs(inputs: Iterable[str], patterns: Iterable[str] = DEFAULT_PATTERNS, exclude: Iterable[str] = ()) -> List[str]:
+    """Absolute paths of the files ``inputs`` name, sorted; directories are searched recursively."""
+    patterns, skip = tuple(patterns), {os.path.abspath(p) for p in exclude}
+    files: Set[str] = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, names in os.walk(item):
+                dirs[:] = [d for d in dirs if not d.startswith(".")]
+                files.update(
+                    os.path.join(root, n) for n in names
+                    if not n.startswith(".") and any(fnmatch(n, p) for p in patterns)
+                )
+        elif os.path.isfile(item):
+            files.add(item)
+        else:
+            matched = [p for p in glob.glob(item, recursive=True) if os.path.isfile(p)]
+            if not matched:
+                raise FileNotFoundError(f"No files match {item}")
+            files.update(matched)
+    return sorted(p for p in map(os.path.abspath, files) if p not in skip)
+
+
+def file_key(path: str) -> FileKey:
+    st = os.stat(path)
+    return path, st.st_size, st.st_mtime_ns
+
+
+def completed_files(journal: str) -> Set[FileKey]:
+    """Files the journal records as imported or found to be duplicates."""
+    done: Set[FileKey] = set()
+    if not os.path.exists(journal):
+        return done
+    with open(journal, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                e = json.loads(line)
+            except ValueError:
+                continue  # a line cut short when an earlier run was killed
+            if e.get("status") in _COMPLETED:
+                done.add((e["file"], e["size"], e["mtime_ns"]))
+    return done
+
+
+# --- worker processes -------------------------------------------------------
+# Files stage in parallel but insert in path order, so with --update-on-conflict
+# the last file holding an Order ID wins. Shared by all workers: which files
+# have finished, and how many of the first files in the order have all
+# finished (everything before index i is done once _done_upto >= i).
+_turn: Any = None
+_finished: Any = None
+_done_upto: Any = None
+
+
+def _init_worker(turn: Any, finished: Any, done_upto: Any, workers: int, log_level: int) -> None:
+    global _turn, _finished, _done_upto
+    from app.config.db.connection import init_pool
+
+    _turn, _finished, _done_upto = turn, finished, done_upto
+    logging.basicConfig(level=log_level)
+    init_pool(1, workers + 1)
+
+
+def _await_turn(index: int) -> None:
+    with _turn:
+        _turn.wait_for(lambda: _done_upto.value >= index)
+
+
+def _mark_finished(index: int) -> None:
+    with _turn:
+        _finished[index] = 1
+        while _done_upto.value < len(_finished) and _finished[_done_upto.value]:
+            _done_upto.value += 1
+        _turn.notify_all()
+
+
+def _ingest_file(index: int, path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    from app.service.csv_import import import_sales_csv_detailed
+
+    def progress(phase: str, _counters: Dict[str, int]) -> None:
+        if phase == "inserting":
+            t = time.perf_counter()
+            _await_turn(index)
+            # Counted in phases_ms' insert too.
+            entry["wait_ms"] = round((time.perf_counter() - t) * 1000.0, 1)
+
+    _, size, mtime_ns = file_key(path)
+    entry: Dict[str, Any] = {"file": path, "size": size, "mtime_ns": mtime_ns}
+    t0 = time.perf_counter()
+    try:
+        with open(path, "rb") as fh:
+            r = import_sales_csv_detailed(fh, path, progress=progress, **options)
+    except Exception as e:
+        log.exception("Import of %s failed", path)
+        entry.update(status="FAILED", error=str(e))
+    else:
+        entry.update(
+            status="DUPLICATE" if r["deduplicated"] else "SUCCEEDED", import_id=r["import_id"],
+            total_rows=r["total_rows"], inserted=r["inserted"], skipped_conflicts=r["skipped_conflicts"],
+            invalid_rows=r["invalid_rows"], dup_in_file=r["dup_in_file"], phases_ms=r["phases_ms"],
+        )
+    finally:
+        _mark_finished(index)
+    seconds = time.perf_counter() - t0
+    entry["seconds"] = round(seconds, 3)
+    entry["mb_per_sec"] = round(size / seconds / (1 << 20), 2) if seconds else None
+    if entry["status"] == "SUCCEEDED":
+        entry["rows_per_sec"] = round(entry["total_rows"] / seconds, 1) if seconds else None
+    entry["finished_at"] = time.time()
+    return entry
+
+
+# --- driver -----------------------------------------------------------------
+
+def ingest(
+    files: List[str],
+    *,
+    jobs: int,
+    journal: str,
+    workers: int = 1,
+    engine: str = "single_pass",
+    update_on_conflict: bool = False,
+    force: bool = False,
+    bulk_load: bool = False,
+    log_level: int = logging.INFO,
+) -> Dict[str, Any]:
+    """Import ``files`` in their order, ``jobs`` at a time; returns the summary."""
+    from app.service.bulk_load import DeferredIndexes
+
+    ctx = multiprocessing.get_context("spawn")  # workers open their own pools
+    turn, finished, done_upto = ctx.Condition(), ctx.Array("b", max(1, len(files))), ctx.Value("l", 0)
+    options = dict(update_on_conflict=update_on_conflict, workers=workers, engine=engine, force=force)
+    deferred = DeferredIndexes(f"batch-{uuid.uuid4().hex}") if bulk_load and files else None
+    totals = {"files": len(files), "SUCCEEDED": 0, "DUPLICATE": 0, "FAILED": 0, "total_rows": 0, "inserted": 0, "bytes": 0}
+
+    t0 = time.perf_counter()
+    if deferred is not None:
+        deferred.drop()
+    try:
+        with open(journal, "a", encoding="utf-8") as out, ProcessPoolExecutor(
+            max_workers=max(1, jobs), mp_context=ctx,
+            initializer=_init_worker, initargs=(turn, finished, done_upto, workers, log_level),
+        ) as pool:
+            futures = [pool.submit(_ingest_file, i, path, options) for i, path in enumerate(files)]
+            for fut in as_completed(futures):
+                entry = fut.result()
+                out.write(json.dumps(entry) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+                print(json.dumps(entry), flush=True)
+                totals[entry["status"]] += 1
+                totals["bytes"] += entry["size"]
+                if entry["status"] == "SUCCEEDED":
+                    totals["total_rows"] += entry["total_rows"]
+                    totals["inserted"] += entry["inserted"]
+    finally:
+        if deferred is not None:
+            deferred.finish()
+    seconds = time.perf_counter() - t0
+    return {
+        "files": totals["files"], "succeeded": totals["SUCCEEDED"], "duplicates": totals["DUPLICATE"],
+        "failed": totals["FAILED"], "total_rows": totals["total_rows"], "inserted": totals["inserted"],
+        "bytes": totals["bytes"], "seconds": round(seconds, 3),
+        "rows_per_sec": round(totals["total_rows"] / seconds, 1) if seconds else None,
+        "mb_per_sec": round(totals["bytes"] / seconds / (1 << 20), 2) if seconds else None,
+    }
+
+
+def main() -> None:
+    from app.config.db.connection import init_pool
+    from app.service.csv_import import ENGINES, MAX_IMPORT_WORKERS, ensure_schema
+
+    ap = argparse.ArgumentParser(description="Import sales files from local disk in parallel.")
+    ap.add_argument("inputs", nargs="+", help="files, globs (quoted; ** recurses) or directories")
+    ap.add_argument("--pattern", action="append", help=f"file name pattern inside directories; repeatable (default: {' '.join(DEFAULT_PATTERNS)})")
+    ap.add_argument("--jobs", type=int, default=min(4, os.cpu_count() or 1), help="files imported at once (worker processes)")
+    ap.add_argument("--workers", type=int, default=1, help=f"COPY connections per file (1-{MAX_IMPORT_WORKERS})")
+    ap.add_argument("--engine", choices=ENGINES, default="single_pass")
+    ap.add_argument("--update-on-conflict", action="store_true", help="later files overwrite existing Order IDs")
+    ap.add_argument("--bulk-load", action="store_true", help="drop the secondary indexes for the batch, rebuild them at the end")
+    ap.add_argument("--force", action="store_true", help="import files the ledger has already seen")
+    ap.add_argument("--journal", default=DEFAULT_JOURNAL, help=f"per-file results, appended (default: {DEFAULT_JOURNAL})")
+    ap.add_argument("--resume", action="store_true", help="skip files the journal records as done")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        files = expand_inputs(args.inputs, args.pattern or DEFAULT_PATTERNS, exclude=[args.journal])
+    except FileNotFoundError as e:
+        ap.error(str(e))
+    skipped = 0
+    if args.resume:
+        done = completed_files(args.journal)
+        todo = [f for f in files if file_key(f) not in done]
+        skipped, files = len(files) - len(todo), todo
+    log.info("Importing %d file(s) with %d job(s); %d skipped as done", len(files), args.jobs, skipped)
+
+    # The tables must exist before a --bulk-load can drop their indexes.
+    init_pool(1, 2)
+    ensure_schema()
+    summary = ingest(
+        files, jobs=args.jobs, journal=args.journal, workers=args.workers, engine=args.engine,
+        update_on_conflict=args.update_on_conflict, force=args.force, bulk_load=args.bulk_load,
+    )
+    summary["skipped"] = skipped
+    print(json.dumps({"summary": summary}), flush=True)
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
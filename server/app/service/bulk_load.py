@@ -0,0 +1,238 @@
+"""Bulk-load mode: drop the secondary sales indexes for an import, rebuild them after."""
+from __future__ import annotations
+import argparse, json, logging, re, threading, time
+from typing import Any, Dict, List, Optional, Tuple
+import psycopg
+from psycopg import sql
+from app.config.db_setup import settings
+from app.service.metrics import PhaseClock
+from app.service.sales_partitions import IS_PARTITIONED
+
+log = logging.getLogger("app.service.bulk_load")
+
+BULK_LOAD_LOCK_KEY = 0x5A1E8  # held (session level) by the running bulk load
+
+# Committed before the indexes are dropped, so a load that dies leaves records
+# for the next one, start_restore or `python -m app.service.bulk_load restore`.
+DDL_DEFERRED_INDEXES = """
+CREATE TABLE IF NOT EXISTS sales_deferred_indexes (
+  index_name  TEXT        PRIMARY KEY,
+  definition  TEXT        NOT NULL,
+  import_id   TEXT,
+  dropped_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+# Everything but the primary key, unique indexes and indexes behind constraints.
+SECONDARY_INDEXES = """
+SELECT c.relname, pg_get_indexdef(i.indexrelid)
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+WHERE i.indrelid = 'sales'::regclass
+  AND NOT i.indisunique
+  AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+ORDER BY c.relname
+"""
+
+RECORD_INDEX = """
+INSERT INTO sales_deferred_indexes (index_name, definition, import_id) VALUES (%s, %s, %s)
+ON CONFLICT (index_name) DO NOTHING
+"""
+
+DEFERRED = "SELECT index_name, definition FROM sales_deferred_indexes ORDER BY index_name"
+INDEX_VALID = "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)"
+LOAD_RUNNING = """
+SELECT EXISTS (
+  SELECT 1 FROM pg_locks
+  WHERE locktype = 'advisory' AND classid = 0 AND objid = %s AND objsubid = 1 AND granted
+)
+"""
+
+_restore_thread: Optional[threading.Thread] = None
+_restore_lock = threading.Lock()
+
+_CREATE_INDEX = re.compile(r"^CREATE (UNIQUE )?INDEX (\S+) ON (ONLY )?")
+
+
+def _create(definition: str, concurrently: bool) -> str:
+    # pg_get_indexdef gives "CREATE INDEX name ON public.sales USING ...", with
+    # ON ONLY for a partitioned table, which would skip the partitions.
+    return _CREATE_INDEX.sub(
+        r"CREATE \1INDEX CONCURRENTLY IF NOT EXISTS \2 ON " if concurrently else r"CREATE \1INDEX IF NOT EXISTS \2 ON ",
+        definition, count=1,
+    )
+
+
+def _connect() -> psycopg.Connection:
+    # CONCURRENTLY cannot run inside a transaction block, hence autocommit.
+    conn = psycopg.connect(settings.database_url, autocommit=True)
+    conn.execute(DDL_DEFERRED_INDEXES)
+    return conn
+
+
+def _try_lock(conn: psycopg.Connection) -> bool:
+    return bool(conn.execute("SELECT pg_try_advisory_lock(%s)", [BULK_LOAD_LOCK_KEY]).fetchone()[0])
+
+
+def _partitioned(conn: psycopg.Connection) -> bool:
+    row = conn.execute(IS_PARTITIONED).fetchone()
+    return bool(row and row[0])
+
+
+def _rebuild_recorded(conn: psycopg.Connection) -> List[str]:
+    """Build every recorded index, dropping each record once its index is valid."""
+    # Partitioned indexes cannot be built CONCURRENTLY; the plain build only
+    # blocks writes, and a bulk load is the one writing.
+    concurrently = not _partitioned(conn)
+    conn.execute("SELECT set_config('maintenance_work_mem', %s, false)", [settings.bulk_load_maintenance_work_mem])
+    rebuilt = []
+    for name, definition in conn.execute(DEFERRED).fetchall():
+        t0 = time.perf_counter()
+        valid = conn.execute(INDEX_VALID, [name]).fetchone()
+        if valid is not None and not valid[0]:
+            # Left by a CONCURRENTLY build that died; IF NOT EXISTS would keep it.
+            conn.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(name)))
+        conn.execute(_create(definition, concurrently))
+        conn.execute("DELETE FROM sales_deferred_indexes WHERE index_name = %s", [name])
+        rebuilt.append(name)
+        log.info("Rebuilt index %s in %.1f s", name, time.perf_counter() - t0)
+    return rebuilt
+
+
+class DeferredIndexes:
+    """One bulk load: ``drop()`` the secondary indexes, load, then ``finish()``."""
+
+    def __init__(self, import_id: Optional[str] = None):
+        self.import_id = import_id
+        self.dropped: List[str] = []
+        self._conn: Optional[psycopg.Connection] = None
+
+    def drop(self) -> List[str]:
+        _wait_for_restore()
+        conn = _connect()
+        if not _try_lock(conn):
+            conn.close()
+            raise ValueError("Another bulk load is running; retry once it has finished")
+        self._conn = conn
+        try:
+            with conn.transaction():
+                indexes = conn.execute(SECONDARY_INDEXES).fetchall()
+                for name, definition in indexes:
+                    conn.execute(RECORD_INDEX, [name, definition, self.import_id])
+            drop = "DROP INDEX IF EXISTS {}" if _partitioned(conn) else "DROP INDEX CONCURRENTLY IF EXISTS {}"
+            for name, _ in indexes:
+                conn.execute(sql.SQL(drop).format(sql.Identifier(name)))
+            # Includes any a dead load left behind; they are rebuilt with ours.
+            self.dropped = [name for name, _ in conn.execute(DEFERRED).fetchall()]
+        except BaseException:
+            self._release()
+            raise
+        log.info("Bulk load %s: deferred indexes %s", self.import_id, ", ".join(self.dropped) or "(none)")
+        return self.dropped
+
+    def finish(self, clock: Optional[PhaseClock] = None, analyze: bool = True) -> List[str]:
+        """Rebuild the dropped indexes and ANALYZE sales, then release the lock."""
+        if self._conn is None:
+            return []
+        try:
+            if clock is not None:
+                clock.mark("indexes")
+            rebuilt = _rebuild_recorded(self._conn)
+            if analyze:
+                if clock is not None:
+                    clock.mark("analyze")
+                self._conn.execute("ANALYZE sales")
+        finally:
+            self._release()
+        return rebuilt
+
+    def _release(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None and not conn.closed:
+            try:
+                conn.execute("SELECT pg_advisory_unlock(%s)", [BULK_LOAD_LOCK_KEY])
+            finally:
+                conn.close()
+
+    def __enter__(self) -> "DeferredIndexes":
+        self.drop()
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        self.finish(analyze=exc_type is None)
+
+
+def deferred_index_names(cur: psycopg.Cursor) -> List[str]:
+    cur.execute(DEFERRED)
+    return [name for name, _ in cur.fetchall()]
+
+
+def restore_deferred_indexes() -> List[str]:
+    """Rebuild the indexes a dead bulk load left dropped; a no-op while one runs."""
+    with _connect() as conn:
+        if not _try_lock(conn):
+            return []
+        try:
+            rebuilt = _rebuild_recorded(conn)
+            if rebuilt:
+                conn.execute("ANALYZE sales")
+        finally:
+            conn.execute("SELECT pg_advisory_unlock(%s)", [BULK_LOAD_LOCK_KEY])
+    if rebuilt:
+        log.warning("Restored indexes left dropped by an interrupted bulk load: %s", ", ".join(rebuilt))
+    return rebuilt
+
+
+def _restore_in_background() -> None:
+    try:
+        restore_deferred_indexes()
+    except Exception:
+        log.exception("Could not restore the indexes of an interrupted bulk load")
+
+
+def start_restore() -> None:
+    """restore_deferred_indexes on a background thread, unless one is running."""
+    global _restore_thread
+    with _restore_lock:
+        if _restore_thread is not None and _restore_thread.is_alive():
+            return
+        _restore_thread = threading.Thread(target=_restore_in_background, name="restore-deferred-indexes", daemon=True)
+        _restore_thread.start()
+
+
+def _wait_for_restore() -> None:
+    with _restore_lock:
+        thread = _restore_thread
+    if thread is not None and thread.is_alive():
+        log.info("Bulk load waits for the background index restore to finish")
+        thread.join()
+
+
+def bulk_load_status() -> Dict[str, Any]:
+    with _connect() as conn:
+        running = conn.execute(LOAD_RUNNING, [BULK_LOAD_LOCK_KEY]).fetchone()[0]
+        rows: List[Tuple[Any, ...]] = conn.execute(
+            "SELECT index_name, import_id, dropped_at FROM sales_deferred_indexes ORDER BY index_name"
+        ).fetchall()
+    return {
+        "running": running,
+        "deferred": [{"index": n, "import_id": i, "dropped_at": d.isoformat()} for n, i, d in rows],
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Inspect or recover bulk loads of the sales table.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="whether a bulk load is running and which indexes are deferred")
+    sub.add_parser("restore", help="rebuild indexes an interrupted bulk load left dropped")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.cmd == "status":
+        print(json.dumps(bulk_load_status()))
+    else:
+        print(json.dumps({"rebuilt": restore_deferred_indexes()}))
+
+
+if __name__ == "__main__":
+    main()
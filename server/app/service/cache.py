@@ -0,0 +1,156 @@
+from __future__ import annotations
+import threading, time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+# Bumped after every import that changed sales. Entries remember the
+# generation they were computed under and are discarded once it moves on.
+# The counter is per process: other server processes only drop their copies
+# when the TTL runs out.
+_generation = 0
+_gen_lock = threading.Lock()
+
+def bump_generation() -> int:
+    global _generation
+    with _gen_lock:
+        _generation += 1
+        return _generation
+
+def current_generation() -> int:
+    return _generation
+
+
+_MISSING = object()
+
+
+class ResultCache:
+    """Bounded LRU of query results with a TTL, invalidated by the generation unless not ``generational``."""
+
+    def __init__(self, name: str, max_entries: int, ttl_sec: float, generational: bool = True) -> None:
+        self.name = name
+        self.max_entries = max(0, max_entries)
+        self.ttl_sec = ttl_sec
+        self.generational = generational
+        self._data: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expired = self.invalidated = 0
+
+    def _lookup(self, key: Hashable, gen: int, now: float) -> Any:
+        # Called with _lock held; counts the outcome.
+        entry = self._data.get(key, _MISSING)
+        if entry is not _MISSING:
+            e_gen, e_time, value = entry
+            if self.generational and e_gen != gen:
+                self.invalidated += 1
+                del self._data[key]
+            elif now - e_time > self.ttl_sec:
+                self.expired += 1
+                del self._data[key]
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return value
+        self.misses += 1
+        return _MISSING
+
+    def _store(self, items: Dict[Hashable, Any], gen: int, now: float) -> None:
+        # Results loaded while an import committed may already be stale.
+        if self.max_entries == 0 or (self.generational and gen != current_generation()):
+            return
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = (gen, now, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        gen, now = current_generation(), time.monotonic()
+        with self._lock:
+            value = self._lookup(key, gen, now)
+        if value is not _MISSING:
+            return value
+        # Loaded outside the lock so a slow query doesn't block other keys.
+        value = load()
+        self._store({key: value}, gen, now)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._lookup(key, current_generation(), time.monotonic())
+        return default if value is _MISSING else value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._store({key: value}, current_generation(), time.monotonic())
+
+    def get_many(self, keys: List[Hashable], load_many: Callable[[List[Hashable]], Dict[Hashable, Any]]) -> Dict[Hashable, Any]:
+        """Like get_or_load for several keys, loading the misses with one ``load_many`` call."""
+        gen, now = current_generation(), time.monotonic()
+        found: Dict[Hashable, Any] = {}
+        missing: List[Hashable] = []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                value = self._lookup(key, gen, now)
+                if value is _MISSING:
+                    missing.append(key)
+                else:
+                    found[key] = value
+        if missing:
+            loaded = load_many(missing)
+            self._store(loaded, gen, now)
+            found.update(loaded)
+        return found
+
+    async def get_or_load_async(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        gen, now = current_generation(), time.monotonic()
+        with self._lock:
+            value = self._lookup(key, gen, now)
+        if value is not _MISSING:
+            return value
+        value = await load()
+        self._store({key: value}, gen, now)
+        return value
+
+    async def get_many_async(
+        self, keys: List[Hashable], load_many: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+    ) -> Dict[Hashable, Any]:
+        gen, now = current_generation(), time.monotonic()
+        found: Dict[Hashable, Any] = {}
+        missing: List[Hashable] = []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                value = self._lookup(key, gen, now)
+                if value is _MISSING:
+                    missing.append(key)
+                else:
+                    found[key] = value
+        if missing:
+            loaded = await load_many(missing)
+            self._store(loaded, gen, now)
+            found.update(loaded)
+        return found
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name, "size": len(self._data), "max_entries": self.max_entries,
+                "ttl_sec": self.ttl_sec, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "expired": self.expired, "invalidated": self.invalidated,
+                "generation": current_generation(),
+            }
+
+
+_caches: List[ResultCache] = []
+
+def register_cache(name: str, max_entries: int, ttl_sec: float, generational: bool = True) -> ResultCache:
+    cache = ResultCache(name, max_entries, ttl_sec, generational)
+    _caches.append(cache)
+    return cache
+
+def cache_stats() -> List[Dict[str, Any]]:
+    return [c.stats() for c in _caches]
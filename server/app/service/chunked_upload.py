@@ -0,0 +1,311 @@
+"""Resumable chunked uploads spooled to local disk, optionally imported as they arrive."""
+from __future__ import annotations
+import hashlib, io, json, logging, os, tempfile, threading, time, uuid
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Optional
+from app.config.db_setup import settings
+from app.service import import_jobs
+from app.service.csv_import import ImportCancelled, _get_binary_stream
+
+log = logging.getLogger("app.service.chunked_upload")
+
+OPEN, FINALIZED, ABORTED = "OPEN", "FINALIZED", "ABORTED"
+
+
+class UploadError(ValueError):
+    """A chunk or finalize request the session cannot accept."""
+
+
+class UploadOffsetMismatch(UploadError):
+    def __init__(self, upload_id: str, offset: int, received: int):
+        super().__init__(f"Upload {upload_id}: chunk offset {offset} does not match received offset {received}")
+        self.offset, self.received = offset, received
+
+
+@dataclass
+class UploadSession:
+    id: str
+    source: str
+    filename: str
+    path: str
+    update_on_conflict: bool
+    workers: Optional[int]
+    total_bytes: Optional[int] = None
+    force: bool = False
+    bulk_load: bool = False
+    stream: bool = False
+    received: int = 0
+    status: str = OPEN
+    job_id: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    # Running hash of bytes 0..received; rebuilt from the file after a restart.
+    _sha256: Any = field(default=None, repr=False, compare=False)
+    _cond: threading.Condition = field(default_factory=threading.Condition, repr=False, compare=False)
+
+
+_sessions: Dict[str, UploadSession] = {}
+_lock = threading.Lock()
+
+
+def _spool_dir() -> str:
+    path = settings.spool_dir or tempfile.gettempdir()
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _meta_path(upload_id: str) -> str:
+    return os.path.join(_spool_dir(), f"upload-{upload_id}.json")
+
+
+def _save(session: UploadSession) -> None:
+    # Written after the chunk is on disk: `received` never runs ahead of the data.
+    meta = {f.name: getattr(session, f.name) for f in fields(session) if not f.name.startswith("_")}
+    tmp = _meta_path(session.id) + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(meta, fh)
+    os.replace(tmp, _meta_path(session.id))
+
+
+def _load(upload_id: str) -> Optional[UploadSession]:
+    """Session from its sidecar file, for uploads begun before a restart."""
+    if not all(c in "0123456789abcdef" for c in upload_id):
+        return None
+    try:
+        with open(_meta_path(upload_id)) as fh:
+            meta = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    session = UploadSession(**meta)
+    if session.status != OPEN or not os.path.exists(session.path):
+        return None
+    # A streaming import did not survive the restart; finalize queues a new one.
+    session.stream, session.job_id = False, None
+    with open(session.path, "r+b") as fh:
+        fh.truncate(session.received)  # drop a chunk that was written but never acknowledged
+    return session
+
+
+def _remove_files(session: UploadSession, spool: bool) -> None:
+    paths = [_meta_path(session.id)] + ([session.path] if spool else [])
+    for path in paths:
+        try: os.remove(path)
+        except OSError: pass
+
+
+def _prune_expired() -> None:
+    # Called with _lock held.
+    cutoff = time.time() - settings.upload_session_ttl_sec
+    for session in [s for s in _sessions.values() if s.updated_at < cutoff]:
+        _sessions.pop(session.id, None)
+        if session.status == OPEN:
+            _abort(session)
+
+
+def get_session(upload_id: str) -> Optional[UploadSession]:
+    with _lock:
+        session = _sessions.get(upload_id)
+        if session is None and (session := _load(upload_id)) is not None:
+            _sessions[upload_id] = session
+        return session
+
+
+def _require(upload_id: str) -> UploadSession:
+    session = get_session(upload_id)
+    if session is None:
+        raise UploadError(f"Unknown upload {upload_id}")
+    return session
+
+
+def begin_upload(
+    source: str,
+    filename: str,
+    *,
+    total_bytes: Optional[int] = None,
+    update_on_conflict: bool = False,
+    workers: Optional[int] = None,
+    stream: bool = False,
+    force: bool = False,
+    bulk_load: bool = False,
+) -> UploadSession:
+    limit = settings.upload_max_bytes
+    if limit is not None and total_bytes is not None and total_bytes > limit:
+        raise UploadError(f"Upload of {total_bytes} bytes exceeds {limit} bytes")
+    upload_id = uuid.uuid4().hex
+    # The original name is kept only to make the spool file recognisable.
+    path = os.path.join(_spool_dir(), f"upload-{upload_id}-{os.path.basename(filename) or 'upload.csv'}")
+    open(path, "wb").close()
+    session = UploadSession(
+        id=upload_id,
+        source=source,
+        filename=filename,
+        path=path,
+        update_on_conflict=update_on_conflict,
+        workers=workers,
+        total_bytes=total_bytes,
+        stream=stream,
+        force=force,
+        bulk_load=bulk_load,
+        _sha256=hashlib.sha256(),
+    )
+    _save(session)
+    with _lock:
+        _prune_expired()
+        _sessions[upload_id] = session
+    if stream:
+        job = import_jobs.submit_spooled(
+            path, filename, source,
+            update_on_conflict=update_on_conflict,
+            workers=workers,
+            reader=lambda: _TailReader(session),
+            bytes_total=total_bytes or 0,
+            force=force,
+            bulk_load=bulk_load,
+        )
+        session.job_id = job.id
+        _save(session)
+    log.info("Began upload %s source=%s filename=%s stream=%s", upload_id, source, filename, stream)
+    return session
+
+
+def _check_job(session: UploadSession) -> None:
+    # A streaming import that failed or was cancelled cannot take more data.
+    job = import_jobs.get_job(session.job_id) if session.job_id else None
+    if job is not None and job.status in import_jobs.FINISHED and session.status == OPEN:
+        raise UploadError(f"Upload {session.id}: import job {job.id} is {job.status}")
+
+
+def append_chunk(upload_id: str, offset: int, chunk: Any, sha256: str) -> UploadSession:
+    """Append one chunk at ``offset`` after checking its SHA-256 (hex)."""
+    session = _require(upload_id)
+    data = chunk if isinstance(chunk, (bytes, bytearray)) else _get_binary_stream(chunk).read(
+        settings.upload_chunk_max_bytes + 1
+    )
+    if len(data) > settings.upload_chunk_max_bytes:
+        raise UploadError(f"Chunk exceeds {settings.upload_chunk_max_bytes} bytes")
+    if hashlib.sha256(data).hexdigest() != sha256.lower():
+        raise UploadError(f"Upload {upload_id}: checksum mismatch for chunk at offset {offset}")
+
+    with session._cond:
+        if session.status != OPEN:
+            raise UploadError(f"Upload {upload_id} is {session.status}")
+        _check_job(session)
+        if 0 <= offset and offset + len(data) <= session.received:
+            return session  # a retry of an acknowledged chunk
+        if offset != session.received:
+            raise UploadOffsetMismatch(upload_id, offset, session.received)
+        if session.total_bytes is not None and offset + len(data) > session.total_bytes:
+            raise UploadError(f"Upload {upload_id}: chunk runs past total_bytes {session.total_bytes}")
+        if settings.upload_max_bytes is not None and offset + len(data) > settings.upload_max_bytes:
+            raise UploadError(f"Upload {upload_id}: exceeds {settings.upload_max_bytes} bytes")
+        if session._sha256 is None:
+            session._sha256 = _hash_file(session.path, session.received)
+        with open(session.path, "r+b") as fh:
+            fh.seek(offset)
+            fh.write(data)
+            fh.truncate()
+        session._sha256.update(data)
+        session.received += len(data)
+        session.updated_at = time.time()
+        _save(session)
+        session._cond.notify_all()
+    return session
+
+
+def _hash_file(path: str, length: int):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while length > 0 and (block := fh.read(min(length, 1 << 20))):
+            h.update(block)
+            length -= len(block)
+    return h
+
+
+def finalize_upload(upload_id: str, sha256: Optional[str] = None) -> import_jobs.ImportJob:
+    """Close the upload and return the import job that runs from the spooled file."""
+    session = _require(upload_id)
+    with session._cond:
+        if session.status == FINALIZED and session.job_id:
+            job = import_jobs.get_job(session.job_id)
+            if job is not None:
+                return job
+        if session.status != OPEN:
+            raise UploadError(f"Upload {upload_id} is {session.status}")
+        _check_job(session)
+        job = import_jobs.get_job(session.job_id) if session.job_id else None
+        if session.job_id and job is None:
+            raise UploadError(f"Upload {upload_id}: import job {session.job_id} no longer exists")
+        if session.total_bytes is not None and session.received != session.total_bytes:
+            raise UploadError(f"Upload {upload_id}: received {session.received} of {session.total_bytes} bytes")
+        if session._sha256 is None:
+            session._sha256 = _hash_file(session.path, session.received)
+        if sha256 and session._sha256.hexdigest() != sha256.lower():
+            raise UploadError(f"Upload {upload_id}: file checksum mismatch")
+        session.status, session.updated_at = FINALIZED, time.time()
+        session._cond.notify_all()
+    if job is None:
+        job = import_jobs.submit_spooled(
+            session.path, session.filename, session.source,
+            update_on_conflict=session.update_on_conflict,
+            workers=session.workers,
+            content_sha256=session._sha256.hexdigest(),
+            force=session.force,
+            bulk_load=session.bulk_load,
+        )
+        session.job_id = job.id
+    else:
+        job.bytes_total = session.received
+    _remove_files(session, spool=False)  # the job owns the spool file from here
+    log.info("Finalized upload %s bytes=%d job=%s", upload_id, session.received, job.id)
+    return job
+
+
+def _abort(session: UploadSession) -> None:
+    with session._cond:
+        session.status, session.updated_at = ABORTED, time.time()
+        session._cond.notify_all()
+    if session.job_id:
+        import_jobs.cancel_job(session.job_id)  # a streaming job removes the spool file itself
+    _remove_files(session, spool=session.job_id is None)
+
+
+def abort_upload(upload_id: str) -> Optional[UploadSession]:
+    session = get_session(upload_id)
+    if session is not None and session.status == OPEN:
+        _abort(session)
+        log.info("Aborted upload %s at %d bytes", upload_id, session.received)
+    return session
+
+
+class _TailReader(io.RawIOBase):
+    """Reads the acknowledged bytes of a spool file, waiting for chunks until finalized."""
+
+    def __init__(self, session: UploadSession):
+        self.session = session
+        self.name = session.path
+        self._fh = open(session.path, "rb")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        s = self.session
+        with s._cond:
+            while self._pos >= s.received:
+                if s.status == FINALIZED:
+                    return 0
+                job = import_jobs.get_job(s.job_id) if s.job_id else None
+                if s.status == ABORTED or (job is not None and job.cancel_requested):
+                    raise ImportCancelled(s.job_id)
+                if time.time() - s.updated_at > settings.upload_stream_idle_sec:
+                    raise TimeoutError(f"Upload {s.id}: no chunk for {settings.upload_stream_idle_sec:g}s")
+                s._cond.wait(timeout=1.0)
+            available = s.received - self._pos
+        n = self._fh.readinto(memoryview(b)[:available])
+        self._pos += n
+        return n
+
+    def close(self) -> None:
+        self._fh.close()
+        super().close()
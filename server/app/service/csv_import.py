@@ -1,14 +1,30 @@
 from __future__ import annotations
-import io, gzip, time, logging
-from typing import Dict, BinaryIO, Tuple, Any
-from app.config.db.connection import get_cursor
+import io, asyncio, codecs, hashlib, time, logging, threading, uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, BinaryIO, Iterator, Optional, Tuple, Any
+import psycopg
+from app.config.db.connection import get_async_cursor, get_cursor, pin_reads_to_primary, pool_max_size
+from app.config.db_setup import settings
+from app.service.bulk_load import DDL_DEFERRED_INDEXES, DeferredIndexes, deferred_index_names, start_restore
+from app.service.cache import bump_generation
+from app.service.decoders import UploadDecoder, open_decoded
+from app.service.import_ledger import DDL_LEDGER, DUPLICATE, FAILED, CANCELLED, SUCCEEDED, claim_import, find_import, record_import
+from app.service.metrics import MemoryWatermark, PhaseClock, observe_import
+from app.service.sales_checkpoints import (
+    DDL_CHECKPOINTS, CHECKPOINT_CTE, SUBTRACT_CHECKPOINTS, DELETE_EMPTY_CHECKPOINTS, backfill_sales_checkpoints,
+)
+from app.service.sales_indexes import ensure_sales_indexes
+from app.service.sales_partitions import ensure_sales_partitions, sales_is_partitioned
+from app.service.sales_summary import (
+    DDL_ROLLUP, ROLLUP_CTE, ROLLUP_RETURNING, SUBTRACT_ROLLUP, DELETE_EMPTY_ROLLUP,
+    ROLLUP_LOCK_KEY, backfill_sales_rollups,
+)
 
 log = logging.getLogger("app.service.csv_import")
 
 
-DDL_SALES = """
-CREATE TABLE IF NOT EXISTS sales (
-  order_id        BIGINT PRIMARY KEY,
+SALES_TABLE_COLUMNS = """
+  order_id        BIGINT  NOT NULL,
   region          TEXT    NOT NULL,
   country         TEXT    NOT NULL,
   item_type       TEXT    NOT NULL,
@@ -22,23 +38,146 @@ CREATE TABLE IF NOT EXISTS sales (
   total_revenue   NUMERIC(18,2)  NOT NULL,
   total_cost      NUMERIC(18,2)  NOT NULL,
   total_profit    NUMERIC(18,2)  NOT NULL
+"""
+
+DDL_SALES_TABLE = "CREATE TABLE IF NOT EXISTS sales (" + SALES_TABLE_COLUMNS + """,
+  PRIMARY KEY (order_id)
 );
-CREATE INDEX IF NOT EXISTS idx_sales_order_date ON sales(order_date);
+"""
+
+# settings.sales_partitioned: monthly range partitions on order_date (see
+# sales_partitions). A unique key on a partitioned table must contain the
+# partition key, so there orders conflict on (order_id, order_date).
+DDL_SALES_PARTITIONED = "CREATE TABLE IF NOT EXISTS sales (" + SALES_TABLE_COLUMNS + """,
+  PRIMARY KEY (order_id, order_date)
+) PARTITION BY RANGE (order_date);
+"""
+
+# The (order_date, order_id) and trigram indexes are left to
+# app.service.sales_indexes. pg_trgm ships with PostgreSQL's contrib; where it
+# cannot be installed CONTAINS search keeps working, unindexed.
+DDL_SALES_INDEXES = """
 CREATE INDEX IF NOT EXISTS idx_sales_country    ON sales(country);
 CREATE INDEX IF NOT EXISTS idx_sales_item_type  ON sales(item_type);
+DO $$
+BEGIN
+  CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION WHEN feature_not_supported OR undefined_file OR insufficient_privilege THEN
+  RAISE NOTICE 'pg_trgm is not available; sales search will not be indexed';
+END $$;
+"""
+
+# Rows that fail validation are kept here with a reason code. raw holds the
+# original 14 field values in CSV header order.
+DDL_REJECTS = """
+CREATE TABLE IF NOT EXISTS import_rejects (
+  id           BIGSERIAL   PRIMARY KEY,
+  import_id    TEXT        NOT NULL,
+  source       TEXT        NOT NULL,
+  line_no      BIGINT,
+  reason       TEXT        NOT NULL,
+  raw          TEXT[]      NOT NULL,
+  rejected_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_import_rejects_source ON import_rejects(source, id);
+CREATE INDEX IF NOT EXISTS idx_import_rejects_import ON import_rejects(import_id, id);
+
+-- True when to_date(v, 'MM/DD/YYYY') would succeed and mean the same day.
+CREATE OR REPLACE FUNCTION csv_date_ok(v TEXT) RETURNS BOOLEAN
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+  SELECT CASE
+    WHEN v ~ '^(0?[1-9]|1[0-2])/(0?[1-9]|[12][0-9]|3[01])/[0-9]{4}$'
+         AND split_part(v, '/', 3)::int > 0
+    THEN split_part(v, '/', 2)::int <= extract(day FROM
+           make_date(split_part(v, '/', 3)::int, split_part(v, '/', 1)::int, 1)
+           + interval '1 month - 1 day')
+    ELSE false
+  END
+$$;
 """
 
-DDL_STAGE = """
-CREATE TEMP TABLE sales_import (
+# Schema the importer relies on, applied once per process by ensure_schema()
+# after the sales table itself.
+SCHEMA_DDL = (DDL_SALES_INDEXES, DDL_REJECTS, DDL_ROLLUP, DDL_CHECKPOINTS, DDL_LEDGER)
+SCHEMA_LOCK_KEY = 0x5A1E5  # pg_advisory_xact_lock key serialising DDL across servers
+
+REJECT_REASONS = (
+    "missing_field", "bad_order_id", "bad_order_date", "bad_ship_date",
+    "bad_units_sold", "bad_unit_price", "bad_unit_cost",
+    "bad_total_revenue", "bad_total_cost", "bad_total_profit", "out_of_range",
+)
+
+STAGE_COLUMNS = """
   "Region"          TEXT, "Country"        TEXT, "Item Type"     TEXT,
   "Sales Channel"   TEXT, "Order Priority" TEXT,
   "Order Date"      TEXT, "Order ID"       TEXT, "Ship Date"     TEXT,
   "Units Sold"      TEXT, "Unit Price"     TEXT, "Unit Cost"     TEXT,
   "Total Revenue"   TEXT, "Total Cost"     TEXT, "Total Profit"  TEXT
-) ON COMMIT DROP;
 """
 
-COPY_STAGE = "COPY sales_import FROM STDIN WITH (FORMAT csv, HEADER true)"
+STAGE_COPY_COLUMNS = """
+  "Region", "Country", "Item Type", "Sales Channel", "Order Priority",
+  "Order Date", "Order ID", "Ship Date", "Units Sold", "Unit Price",
+  "Unit Cost", "Total Revenue", "Total Cost", "Total Profit"
+"""
+
+# line_no is the 1-based CSV record number (the header is record 1). Every
+# session that COPYs keeps its own temp sequence named csv_import_line and
+# positions it at the first record of the piece it is about to send; the
+# ::text cast makes the default resolve that name at insert time.
+STAGE_LINE_COLUMN = ", line_no BIGINT DEFAULT nextval('csv_import_line'::text)"
+DDL_LINE_SEQ = "CREATE TEMP SEQUENCE IF NOT EXISTS csv_import_line"
+SET_LINE_SEQ = "SELECT setval('csv_import_line', %s, false)"
+
+DDL_STAGE = "CREATE TEMP TABLE sales_import (" + STAGE_COLUMNS + STAGE_LINE_COLUMN + ") ON COMMIT DROP;"
+
+# Parallel ingest stages into a regular UNLOGGED table so several pooled
+# connections can COPY into it concurrently; the merge drops it on commit.
+DDL_STAGE_SHARED = "CREATE UNLOGGED TABLE {stage} (" + STAGE_COLUMNS + STAGE_LINE_COLUMN + ");"
+DROP_STAGE_SHARED = "DROP TABLE IF EXISTS {stage};"
+
+COPY_STAGE = "COPY sales_import (" + STAGE_COPY_COLUMNS + ") FROM STDIN WITH (FORMAT csv, HEADER true)"
+COPY_STAGE_SHARED = "COPY {stage} (" + STAGE_COPY_COLUMNS + ") FROM STDIN WITH (FORMAT csv, HEADER true)"
+COPY_STAGE_CHUNK = "COPY {stage} (" + STAGE_COPY_COLUMNS + ") FROM STDIN WITH (FORMAT csv, HEADER false)"
+
+VALID_ROW_PREDICATE = """
+      "Order ID" ~ '^[0-9]+$'
+  AND "Units Sold" ~ '^[0-9]+$'
+  AND "Unit Price" ~ '^[0-9]+(\\.[0-9]+)?$'
+  AND "Unit Cost" ~ '^[0-9]+(\\.[0-9]+)?$'
+  AND "Total Revenue" ~ '^[0-9]+(\\.[0-9]+)?$'
+  AND "Total Cost" ~ '^[0-9]+(\\.[0-9]+)?$'
+  AND "Total Profit" ~ '^-?[0-9]+(\\.[0-9]+)?$'
+"""
+
+SALES_COLUMNS = """
+  region, country, item_type, sales_channel, order_priority,
+  order_date, order_id, ship_date, units_sold,
+  unit_price, unit_cost, total_revenue, total_cost, total_profit
+"""
+
+# {key} is the sales primary key: order_id, or order_id, order_date when the
+# table is partitioned (CONFLICT_KEYS).
+CONFLICT_KEYS = {False: "order_id", True: "order_id, order_date"}
+ON_CONFLICT_DO_NOTHING = "ON CONFLICT ({key}) DO NOTHING"
+ON_CONFLICT_DO_UPDATE = """ON CONFLICT ({key}) DO UPDATE SET
+  region        = EXCLUDED.region,
+  country       = EXCLUDED.country,
+  item_type     = EXCLUDED.item_type,
+  sales_channel = EXCLUDED.sales_channel,
+  order_priority= EXCLUDED.order_priority,
+  order_date    = EXCLUDED.order_date,
+  ship_date     = EXCLUDED.ship_date,
+  units_sold    = EXCLUDED.units_sold,
+  unit_price    = EXCLUDED.unit_price,
+  unit_cost     = EXCLUDED.unit_cost,
+  total_revenue = EXCLUDED.total_revenue,
+  total_cost    = EXCLUDED.total_cost,
+  total_profit  = EXCLUDED.total_profit"""
+
+# --- multi_pass engine ------------------------------------------------------
+# The original engine: three counting scans over the staging table, then the
+# typed CTE (regexes and casts) is evaluated again inside the INSERT.
 
 VALID_TYPED_CTE = """
 WITH typed AS (
@@ -56,67 +195,180 @@ WITH typed AS (
     ("Unit Cost")::numeric(10,2)         AS unit_cost,
     ("Total Revenue")::numeric(18,2)     AS total_revenue,
     ("Total Cost")::numeric(18,2)        AS total_cost,
-    ("Total Profit")::numeric(18,2)      AS total_profit
-  FROM sales_import
-  WHERE "Order ID" ~ '^[0-9]+$'
-    AND "Units Sold" ~ '^[0-9]+$'
-    AND "Unit Price" ~ '^[0-9]+(\\.[0-9]+)?$'
-    AND "Unit Cost" ~ '^[0-9]+(\\.[0-9]+)?$'
-    AND "Total Revenue" ~ '^[0-9]+(\\.[0-9]+)?$'
-    AND "Total Cost" ~ '^[0-9]+(\\.[0-9]+)?$'
-    AND "Total Profit" ~ '^-?[0-9]+(\\.[0-9]+)?$'
-)
+    ("Total Profit")::numeric(18,2)      AS total_profit,
+    line_no
+  FROM {stage}
+  WHERE""" + VALID_ROW_PREDICATE + """)
 """
 
-COUNT_TOTAL = "SELECT COUNT(*) FROM sales_import;"
+COUNT_TOTAL = "SELECT COUNT(*) FROM {stage};"
 COUNT_VALID = VALID_TYPED_CTE + "SELECT COUNT(*) FROM typed;"
 COUNT_DUP_IN_FILE = """
 SELECT COALESCE(COUNT(*) - COUNT(DISTINCT NULLIF("Order ID", '')), 0) AS dup_in_file
-FROM sales_import;
+FROM {stage};
 """
 
-INSERT_FROM_TYPED_DO_NOTHING = VALID_TYPED_CTE + """
-INSERT INTO sales (
-  region, country, item_type, sales_channel, order_priority,
-  order_date, order_id, ship_date, units_sold,
-  unit_price, unit_cost, total_revenue, total_cost, total_profit
+# Every INSERT INTO sales runs as `ins` and hands what it wrote to the rollup
+# and checkpoint CTEs, so sales_rollup_monthly and sales_checkpoints commit
+# with the rows they summarise.
+FOLD_CTES = ROLLUP_CTE + ", " + CHECKPOINT_CTE
+INSERT_FROM_TYPED = VALID_TYPED_CTE.rstrip() + ",\nins AS (\nINSERT INTO sales (" + SALES_COLUMNS + ")\nSELECT" + SALES_COLUMNS + "FROM {{rows}}\n"
+INSERT_FROM_TYPED_DO_NOTHING = (
+    INSERT_FROM_TYPED.replace("{{rows}}", "typed")
+    + ON_CONFLICT_DO_NOTHING + "\n" + ROLLUP_RETURNING + "\n), " + FOLD_CTES + "\nSELECT COUNT(*) FROM ins;"
+)
+# As in the single_pass upsert below, the last record of a repeated order_id wins.
+INSERT_FROM_TYPED_DO_UPDATE = (
+    INSERT_FROM_TYPED.replace("{{rows}}", "(SELECT DISTINCT ON (order_id) * FROM typed ORDER BY order_id, line_no DESC) t")
+    + ON_CONFLICT_DO_UPDATE + "\n" + ROLLUP_RETURNING + "\n), " + FOLD_CTES + "\nSELECT COUNT(*) FROM ins;"
+)
+SUBTRACT_TYPED = "\n".join(
+    VALID_TYPED_CTE + subtract.format(key="{key}", ids="SELECT {key} FROM typed") + ";"
+    for subtract in (SUBTRACT_ROLLUP, SUBTRACT_CHECKPOINTS)
+)
+
+# --- single_pass engine -----------------------------------------------------
+# Every staged row is validated and cast exactly once, into sales_typed; the
+# counters come back from that same statement and the INSERT reads the typed
+# rows without re-running any regex or cast.
+
+DDL_TYPED = """
+CREATE TEMP TABLE sales_typed (
+  reject_reason   TEXT,
+  line_no         BIGINT,
+  raw_order_id    TEXT,
+  raw             TEXT[],
+  region          TEXT,
+  country         TEXT,
+  item_type       TEXT,
+  sales_channel   TEXT,
+  order_priority  TEXT,
+  order_date      DATE,
+  order_id        BIGINT,
+  ship_date       DATE,
+  units_sold      INTEGER,
+  unit_price      NUMERIC(10,2),
+  unit_cost       NUMERIC(10,2),
+  total_revenue   NUMERIC(18,2),
+  total_cost      NUMERIC(18,2),
+  total_profit    NUMERIC(18,2)
+) ON COMMIT DROP;
+"""
+
+# The first failing check names the reject reason; NULL means every cast is
+# safe. Money is range-checked once rounded to cents, as the cast rounds it.
+REJECT_REASON_EXPR = """CASE
+    WHEN s."Region" IS NULL OR s."Country" IS NULL OR s."Item Type" IS NULL
+      OR s."Sales Channel" IS NULL OR s."Order Priority" IS NULL          THEN 'missing_field'
+    WHEN NOT COALESCE(s."Order ID" ~ '^[0-9]+$', false)                   THEN 'bad_order_id'
+    WHEN NOT COALESCE(csv_date_ok(s."Order Date"), false)                 THEN 'bad_order_date'
+    WHEN NOT COALESCE(csv_date_ok(s."Ship Date"), false)                  THEN 'bad_ship_date'
+    WHEN NOT COALESCE(s."Units Sold" ~ '^[0-9]+$', false)                 THEN 'bad_units_sold'
+    WHEN NOT COALESCE(s."Unit Price" ~ '^[0-9]+(\\.[0-9]+)?$', false)     THEN 'bad_unit_price'
+    WHEN NOT COALESCE(s."Unit Cost" ~ '^[0-9]+(\\.[0-9]+)?$', false)      THEN 'bad_unit_cost'
+    WHEN NOT COALESCE(s."Total Revenue" ~ '^[0-9]+(\\.[0-9]+)?$', false)  THEN 'bad_total_revenue'
+    WHEN NOT COALESCE(s."Total Cost" ~ '^[0-9]+(\\.[0-9]+)?$', false)     THEN 'bad_total_cost'
+    WHEN NOT COALESCE(s."Total Profit" ~ '^-?[0-9]+(\\.[0-9]+)?$', false) THEN 'bad_total_profit'
+    WHEN length(s."Order ID") > 18 OR length(s."Units Sold") > 9
+      OR length(split_part(s."Unit Price", '.', 1)) > 8
+      OR length(split_part(s."Unit Cost", '.', 1)) > 8
+      OR length(split_part(s."Total Revenue", '.', 1)) > 16
+      OR length(split_part(s."Total Cost", '.', 1)) > 16
+      OR length(split_part(ltrim(s."Total Profit", '-'), '.', 1)) > 16 THEN 'out_of_range'
+    WHEN round(s."Unit Price"::numeric, 2) >= 1e8
+      OR round(s."Unit Cost"::numeric, 2) >= 1e8
+      OR round(s."Total Revenue"::numeric, 2) >= 1e16
+      OR round(s."Total Cost"::numeric, 2) >= 1e16
+      OR abs(round(s."Total Profit"::numeric, 2)) >= 1e16             THEN 'out_of_range'
+  END"""
+
+# Valid rows carry typed values; rejected rows keep their raw fields and line
+# number for import_rejects, plus the raw Order ID (for dup_in_file).
+# OFFSET 0 keeps the planner from inlining the reason into every CASE below.
+STAGE_TYPED = """
+WITH staged AS (
+  INSERT INTO sales_typed (reject_reason, line_no, raw_order_id, raw,""" + SALES_COLUMNS + """)
+  SELECT v.reason, s.line_no, s."Order ID",
+    CASE WHEN v.reason IS NOT NULL THEN ARRAY[
+      s."Region", s."Country", s."Item Type", s."Sales Channel", s."Order Priority",
+      s."Order Date", s."Order ID", s."Ship Date", s."Units Sold", s."Unit Price",
+      s."Unit Cost", s."Total Revenue", s."Total Cost", s."Total Profit"
+    ] END,
+    CASE WHEN v.reason IS NULL THEN s."Region" END,
+    CASE WHEN v.reason IS NULL THEN s."Country" END,
+    CASE WHEN v.reason IS NULL THEN s."Item Type" END,
+    CASE WHEN v.reason IS NULL THEN s."Sales Channel" END,
+    CASE WHEN v.reason IS NULL THEN s."Order Priority" END,
+    CASE WHEN v.reason IS NULL THEN to_date(s."Order Date", 'MM/DD/YYYY') END,
+    CASE WHEN v.reason IS NULL THEN (s."Order ID")::bigint END,
+    CASE WHEN v.reason IS NULL THEN to_date(s."Ship Date", 'MM/DD/YYYY') END,
+    CASE WHEN v.reason IS NULL THEN (s."Units Sold")::int END,
+    CASE WHEN v.reason IS NULL THEN (s."Unit Price")::numeric(10,2) END,
+    CASE WHEN v.reason IS NULL THEN (s."Unit Cost")::numeric(10,2) END,
+    CASE WHEN v.reason IS NULL THEN (s."Total Revenue")::numeric(18,2) END,
+    CASE WHEN v.reason IS NULL THEN (s."Total Cost")::numeric(18,2) END,
+    CASE WHEN v.reason IS NULL THEN (s."Total Profit")::numeric(18,2) END
+  FROM {stage} s
+  CROSS JOIN LATERAL (SELECT """ + REJECT_REASON_EXPR + """ AS reason OFFSET 0) v
+  RETURNING reject_reason, raw_order_id
 )
-SELECT region, country, item_type, sales_channel, order_priority,
-       order_date, order_id, ship_date, units_sold,
-       unit_price, unit_cost, total_revenue, total_cost, total_profit
-FROM typed
-ON CONFLICT (order_id) DO NOTHING
-RETURNING 1;
+SELECT COUNT(*),
+       COUNT(*) FILTER (WHERE reject_reason IS NULL),
+       COALESCE(COUNT(*) - COUNT(DISTINCT NULLIF(raw_order_id, '')), 0)
+FROM staged;
 """
 
-INSERT_FROM_TYPED_DO_UPDATE = VALID_TYPED_CTE + """
-INSERT INTO sales (
-  region, country, item_type, sales_channel, order_priority,
-  order_date, order_id, ship_date, units_sold,
-  unit_price, unit_cost, total_revenue, total_cost, total_profit
+# Only run when the counters report invalid rows, so clean files pay nothing.
+INSERT_REJECTS = """
+INSERT INTO import_rejects (import_id, source, line_no, reason, raw)
+SELECT %s, %s, line_no, reject_reason, raw
+FROM sales_typed
+WHERE reject_reason IS NOT NULL;
+"""
+
+INSERT_FROM_STAGED = "WITH ins AS (\nINSERT INTO sales (" + SALES_COLUMNS + ")\nSELECT" + SALES_COLUMNS + "FROM {rows}\n"
+INSERT_FROM_STAGED_DO_NOTHING = (
+    INSERT_FROM_STAGED.format(rows="sales_typed\nWHERE reject_reason IS NULL")
+    + ON_CONFLICT_DO_NOTHING + "\n" + ROLLUP_RETURNING + "\n), " + FOLD_CTES + "\nSELECT COUNT(*) FROM ins;"
 )
-SELECT region, country, item_type, sales_channel, order_priority,
-       order_date, order_id, ship_date, units_sold,
-       unit_price, unit_cost, total_revenue, total_cost, total_profit
-FROM typed
-ON CONFLICT (order_id) DO UPDATE SET
-  region        = EXCLUDED.region,
-  country       = EXCLUDED.country,
-  item_type     = EXCLUDED.item_type,
-  sales_channel = EXCLUDED.sales_channel,
-  order_priority= EXCLUDED.order_priority,
-  order_date    = EXCLUDED.order_date,
-  ship_date     = EXCLUDED.ship_date,
-  units_sold    = EXCLUDED.units_sold,
-  unit_price    = EXCLUDED.unit_price,
-  unit_cost     = EXCLUDED.unit_cost,
-  total_revenue = EXCLUDED.total_revenue,
-  total_cost    = EXCLUDED.total_cost,
-  total_profit  = EXCLUDED.total_profit
-RETURNING 1;
+# An upsert may not touch the same order_id twice, so when a file repeats an
+# id its last record wins.
+INSERT_FROM_STAGED_DO_UPDATE = (
+    INSERT_FROM_STAGED.format(rows="""(
+  SELECT DISTINCT ON (order_id) * FROM sales_typed
+  WHERE reject_reason IS NULL
+  ORDER BY order_id, line_no DESC
+) t""")
+    + ON_CONFLICT_DO_UPDATE + "\n" + ROLLUP_RETURNING + "\n), " + FOLD_CTES + "\nSELECT COUNT(*) FROM ins;"
+)
+SUBTRACT_STAGED = "\n".join(
+    subtract.format(key="{key}", ids="SELECT {key} FROM sales_typed WHERE reject_reason IS NULL") + ";"
+    for subtract in (SUBTRACT_ROLLUP, SUBTRACT_CHECKPOINTS)
+)
+
+# --- arrow engine -----------------------------------------------------------
+# Rows are parsed, validated and typed client-side (see arrow_import) and
+# land in sales_typed already typed; only dup_in_file, the rejects copy and
+# the final INSERT run on the server.
+
+# Months the valid rows fall in, for creating partitions before the insert.
+SALES_MONTHS_STAGED = "SELECT DISTINCT date_trunc('month', order_date)::date FROM sales_typed WHERE reject_reason IS NULL;"
+SALES_MONTHS_TYPED = VALID_TYPED_CTE + "SELECT DISTINCT date_trunc('month', order_date)::date FROM typed;"
+
+COUNT_DUP_TYPED = """
+SELECT COALESCE(COUNT(*) - COUNT(DISTINCT NULLIF(raw_order_id, '')), 0) FROM sales_typed;
 """
 
+ENGINES = ("single_pass", "multi_pass", "arrow")
+
 CHUNK_SIZE = 1 << 20
+# Target size of one line-aligned piece handed to a parallel COPY worker.
+PARALLEL_CHUNK_SIZE = 16 << 20
+MAX_IMPORT_WORKERS = 16
+
+def _import_workers(workers: Optional[int]) -> int:
+    """COPY workers for one import, leaving a pooled connection for the coordinating cursor."""
+    return max(1, min(workers or settings.import_workers, MAX_IMPORT_WORKERS, pool_max_size() - 1))
 
 def _get_binary_stream(upload_file: Any) -> BinaryIO:
 
@@ -128,6 +380,380 @@ def _get_binary_stream(upload_file: Any) -> BinaryIO:
         return upload_file
     raise TypeError(f"Unsupported upload object {type(upload_file)}")
 
+class ImportCancelled(Exception):
+    """Raised from a progress callback to abort an import at the next checkpoint."""
+
+class ImportLimitExceeded(ValueError):
+    """An upload over the import's ``max_bytes`` or ``max_rows``; the import is rolled back."""
+
+# progress(phase, counters) is called from the importing thread between COPY
+# chunks and statements; raising ImportCancelled from it rolls the import back.
+ProgressFn = Callable[[str, Dict[str, int]], None]
+
+# Progress phases and the PhaseClock phase each one starts.
+_PROGRESS_PHASES = {"validating": "validate", "inserting": "insert", "committing": "commit"}
+
+def _clocked(clock: PhaseClock, progress: Optional[ProgressFn], max_rows: Optional[int] = None) -> ProgressFn:
+    """Progress callback that moves ``clock`` on, then calls ``progress``; stops an upload over ``max_rows``."""
+    def report(phase: str, counters: Dict[str, int]) -> None:
+        if max_rows is not None and counters.get("rows_staged", 0) > max_rows:
+            raise ImportLimitExceeded(f"Upload has {counters['rows_staged']} rows; the limit is {max_rows}")
+        if phase in _PROGRESS_PHASES:
+            clock.mark(_PROGRESS_PHASES[phase])
+        if progress:
+            progress(phase, counters)
+    return report
+
+class _CountingReader(io.RawIOBase):
+    """Pass-through reader that counts, hashes and times the raw bytes read from the upload."""
+
+    def __init__(self, raw: BinaryIO, max_bytes: Optional[int] = None, memory: Optional[MemoryWatermark] = None):
+        self.raw = raw
+        self.count = 0
+        self.sha256 = hashlib.sha256()
+        self.read_sec = self.decode_sec = 0.0
+        self.max_bytes, self.memory = max_bytes, memory
+
+    def readable(self) -> bool:
+        return True
+
+    def tally(self, data: bytes, read_sec: float) -> None:
+        self.count += len(data)
+        self.sha256.update(data)
+        self.read_sec += read_sec
+        if self.memory is not None:
+            self.memory.sample()
+        if self.max_bytes is not None and self.count > self.max_bytes:
+            raise ImportLimitExceeded(f"Upload exceeds {self.max_bytes} bytes")
+
+    def readinto(self, b) -> int:
+        t0 = time.perf_counter()
+        data = self.raw.read(len(b))
+        self.tally(data, time.perf_counter() - t0)
+        n = len(data)
+        b[:n] = data
+        return n
+
+class _DecodeTimer(io.RawIOBase):
+    """Reads a decoded stream, adding its time minus the raw reads to ``counter.decode_sec``."""
+
+    def __init__(self, decoded: BinaryIO, counter: _CountingReader):
+        self.decoded, self.counter = decoded, counter
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        t0, read0 = time.perf_counter(), self.counter.read_sec
+        n = self.decoded.readinto(b)
+        self.counter.decode_sec += time.perf_counter() - t0 - (self.counter.read_sec - read0)
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self.decoded.close()
+        super().close()
+
+def _open_binary_stream(upload_file: Any, counter: Optional[_CountingReader] = None) -> BinaryIO:
+    """Rewound byte stream of the upload, decoded to CSV (see app.service.decoders)."""
+    # Normalize to a binary stream and rewind if possible
+    bin_stream = _get_binary_stream(upload_file)
+    if hasattr(bin_stream, "seek"):
+        try: bin_stream.seek(0)
+        except Exception: pass
+    if counter is not None:
+        counter.raw = bin_stream
+        bin_stream = io.BufferedReader(counter, CHUNK_SIZE)
+    elif not hasattr(bin_stream, "peek"):
+        bin_stream = io.BufferedReader(bin_stream, CHUNK_SIZE)
+
+    # The codec and format are sniffed from the leading bytes, not the file
+    # name; plain CSV comes back as bin_stream itself.
+    decoded = open_decoded(bin_stream)
+    if decoded is bin_stream or counter is None:
+        return decoded
+    return io.BufferedReader(_DecodeTimer(decoded, counter), CHUNK_SIZE)
+
+def _open_text_stream(upload_file: Any, counter: Optional[_CountingReader] = None) -> io.TextIOBase:
+    # utf-8-sig handles BOM if present
+    return io.TextIOWrapper(_open_binary_stream(upload_file, counter), encoding="utf-8-sig", newline="")
+
+def _record_boundary(buf: str, quotes: int) -> int:
+    """Index just past the last newline in ``buf`` outside quotes, or -1; ``quotes`` were seen before it."""
+    pos = buf.rfind("\n")
+    while pos != -1:
+        if (quotes + buf.count('"', 0, pos)) % 2 == 0:
+            return pos + 1
+        pos = buf.rfind("\n", 0, pos)
+    return -1
+
+def _count_records(piece: str) -> int:
+    """Number of CSV records in a record-aligned piece (quoted newlines excluded)."""
+    if '"' not in piece:
+        return piece.count("\n")
+    records, quotes = 0, 0
+    for line in piece.split("\n")[:-1]:
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            records += 1
+    return records
+
+def _iter_line_chunks(
+    text_stream: io.TextIOBase,
+    target_size: int = PARALLEL_CHUNK_SIZE,
+    first_line: int = 2,
+) -> Iterator[Tuple[int, str]]:
+    """Yield record-aligned ``(first line_no, piece)`` of a CSV text stream past its header."""
+    pending, quotes, line_no = "", 0, first_line
+    for block in iter(lambda: text_stream.read(CHUNK_SIZE), ""):
+        pending += block
+        if len(pending) < target_size:
+            continue
+        cut = _record_boundary(pending, quotes)
+        if cut <= 0:
+            continue
+        piece, pending = pending[:cut], pending[cut:]
+        quotes += piece.count('"')
+        yield line_no, piece
+        line_no += _count_records(piece)
+    if pending:
+        yield line_no, pending
+
+def _start_line_numbers(cur: psycopg.Cursor, line_no: int) -> None:
+    cur.execute(DDL_LINE_SEQ)
+    cur.execute(SET_LINE_SEQ, [line_no])
+
+def _copy_chunk(stage: str, line_no: int, chunk: str, speed_optimize: bool) -> None:
+    with get_cursor() as cur:
+        if speed_optimize:
+            cur.execute("SET LOCAL synchronous_commit = off")
+        _start_line_numbers(cur, line_no)
+        with cur.copy(COPY_STAGE_CHUNK.format(stage=stage)) as cp:
+            cp.write(chunk)
+
+def _copy_parallel(
+    text_stream: io.TextIOBase,
+    stage: str,
+    workers: int,
+    speed_optimize: bool,
+    on_chunk: Optional[Callable[[], None]] = None,
+) -> None:
+    """COPY the stream into ``stage`` over ``workers`` pooled connections, at most ``2 * workers`` chunks in flight."""
+    text_stream.readline()  # header
+    slots = threading.BoundedSemaphore(workers * 2)
+    failed = threading.Event()
+    futures = []
+
+    def _done(fut) -> None:
+        if not fut.cancelled() and fut.exception() is not None:
+            failed.set()
+        slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="csv-copy") as pool:
+        try:
+            for line_no, chunk in _iter_line_chunks(text_stream):
+                slots.acquire()
+                if failed.is_set():
+                    slots.release()
+                    break
+                fut = pool.submit(_copy_chunk, stage, line_no, chunk, speed_optimize)
+                fut.add_done_callback(_done)
+                futures.append(fut)
+                if on_chunk:
+                    on_chunk()
+        except BaseException:
+            failed.set()
+            raise
+        finally:
+            if failed.is_set():
+                for fut in futures:
+                    fut.cancel()
+    for fut in futures:
+        if not fut.cancelled():
+            fut.result()
+
+def _insert_sales(cur: psycopg.Cursor, update_on_conflict: bool, stage: Optional[str] = None) -> int:
+    """Insert the valid rows into sales and fold them, net of the rows they overwrite, into the rollup and checkpoints."""
+    key = CONFLICT_KEYS[_SALES_PARTITIONED]
+    if _SALES_PARTITIONED:
+        cur.execute(SALES_MONTHS_TYPED.format(stage=stage) if stage else SALES_MONTHS_STAGED)
+        ensure_sales_partitions([m for (m,) in cur.fetchall()])
+    lock = "pg_advisory_xact_lock" if update_on_conflict else "pg_advisory_xact_lock_shared"
+    cur.execute(f"SELECT {lock}(%s)", [ROLLUP_LOCK_KEY])
+    if stage is None:
+        subtract_sql = SUBTRACT_STAGED.format(key=key)
+        insert_sql = (INSERT_FROM_STAGED_DO_UPDATE if update_on_conflict else INSERT_FROM_STAGED_DO_NOTHING).format(key=key)
+    else:
+        subtract_sql = SUBTRACT_TYPED.format(stage=stage, key=key)
+        insert_sql = (INSERT_FROM_TYPED_DO_UPDATE if update_on_conflict else INSERT_FROM_TYPED_DO_NOTHING).format(stage=stage, key=key)
+    if update_on_conflict:
+        cur.execute(subtract_sql)
+    cur.execute(insert_sql);                            inserted     = int(cur.fetchone()[0])
+    if update_on_conflict:
+        cur.execute(DELETE_EMPTY_ROLLUP + DELETE_EMPTY_CHECKPOINTS)
+    return inserted
+
+def _merge_multi_pass(
+    cur: psycopg.Cursor,
+    stage: str,
+    update_on_conflict: bool,
+    progress: Optional[ProgressFn] = None,
+    rejects: Optional[Tuple[str, str]] = None,
+) -> Dict[str, int]:
+    # Legacy engine: invalid rows are only counted, never written to import_rejects.
+    cur.execute(COUNT_TOTAL.format(stage=stage));       total_rows   = int(cur.fetchone()[0])
+    if progress:
+        progress("validating", {"rows_staged": total_rows})
+    cur.execute(COUNT_VALID.format(stage=stage));       valid_rows   = int(cur.fetchone()[0])
+    cur.execute(COUNT_DUP_IN_FILE.format(stage=stage)); dup_in_file  = int(cur.fetchone()[0] or 0)
+
+    if progress:
+        progress("inserting", {})
+    inserted = _insert_sales(cur, update_on_conflict, stage)
+    if progress:
+        progress("committing", {"rows_inserted": inserted})
+
+    return {
+        "total_rows": total_rows,
+        "valid_rows": valid_rows,
+        "dup_in_file": dup_in_file,
+        "inserted": inserted,
+    }
+
+def _merge_single_pass(
+    cur: psycopg.Cursor,
+    stage: str,
+    update_on_conflict: bool,
+    progress: Optional[ProgressFn] = None,
+    rejects: Optional[Tuple[str, str]] = None,
+) -> Dict[str, int]:
+    """Validate, count and insert; with ``rejects`` (import_id, source) invalid rows go to import_rejects."""
+    if progress:
+        progress("validating", {})
+    cur.execute(DDL_TYPED)
+    cur.execute(STAGE_TYPED.format(stage=stage))
+    total_rows, valid_rows, dup_in_file = (int(v or 0) for v in cur.fetchone())
+    if rejects and valid_rows < total_rows:
+        cur.execute(INSERT_REJECTS, list(rejects))
+
+    if progress:
+        progress("inserting", {"rows_staged": total_rows})
+    inserted = _insert_sales(cur, update_on_conflict)
+    if progress:
+        progress("committing", {"rows_inserted": inserted})
+
+    return {
+        "total_rows": total_rows,
+        "valid_rows": valid_rows,
+        "dup_in_file": dup_in_file,
+        "inserted": inserted,
+    }
+
+def _merge_arrow(
+    cur: psycopg.Cursor,
+    bin_stream: BinaryIO,
+    update_on_conflict: bool,
+    progress: Optional[ProgressFn] = None,
+    rejects: Optional[Tuple[str, str]] = None,
+    on_batch: Optional[Callable[[int], None]] = None,
+    before_insert: Optional[Callable[[psycopg.Cursor], bool]] = None,
+) -> Optional[Dict[str, int]]:
+    """Parse and type the upload client-side, COPY it, then insert unless ``before_insert`` returns False."""
+    from app.service.arrow_import import stage_arrow
+
+    cur.execute(DDL_TYPED)
+    total_rows, valid_rows = stage_arrow(cur, bin_stream, on_batch)
+    if before_insert is not None and not before_insert(cur):
+        return None
+    cur.execute(COUNT_DUP_TYPED);                       dup_in_file  = int(cur.fetchone()[0] or 0)
+    if rejects and valid_rows < total_rows:
+        cur.execute(INSERT_REJECTS, list(rejects))
+
+    if progress:
+        progress("inserting", {"rows_staged": total_rows})
+    inserted = _insert_sales(cur, update_on_conflict)
+    if progress:
+        progress("committing", {"rows_inserted": inserted})
+
+    return {
+        "total_rows": total_rows,
+        "valid_rows": valid_rows,
+        "dup_in_file": dup_in_file,
+        "inserted": inserted,
+    }
+
+_MERGERS = {"single_pass": _merge_single_pass, "multi_pass": _merge_multi_pass}
+
+def _merge_staged(
+    cur: psycopg.Cursor,
+    stage: str,
+    update_on_conflict: bool,
+    progress: Optional[ProgressFn] = None,
+    engine: str = "single_pass",
+    rejects: Optional[Tuple[str, str]] = None,
+) -> Dict[str, int]:
+    return _MERGERS[engine](cur, stage, update_on_conflict, progress, rejects)
+
+def _merge_shared_stage(
+    stage: str,
+    update_on_conflict: bool,
+    speed_optimize: bool,
+    engine: str,
+    rejects: Tuple[str, str],
+    progress: Optional[ProgressFn] = None,
+    claim: Optional[Callable[[psycopg.Cursor], bool]] = None,
+    record: Optional[Callable[[psycopg.Cursor, Dict[str, int]], None]] = None,
+) -> Optional[Dict[str, int]]:
+    # The merge and the staging drop commit together, so `sales` sees
+    # either the whole file or none of it. ``claim`` and ``record`` run in
+    # that transaction before and after the merge; when ``claim`` returns
+    # False only the stage is dropped and None returned.
+    with get_cursor() as cur:
+        if speed_optimize:
+            cur.execute("SET LOCAL synchronous_commit = off")
+        counts = None
+        if claim is None or claim(cur):
+            counts = _merge_staged(cur, stage, update_on_conflict, progress, engine, rejects)
+            if record is not None:
+                record(cur, counts)
+        cur.execute(DROP_STAGE_SHARED.format(stage=stage))
+    return counts
+
+_SCHEMA_READY = False
+_SALES_PARTITIONED = False  # layout found by ensure_schema()
+_schema_lock = threading.Lock()
+
+def ensure_schema() -> None:
+    """Create the tables and helpers imports need, once per process, under an advisory lock."""
+    global _SCHEMA_READY, _SALES_PARTITIONED
+    if _SCHEMA_READY:
+        return
+    with _schema_lock:
+        if _SCHEMA_READY:
+            return
+        with get_cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", [SCHEMA_LOCK_KEY])
+            cur.execute(DDL_SALES_PARTITIONED if settings.sales_partitioned else DDL_SALES_TABLE)
+            cur.execute(DDL_DEFERRED_INDEXES)
+            deferred = deferred_index_names(cur)
+            for ddl in SCHEMA_DDL:
+                if ddl is DDL_SALES_INDEXES and deferred:
+                    continue  # recreating them here would block the load that dropped them
+                cur.execute(ddl)
+            if not deferred:
+                ensure_sales_indexes(cur)
+            backfill_sales_rollups(cur)
+            backfill_sales_checkpoints(cur)
+            _SALES_PARTITIONED = sales_is_partitioned(cur)
+        if deferred:
+            start_restore()
+        if _SALES_PARTITIONED != settings.sales_partitioned:
+            log.warning(
+                "sales is %spartitioned but settings.sales_partitioned=%s; keeping the existing layout",
+                "" if _SALES_PARTITIONED else "not ", settings.sales_partitioned,
+            )
+        _SCHEMA_READY = True
+
 def import_sales_csv(upload_file: Any, source: str) -> Tuple[int, float]:
     result = import_sales_csv_detailed(upload_file, source)
     return result["inserted"], result["duration_ms"]
@@ -138,50 +764,254 @@ def import_sales_csv_detailed(
     *,
     update_on_conflict: bool = False,
     speed_optimize: bool = True,
+    workers: Optional[int] = None,
+    progress: Optional[ProgressFn] = None,
+    engine: str = "single_pass",
+    content_sha256: Optional[str] = None,
+    force: bool = False,
+    bulk_load: bool = False,
+    max_bytes: Optional[int] = None,
+    max_rows: Optional[int] = None,
 ) -> Dict[str, Any]:
+    """Import a sales upload, read once front to back, and record the outcome in the import ledger."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown import engine {engine!r}; expected one of {', '.join(ENGINES)}")
     start = time.perf_counter()
+    workers = _import_workers(workers)
+    memory = MemoryWatermark()
+    counter = _CountingReader(None, max_bytes, memory)
+    update_mode = "DO_UPDATE" if update_on_conflict else "DO_NOTHING"
 
-    # Normalize to a binary stream and rewind if possible
-    bin_stream = _get_binary_stream(upload_file)
-    if hasattr(bin_stream, "seek"):
-        try: bin_stream.seek(0)
-        except Exception: pass
+    import_id = uuid.uuid4().hex
+    rejects = (import_id, source)
+    earlier: Dict[str, Any] = {}
+    clock = PhaseClock()
+    timed = _clocked(clock, progress, max_rows)
 
-    # Choose appropriate text stream wrapper
-    filename = getattr(upload_file, "filename", None) or getattr(upload_file, "name", None) or ""
-    if filename.endswith(".gz"):
-        text_stream = io.TextIOWrapper(gzip.GzipFile(fileobj=bin_stream), encoding="utf-8", newline="")
-    else:
-        # utf-8-sig handles BOM if present
-        text_stream = io.TextIOWrapper(bin_stream, encoding="utf-8-sig", newline="")
+    def _copied() -> None:
+        progress("copying", {"bytes_copied": counter.count})
 
-    with get_cursor() as cur:
-        if speed_optimize:
-            cur.execute("SET LOCAL synchronous_commit = off")
+    def _unseen(cur: psycopg.Cursor) -> bool:
+        # Called in the merge transaction with the whole upload read: False
+        # when the ledger already has it.
+        clock.mark("dedupe")
+        found = claim_import(cur, counter.sha256.hexdigest(), update_mode, force)
+        earlier.update(found or {})
+        if found is None:
+            clock.mark("validate")
+        return found is None
 
-        cur.execute(DDL_SALES)
-        cur.execute(DDL_STAGE)
+    def _record(cur: psycopg.Cursor, counts: Dict[str, int]) -> None:
+        _record_merged(cur, import_id, source, counts, update_mode, workers, engine, counter)
 
-        # Stream into staging using COPY
-        with cur.copy(COPY_STAGE) as cp:
-            for chunk in iter(lambda: text_stream.read(CHUNK_SIZE), ""):
-                if not chunk:
-                    break
-                cp.write(chunk)
+    ensure_schema()
+    if content_sha256 and not force:
+        clock.mark("dedupe")
+        if (found := find_import(content_sha256, update_mode)):
+            clock.stop()
+            return _duplicate_payload(import_id, source, found, content_sha256, None, start, clock.as_ms(), memory)
+    deferred = DeferredIndexes(import_id) if bulk_load else None
+    if deferred is not None:
+        clock.mark("indexes")
+        deferred.drop()
+    clock.mark("copy")
+    try:
+        if engine == "arrow":
+            workers = 1  # parsing is client-side; one COPY stream per import
+            with get_cursor() as cur:
+                if speed_optimize:
+                    cur.execute("SET LOCAL synchronous_commit = off")
+                counts = _merge_arrow(
+                    cur, _open_binary_stream(upload_file, counter), update_on_conflict, timed, rejects,
+                    on_batch=(lambda _rows: _copied()) if progress else None,
+                    before_insert=_unseen,
+                )
+                if counts is not None:
+                    _record(cur, counts)
+        elif workers == 1:
+            text_stream = _open_text_stream(upload_file, counter)
+            with get_cursor() as cur:
+                if speed_optimize:
+                    cur.execute("SET LOCAL synchronous_commit = off")
+
+                cur.execute(DDL_STAGE)
+                _start_line_numbers(cur, 2)
 
-        # Metrics
-        cur.execute(COUNT_TOTAL);      total_rows   = int(cur.fetchone()[0])
-        cur.execute(COUNT_VALID);      valid_rows   = int(cur.fetchone()[0])
-        cur.execute(COUNT_DUP_IN_FILE);dup_in_file  = int(cur.fetchone()[0] or 0)
+                # Stream into staging using COPY
+                with cur.copy(COPY_STAGE) as cp:
+                    for chunk in iter(lambda: text_stream.read(CHUNK_SIZE), ""):
+                        if not chunk:
+                            break
+                        cp.write(chunk)
+                        if progress:
+                            _copied()
 
-        insert_sql = INSERT_FROM_TYPED_DO_UPDATE if update_on_conflict else INSERT_FROM_TYPED_DO_NOTHING
-        cur.execute(insert_sql);       inserted     = int(cur.rowcount or 0)
+                counts = None
+                if _unseen(cur):
+                    counts = _merge_staged(cur, "sales_import", update_on_conflict, timed, engine, rejects)
+                    _record(cur, counts)
+        else:
+            text_stream = _open_text_stream(upload_file, counter)
+            stage = f"sales_import_{import_id}"
+            with get_cursor() as cur:
+                cur.execute(DDL_STAGE_SHARED.format(stage=stage))
+            try:
+                _copy_parallel(text_stream, stage, workers, speed_optimize, _copied if progress else None)
+                counts = _merge_shared_stage(
+                    stage, update_on_conflict, speed_optimize, engine, rejects, timed, _unseen, _record
+                )
+            except BaseException:
+                with get_cursor() as cur:
+                    cur.execute(DROP_STAGE_SHARED.format(stage=stage))
+                raise
+    except BaseException as e:
+        _finish_bulk_load(deferred)
+        _record_failure(e, import_id, source, update_mode, engine, workers, counter, start)
+        raise
+    _publish(counts)
+    _finish_bulk_load(deferred, clock, analyze=counts is not None)
+    clock.stop()
+    clock.carve("copy", read=counter.read_sec, decode=counter.decode_sec)
 
-        invalid_rows      = max(0, total_rows - valid_rows)
-        skipped_conflicts = max(0, valid_rows - inserted)
+    if counts is None:
+        return _duplicate_payload(
+            import_id, source, earlier, counter.sha256.hexdigest(), counter.count, start, clock.as_ms(), memory
+        )
+    return _import_payload(
+        import_id, source, counts, update_on_conflict, workers, engine, start,
+        content_sha256=counter.sha256.hexdigest(), bytes=counter.count, phases_ms=clock.as_ms(), memory=memory,
+    )
+
+def _publish(counts: Optional[Dict[str, int]]) -> None:
+    # Straight after the merge commits, before any index rebuild.
+    if counts and counts["inserted"]:
+        bump_generation()  # committed; cached query results are now stale
+        pin_reads_to_primary()  # and the replica may not have them yet
+
+def _finish_bulk_load(
+    deferred: Optional[DeferredIndexes], clock: Optional[PhaseClock] = None, analyze: bool = False
+) -> None:
+    """Rebuild a bulk load's indexes once its merge committed or failed; a failure is only logged."""
+    if deferred is None:
+        return
+    try:
+        deferred.finish(clock, analyze=analyze)
+    except Exception:
+        log.exception("Could not rebuild the indexes of bulk load %s; they stay recorded for restore", deferred.import_id)
+
+def _record_failure(
+    e: BaseException,
+    import_id: str,
+    source: str,
+    update_mode: str,
+    engine: str,
+    workers: int,
+    counter: _CountingReader,
+    start: float,
+) -> None:
+    if not isinstance(e, Exception):
+        return  # interpreter shutdown, KeyboardInterrupt: nothing to record
+    status = CANCELLED if isinstance(e, ImportCancelled) else FAILED
+    duration_sec = time.perf_counter() - start
+    record_import(
+        import_id=import_id, source=source, update_mode=update_mode, engine=engine, workers=workers,
+        status=status, error=None if isinstance(e, ImportCancelled) else str(e),
+        bytes=counter.count, duration_ms=duration_sec * 1000.0,
+    )
+    memory = counter.memory.as_dict() if counter.memory is not None else {}
+    observe_import(engine, status, duration_sec, {}, bytes=counter.count, rss_growth=memory.get("rss_growth_bytes"))
+
+def _ledger_counts(counts: Dict[str, int]) -> Dict[str, int]:
+    total_rows, valid_rows, inserted = counts["total_rows"], counts["valid_rows"], counts["inserted"]
+    return {
+        "total_rows": total_rows,
+        "invalid_rows": max(0, total_rows - valid_rows),
+        "dup_in_file": counts["dup_in_file"],
+        "inserted": inserted,
+        "skipped_conflicts": max(0, valid_rows - inserted),
+    }
+
+def _record_merged(
+    cur: psycopg.Cursor,
+    import_id: str,
+    source: str,
+    counts: Dict[str, int],
+    update_mode: str,
+    workers: int,
+    engine: str,
+    counter: _CountingReader,
+) -> None:
+    """The SUCCEEDED ledger row, written before the merge commits (see claim_import)."""
+    record_import(
+        cur=cur, import_id=import_id, source=source, update_mode=update_mode, status=SUCCEEDED,
+        content_sha256=counter.sha256.hexdigest(), bytes=counter.count, engine=engine, workers=workers,
+        **_ledger_counts(counts),
+    )
+
+def _duplicate_payload(
+    import_id: str,
+    source: str,
+    earlier: Dict[str, Any],
+    content_sha256: str,
+    bytes: Optional[int],
+    start: float,
+    phases_ms: Optional[Dict[str, float]] = None,
+    memory: Optional[MemoryWatermark] = None,
+) -> Dict[str, Any]:
+    """The earlier import's result, returned in place of importing the same bytes again."""
+    duration_ms = (time.perf_counter() - start) * 1000.0
+    rss = memory.as_dict() if memory is not None else {}
+    observe_import(
+        earlier["engine"] or "", DUPLICATE, duration_ms / 1000.0, phases_ms or {}, bytes=bytes,
+        rss_growth=rss.get("rss_growth_bytes"),
+    )
+    record_import(
+        import_id=import_id, source=source, update_mode=earlier["update_mode"], status=DUPLICATE,
+        content_sha256=content_sha256, bytes=bytes, duplicate_of=earlier["import_id"], duration_ms=duration_ms,
+    )
+    log.info(
+        "Skipped import source=%s: identical to import %s (sha256=%s) in %.2f ms",
+        source, earlier["import_id"], content_sha256, duration_ms
+    )
+    return {
+        "import_id": earlier["import_id"],
+        "inserted": earlier["inserted"],
+        "skipped_conflicts": earlier["skipped_conflicts"],
+        "dup_in_file": earlier["dup_in_file"],
+        "invalid_rows": earlier["invalid_rows"],
+        "total_rows": earlier["total_rows"],
+        "duration_ms": earlier["duration_ms"],
+        "source": earlier["source"],
+        "update_mode": earlier["update_mode"],
+        "workers": earlier["workers"],
+        "engine": earlier["engine"],
+        "deduplicated": True,
+        "phases_ms": phases_ms or {},
+        **rss,
+    }
+
+def _import_payload(
+    import_id: str,
+    source: str,
+    counts: Dict[str, int],
+    update_on_conflict: bool,
+    workers: int,
+    engine: str,
+    start: float,
+    *,
+    content_sha256: Optional[str] = None,
+    bytes: Optional[int] = None,
+    phases_ms: Optional[Dict[str, float]] = None,
+    memory: Optional[MemoryWatermark] = None,
+) -> Dict[str, Any]:
+    total_rows, valid_rows = counts["total_rows"], counts["valid_rows"]
+    dup_in_file, inserted = counts["dup_in_file"], counts["inserted"]
+    ledger = _ledger_counts(counts)
+    invalid_rows, skipped_conflicts = ledger["invalid_rows"], ledger["skipped_conflicts"]
 
     duration_ms = (time.perf_counter() - start) * 1000.0
     payload: Dict[str, Any] = {
+        "import_id": import_id,
         "inserted": inserted,
         "skipped_conflicts": skipped_conflicts,
         "dup_in_file": dup_in_file,
@@ -190,9 +1020,141 @@ def import_sales_csv_detailed(
         "duration_ms": duration_ms,
         "source": source,
         "update_mode": "DO_UPDATE" if update_on_conflict else "DO_NOTHING",
+        "workers": workers,
+        "engine": engine,
+        "deduplicated": False,
+        "phases_ms": phases_ms or {},
+        **(memory.as_dict() if memory is not None else {}),
     }
+    record_import(status=SUCCEEDED, content_sha256=content_sha256, bytes=bytes, **payload)
+    observe_import(
+        engine, SUCCEEDED, duration_ms / 1000.0, payload["phases_ms"], rows=total_rows, bytes=bytes,
+        rss_growth=payload.get("rss_growth_bytes"),
+        inserted=inserted, skipped_conflict=skipped_conflicts, dup_in_file=dup_in_file, invalid=invalid_rows,
+    )
     log.info(
-        "Imported CSV source=%s total=%d valid=%d inserted=%d dup_in_file=%d skipped_conflicts=%d invalid=%d in %.2f ms",
-        source, total_rows, valid_rows, inserted, dup_in_file, skipped_conflicts, invalid_rows, duration_ms
+        "Imported CSV source=%s total=%d valid=%d inserted=%d dup_in_file=%d skipped_conflicts=%d invalid=%d workers=%d engine=%s in %.2f ms (%s) rss_growth=%s",
+        source, total_rows, valid_rows, inserted, dup_in_file, skipped_conflicts, invalid_rows, workers, engine, duration_ms,
+        " ".join(f"{phase}={ms:.1f}" for phase, ms in payload["phases_ms"].items()),
+        payload.get("rss_growth_bytes"),
     )
     return payload
+
+
+async def _aiter_upload(upload_file: Any, tally: Optional[_CountingReader] = None) -> AsyncIterator[bytes]:
+    """CSV bytes of an async upload, decoded like the sync path, counted into ``tally``."""
+    decoder = UploadDecoder()
+    at_start = True
+    while True:
+        t0 = time.perf_counter()
+        data = await upload_file.read(decoder.read_size(CHUNK_SIZE))
+        if not data:
+            break
+        if tally is not None:
+            tally.tally(data, time.perf_counter() - t0)
+        t1 = time.perf_counter()
+        data = decoder.feed(data)
+        if tally is not None:
+            tally.decode_sec += time.perf_counter() - t1
+        if at_start and data:
+            data, at_start = data.removeprefix(codecs.BOM_UTF8), False
+        if data:
+            yield data
+    try:
+        # Parquet converts here, a row group per step; keep it off the loop.
+        tail = decoder.finish()
+        while True:
+            t1 = time.perf_counter()
+            data = await asyncio.to_thread(next, tail, None)
+            if tally is not None:
+                tally.decode_sec += time.perf_counter() - t1
+            if data is None:
+                break
+            if at_start and data:
+                data, at_start = data.removeprefix(codecs.BOM_UTF8), False
+            if data:
+                yield data
+    finally:
+        decoder.close()
+
+async def import_sales_csv_async(
+    upload_file: Any,
+    source: str,
+    *,
+    update_on_conflict: bool = False,
+    speed_optimize: bool = True,
+    engine: str = "single_pass",
+    force: bool = False,
+    bulk_load: bool = False,
+    max_bytes: Optional[int] = None,
+    max_rows: Optional[int] = None,
+) -> Dict[str, Any]:
+    """import_sales_csv_detailed for the ASGI server: staged over the async pool, merged in a thread."""
+    if engine not in _MERGERS:
+        raise ValueError(f"Engine {engine!r} is not available for async imports; expected one of {', '.join(_MERGERS)}")
+    start = time.perf_counter()
+    import_id = uuid.uuid4().hex
+    rejects = (import_id, source)
+    stage = f"sales_import_{import_id}"
+    update_mode = "DO_UPDATE" if update_on_conflict else "DO_NOTHING"
+    memory = MemoryWatermark()
+    tally = _CountingReader(None, max_bytes, memory)
+    clock = PhaseClock()
+
+    await asyncio.to_thread(ensure_schema)
+    deferred = DeferredIndexes(import_id) if bulk_load else None
+    if deferred is not None:
+        clock.mark("indexes")
+        await asyncio.to_thread(deferred.drop)
+    clock.mark("copy")
+    try:
+        async with get_async_cursor() as cur:
+            await cur.execute(DDL_STAGE_SHARED.format(stage=stage))
+    except BaseException:
+        await asyncio.to_thread(_finish_bulk_load, deferred)
+        raise
+    try:
+        async with get_async_cursor() as cur:
+            if speed_optimize:
+                await cur.execute("SET LOCAL synchronous_commit = off")
+            await cur.execute(DDL_LINE_SEQ)
+            await cur.execute(SET_LINE_SEQ, [2])
+            async with cur.copy(COPY_STAGE_SHARED.format(stage=stage)) as cp:
+                async for block in _aiter_upload(upload_file, tally):
+                    await cp.write(block)
+        content_sha256 = tally.sha256.hexdigest()
+        found: Dict[str, Any] = {}
+
+        def _unseen(cur: psycopg.Cursor) -> bool:
+            clock.mark("dedupe")
+            found.update(claim_import(cur, content_sha256, update_mode, force) or {})
+            if not found:
+                clock.mark("validate")
+            return not found
+
+        def _record(cur: psycopg.Cursor, counts: Dict[str, int]) -> None:
+            _record_merged(cur, import_id, source, counts, update_mode, 1, engine, tally)
+
+        counts = await asyncio.to_thread(
+            _merge_shared_stage, stage, update_on_conflict, speed_optimize, engine, rejects,
+            _clocked(clock, None, max_rows), _unseen, _record,
+        )
+        earlier = found or None
+    except BaseException as e:
+        async with get_async_cursor() as cur:
+            await cur.execute(DROP_STAGE_SHARED.format(stage=stage))
+        await asyncio.to_thread(_finish_bulk_load, deferred)
+        await asyncio.to_thread(_record_failure, e, import_id, source, update_mode, engine, 1, tally, start)
+        raise
+    _publish(counts)
+    await asyncio.to_thread(_finish_bulk_load, deferred, clock, earlier is None)
+    clock.stop()
+    clock.carve("copy", read=tally.read_sec, decode=tally.decode_sec)
+    if earlier is not None:
+        return await asyncio.to_thread(
+            _duplicate_payload, import_id, source, earlier, content_sha256, tally.count, start, clock.as_ms(), memory
+        )
+    return await asyncio.to_thread(
+        _import_payload, import_id, source, counts, update_on_conflict, 1, engine, start,
+        content_sha256=content_sha256, bytes=tally.count, phases_ms=clock.as_ms(), memory=memory,
+    )
@@ -0,0 +1,403 @@
+"""Upload decoders, sniffed from the first bytes, turning any codec and format into CSV."""
+from __future__ import annotations
+import bz2, codecs, csv, io, json, logging, lzma, os, re, tempfile, zlib
+from decimal import Decimal
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from app.config.db_setup import settings
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional, only zstd uploads need it
+    zstandard = None
+
+log = logging.getLogger("app.service.decoders")
+
+HEADER = [
+    "Region", "Country", "Item Type", "Sales Channel", "Order Priority",
+    "Order Date", "Order ID", "Ship Date", "Units Sold", "Unit Price",
+    "Unit Cost", "Total Revenue", "Total Cost", "Total Profit",
+]
+DATE_COLUMNS = ("Order Date", "Ship Date")
+
+SNIFF_BYTES = 64  # enough for every magic number and a JSON Lines opening brace
+READ_SIZE = 1 << 20
+# Compressed input is fed in smaller pieces: what one feed returns is the
+# piece times the compression ratio, about 1 MiB for typical CSV.
+COMPRESSED_READ_SIZE = 64 << 10
+
+
+class DecodeError(ValueError):
+    """An upload that cannot be decoded in the format it was sniffed as."""
+
+
+# --- Compression codecs -----------------------------------------------------
+
+class _Passthrough:
+    name = "none"
+
+    def feed(self, data: bytes) -> bytes:
+        return data
+
+    def finish(self) -> Iterator[bytes]:
+        return iter(())
+
+
+_CODEC_ERRORS = (OSError, EOFError, zlib.error, lzma.LZMAError) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+class _Decompressor:
+    """Wraps a stdlib-style decompressobj; concatenated streams are all read."""
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name, self._factory = name, factory
+        self._d = factory()
+        self._open = False  # inside a stream whose end marker is still to come
+
+    def feed(self, data: bytes) -> bytes:
+        out = []
+        while data:
+            try:
+                out.append(self._d.decompress(data))
+            except _CODEC_ERRORS as e:
+                raise DecodeError(f"Corrupt {self.name} upload: {e}") from e
+            if not self._d.eof:
+                self._open = True
+                break
+            data = self._d.unused_data
+            self._d, self._open = self._factory(), False
+        return b"".join(out)
+
+    def finish(self) -> Iterator[bytes]:
+        if self._open:
+            raise DecodeError(f"Truncated {self.name} upload")
+        return iter(())
+
+
+def _zstd() -> Any:
+    if zstandard is None:
+        raise DecodeError("zstd uploads require the zstandard package (pip install zstandard)")
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+# (magic prefix, codec name, decompressobj factory)
+CODECS: List[Tuple[bytes, str, Callable[[], Any]]] = [
+    (b"\x1f\x8b", "gzip", lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)),
+    (b"BZh", "bz2", bz2.BZ2Decompressor),
+    (b"\xfd7zXZ\x00", "xz", lzma.LZMADecompressor),
+    (b"\x28\xb5\x2f\xfd", "zstd", _zstd),
+]
+
+
+def codec_of(head: bytes) -> str:
+    return next((name for magic, name, _ in CODECS if head.startswith(magic)), "none")
+
+
+def sniff_codec(head: bytes):
+    for magic, name, factory in CODECS:
+        if head.startswith(magic):
+            return _Decompressor(name, factory)
+    return _Passthrough()
+
+
+# --- Formats ----------------------------------------------------------------
+
+def _norm(name: str) -> str:
+    # "Order ID", "order_id" and "orderId" all name the same column.
+    return re.sub(r"[^0-9a-z]", "", name.lower())
+
+_HEADER_KEYS = {_norm(h): h for h in HEADER}
+_ISO_DATE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})")
+
+
+def _csv_line(values: List[Any]) -> bytes:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerow(values)
+    return buf.getvalue().encode("utf-8")
+
+
+class _CsvFormat:
+    name = "csv"
+
+    def feed(self, data: bytes) -> bytes:
+        return data
+
+    def finish(self) -> Iterator[bytes]:
+        return iter(())
+
+    def close(self) -> None:
+        pass
+
+
+def _plain_number(text: str) -> str:
+    """A float's shortest round-trip text without exponent notation ("1e+20" -> "100000000000000000000")."""
+    return format(Decimal(text), "f")
+
+
+def _text(value: Any, column: str) -> Any:
+    """A JSON value as the CSV text the validator expects; None stays NULL."""
+    if value is None or isinstance(value, str) and value == "":
+        return None
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, float):
+        return _plain_number(repr(value))
+    if isinstance(value, str) and column in DATE_COLUMNS and (m := _ISO_DATE.match(value)):
+        return f"{m.group(2)}/{m.group(3)}/{m.group(1)}"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+class _JsonLinesFormat:
+    """One object per line, keyed by the CSV header or GraphQL field names."""
+
+    name = "jsonl"
+
+    def __init__(self) -> None:
+        self._pending = b""
+        self._line = 0
+        self._started = False
+
+    def _rows(self, lines: List[bytes]) -> bytes:
+        buf = io.StringIO()
+        w = csv.writer(buf, lineterminator="\n")
+        if not self._started:
+            w.writerow(HEADER)
+            self._started = True
+        for raw in lines:
+            self._line += 1
+            if not raw.strip():
+                continue
+            try:
+                obj = json.loads(raw)
+            except ValueError as e:
+                raise DecodeError(f"JSON Lines record {self._line} is not valid JSON: {e}") from e
+            if not isinstance(obj, dict):
+                raise DecodeError(f"JSON Lines record {self._line} is not an object")
+            row: List[Any] = [None] * len(HEADER)
+            for key, value in obj.items():
+                column = _HEADER_KEYS.get(_norm(str(key)))
+                if column is not None:
+                    row[HEADER.index(column)] = _text(value, column)
+            w.writerow(row)
+        return buf.getvalue().encode("utf-8")
+
+    def feed(self, data: bytes) -> bytes:
+        if not self._started and not self._pending:
+            data = data.removeprefix(codecs.BOM_UTF8)  # nothing read yet: the start of the file
+        data = self._pending + data
+        cut = data.rfind(b"\n") + 1
+        self._pending = data[cut:]
+        return self._rows(data[:cut].split(b"\n")[:-1]) if cut else b""
+
+    def finish(self) -> Iterator[bytes]:
+        out = self._rows([self._pending] if self._pending else [])
+        self._pending = b""
+        if out:
+            yield out
+
+    def close(self) -> None:
+        pass
+
+
+class _ParquetFormat:
+    """Spools the file, then yields one CSV chunk per row group."""
+
+    name = "parquet"
+
+    def __init__(self) -> None:
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError as e:  # pragma: no cover - depends on the deployment
+            raise DecodeError("Parquet uploads require pyarrow (pip install pyarrow)") from e
+        spool = settings.spool_dir or tempfile.gettempdir()
+        os.makedirs(spool, exist_ok=True)
+        fd, self._path = tempfile.mkstemp(prefix="upload-", suffix=".parquet", dir=spool)
+        self._fh: Optional[BinaryIO] = os.fdopen(fd, "wb")
+
+    def feed(self, data: bytes) -> bytes:
+        self._fh.write(data)
+        return b""
+
+    def finish(self) -> Iterator[bytes]:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+
+        self._fh.close()
+        try:
+            pf = pq.ParquetFile(self._path)
+        except (pa.ArrowInvalid, OSError) as e:
+            self.close()
+            raise DecodeError(f"Invalid Parquet upload: {e}") from e
+        try:
+            columns = {_HEADER_KEYS[_norm(n)]: n for n in pf.schema_arrow.names if _norm(n) in _HEADER_KEYS}
+            yield _csv_line(HEADER)
+            options = pa_csv.WriteOptions(include_header=False)
+            for group in range(pf.num_row_groups):
+                table = pf.read_row_group(group, columns=list(columns.values()))
+                out = io.BytesIO()
+                pa_csv.write_csv(_as_text_table(table, columns), out, options)
+                yield out.getvalue()
+        finally:
+            pf.close()
+            self.close()
+
+    def close(self) -> None:
+        if self._fh is not None and not self._fh.closed:
+            self._fh.close()
+        try: os.remove(self._path)
+        except OSError: pass
+
+
+def _as_text_table(table, columns: Dict[str, str]):
+    """The row group as 14 string columns in HEADER order."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    arrays = []
+    for name in HEADER:
+        if name not in columns:
+            arrays.append(pa.nulls(table.num_rows, pa.string()))
+            continue
+        col = table.column(columns[name])
+        if pa.types.is_date(col.type) or pa.types.is_timestamp(col.type):
+            col = pc.strftime(col, format="%m/%d/%Y")
+        elif pa.types.is_string(col.type) and name in DATE_COLUMNS:
+            col = pc.replace_substring_regex(col, r"^(\d{4})-(\d{2})-(\d{2})$", r"\2/\3/\1")
+        elif pa.types.is_floating(col.type):
+            # Arrow writes the same shortest digits as repr() but switches to
+            # exponent notation (1e+20), which the numeric validation rejects.
+            col = pc.cast(col, pa.string())
+            if pc.any(pc.match_substring(col, "e")).as_py():
+                col = pa.array([v if v is None or "e" not in v else _plain_number(v) for v in col.to_pylist()], pa.string())
+        col = pc.cast(col, pa.string())
+        # Arrow quotes empty strings, which COPY keeps as ''; as null they are
+        # written unquoted and load as NULL, like "" in JSON Lines.
+        arrays.append(pc.if_else(pc.equal(col, ""), pa.scalar(None, pa.string()), col))
+    return pa.Table.from_arrays(arrays, names=HEADER)
+
+
+FORMATS: Dict[str, Callable[[], Any]] = {"csv": _CsvFormat, "jsonl": _JsonLinesFormat, "parquet": _ParquetFormat}
+
+
+def format_of(head: bytes) -> str:
+    if head.startswith(b"PAR1"):
+        return "parquet"
+    if head.removeprefix(codecs.BOM_UTF8).lstrip().startswith(b"{"):
+        return "jsonl"
+    return "csv"
+
+
+def sniff_format(head: bytes):
+    return FORMATS[format_of(head)]()
+
+
+# --- Pipeline ---------------------------------------------------------------
+
+class UploadDecoder:
+    """Codec and format, picked once SNIFF_BYTES of each input have been seen."""
+
+    def __init__(self) -> None:
+        self.codec: Any = None
+        self.format: Any = None
+        self._raw_head = b""
+        self._head = b""
+
+    def _decoded(self, data: bytes) -> bytes:
+        if self.format is None:
+            self._head += data
+            if len(self._head) < SNIFF_BYTES:
+                return b""
+            data, self._head = self._head, b""
+            self.format = sniff_format(data)
+        return self.format.feed(data)
+
+    def feed(self, data: bytes) -> bytes:
+        if self.codec is None:
+            self._raw_head += data
+            if len(self._raw_head) < SNIFF_BYTES:
+                return b""
+            data, self._raw_head = self._raw_head, b""
+            self.codec = sniff_codec(data)
+        return self._decoded(self.codec.feed(data))
+
+    def read_size(self, default: int = READ_SIZE) -> int:
+        """How much raw input to feed next."""
+        if self.codec is None or self.codec.name == "none":
+            return default
+        return min(default, COMPRESSED_READ_SIZE)
+
+    def finish(self) -> Iterator[bytes]:
+        # Uploads shorter than SNIFF_BYTES are sniffed from what there is.
+        if self.codec is None:
+            data, self._raw_head = self._raw_head, b""
+            self.codec = sniff_codec(data)
+            if out := self._decoded(self.codec.feed(data)):
+                yield out
+        for tail in self.codec.finish():
+            if out := self._decoded(tail):
+                yield out
+        if self.format is None:
+            data, self._head = self._head, b""
+            self.format = sniff_format(data)
+            if out := self.format.feed(data):
+                yield out
+        yield from self.format.finish()
+        log.debug("Decoded upload codec=%s format=%s", self.codec.name, self.format.name)
+
+    def close(self) -> None:
+        if self.format is not None:
+            self.format.close()
+
+    def describe(self) -> str:
+        return f"{self.format.name if self.format else '?'}+{self.codec.name if self.codec else '?'}"
+
+
+class DecodedReader(io.RawIOBase):
+    """Pull-side adapter: reads ``raw`` through an UploadDecoder."""
+
+    def __init__(self, raw: BinaryIO, read_size: int = READ_SIZE):
+        self.raw = raw
+        self.decoder = UploadDecoder()
+        self._read_size = read_size
+        self._buf = memoryview(b"")
+        self._tail: Optional[Iterator[bytes]] = None
+
+    def readable(self) -> bool:
+        return True
+
+    def _fill(self) -> bool:
+        while not self._buf:
+            if self._tail is None:
+                data = self.raw.read(self.decoder.read_size(self._read_size))
+                if data:
+                    self._buf = memoryview(self.decoder.feed(data))
+                    continue
+                self._tail = self.decoder.finish()
+            chunk = next(self._tail, None)
+            if chunk is None:
+                return False
+            self._buf = memoryview(chunk)
+        return True
+
+    def readinto(self, b) -> int:
+        if not self._fill():
+            return 0
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self.decoder.close()
+        super().close()
+
+
+def open_decoded(stream: BinaryIO) -> BinaryIO:
+    """``stream`` decoded to CSV bytes; plain CSV behind a ``peek`` is returned as it is."""
+    head = stream.peek(SNIFF_BYTES)[:SNIFF_BYTES] if hasattr(stream, "peek") else b""
+    if head and codec_of(head) == "none" and format_of(head) == "csv":
+        return stream
+    return io.BufferedReader(DecodedReader(stream), READ_SIZE)
@@ -0,0 +1,236 @@
+from __future__ import annotations
+import hashlib, os, tempfile, threading, time, uuid, logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+from app.config.db_setup import settings
+from app.service.csv_import import (
+    ImportCancelled,
+    ImportLimitExceeded,
+    _get_binary_stream,
+    import_sales_csv_detailed,
+)
+
+log = logging.getLogger("app.service.import_jobs")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "QUEUED", "RUNNING", "SUCCEEDED", "FAILED", "CANCELLED"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+@dataclass
+class ImportJob:
+    id: str
+    source: str
+    filename: str
+    path: str
+    update_on_conflict: bool
+    workers: Optional[int]
+    bytes_total: int
+    status: str = QUEUED
+    phase: str = "queued"
+    bytes_copied: int = 0
+    rows_staged: int = 0
+    rows_inserted: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    # SHA-256 of the spooled bytes when known before the import runs; lets the
+    # importer find a repeat upload in the ledger without reading it again.
+    content_sha256: Optional[str] = None
+    force: bool = False
+    bulk_load: bool = False
+    # Opens the data to import instead of ``path`` (chunked uploads that are
+    # imported while they are still arriving).
+    reader: Optional[Callable[[], BinaryIO]] = field(default=None, repr=False)
+
+
+_jobs: Dict[str, ImportJob] = {}
+_futures: Dict[str, Future] = {}
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.import_job_workers, thread_name_prefix="import-job"
+            )
+        return _executor
+
+
+def _spool(upload_file: Any, job_id: str, filename: str) -> Tuple[str, str]:
+    """Copy the upload to local disk; returns the spool path and its SHA-256."""
+    spool_dir = settings.spool_dir or tempfile.gettempdir()
+    os.makedirs(spool_dir, exist_ok=True)
+    # The original name is kept only to make the spool file recognisable.
+    path = os.path.join(spool_dir, f"import-{job_id}-{os.path.basename(filename)}")
+    src = _get_binary_stream(upload_file)
+    if hasattr(src, "seek"):
+        try: src.seek(0)
+        except Exception: pass
+    sha256, size, limit = hashlib.sha256(), 0, settings.upload_max_bytes
+    try:
+        with open(path, "wb") as dst:
+            for block in iter(lambda: src.read(1 << 20), b""):
+                size += len(block)
+                if limit is not None and size > limit:
+                    raise ImportLimitExceeded(f"Upload exceeds {limit} bytes")
+                sha256.update(block)
+                dst.write(block)
+    except BaseException:
+        try: os.remove(path)
+        except OSError: pass
+        raise
+    return path, sha256.hexdigest()
+
+
+def _prune_finished() -> None:
+    # Called with _lock held. Oldest finished jobs go first.
+    done = sorted((j for j in _jobs.values() if j.status in FINISHED), key=lambda j: j.created_at)
+    for job in done[: max(0, len(done) - settings.import_job_history)]:
+        _jobs.pop(job.id, None)
+
+
+def _run(job: ImportJob) -> None:
+    def progress(phase: str, counters: Dict[str, int]) -> None:
+        with _lock:
+            if job.cancel_requested:
+                raise ImportCancelled(job.id)
+            job.phase = phase
+            for k, v in counters.items():
+                setattr(job, k, v)
+
+    try:
+        with _lock:
+            if job.cancel_requested:
+                raise ImportCancelled(job.id)
+            job.status, job.phase, job.started_at = RUNNING, "copying", time.time()
+        with (job.reader() if job.reader else open(job.path, "rb")) as fh:
+            result = import_sales_csv_detailed(
+                fh,
+                job.source,
+                update_on_conflict=job.update_on_conflict,
+                speed_optimize=True,
+                workers=job.workers,
+                progress=progress,
+                content_sha256=job.content_sha256,
+                force=job.force,
+                bulk_load=job.bulk_load,
+                max_bytes=settings.upload_max_bytes,
+                max_rows=settings.upload_max_rows,
+            )
+        with _lock:
+            job.status, job.phase, job.result = SUCCEEDED, "done", result
+            job.rows_inserted = result["inserted"]
+            job.rows_staged = result["total_rows"]
+    except ImportCancelled:
+        with _lock:
+            job.status, job.phase = CANCELLED, "cancelled"
+        log.info("Import job %s cancelled (source=%s)", job.id, job.source)
+    except Exception as e:
+        with _lock:
+            job.status, job.phase, job.error = FAILED, "failed", str(e)
+        log.exception("Import job %s failed (source=%s)", job.id, job.source)
+    finally:
+        with _lock:
+            job.finished_at = time.time()
+            _futures.pop(job.id, None)
+            _prune_finished()
+        try: os.remove(job.path)
+        except OSError: pass
+
+
+def submit_import(
+    upload_file: Any,
+    source: str,
+    *,
+    update_on_conflict: bool = False,
+    workers: Optional[int] = None,
+    force: bool = False,
+    bulk_load: bool = False,
+) -> ImportJob:
+    job_id = uuid.uuid4().hex
+    filename = getattr(upload_file, "filename", None) or getattr(upload_file, "name", None) or "upload.csv"
+    path, sha256 = _spool(upload_file, job_id, filename)
+    return submit_spooled(
+        path, filename, source, update_on_conflict=update_on_conflict, workers=workers, job_id=job_id,
+        content_sha256=sha256, force=force, bulk_load=bulk_load,
+    )
+
+
+def submit_spooled(
+    path: str,
+    filename: str,
+    source: str,
+    *,
+    update_on_conflict: bool = False,
+    workers: Optional[int] = None,
+    job_id: Optional[str] = None,
+    reader: Optional[Callable[[], BinaryIO]] = None,
+    bytes_total: Optional[int] = None,
+    content_sha256: Optional[str] = None,
+    force: bool = False,
+    bulk_load: bool = False,
+) -> ImportJob:
+    """Queue an import of a file already on local disk (or start one on ``reader``); the job deletes it."""
+    job_id = job_id or uuid.uuid4().hex
+    job = ImportJob(
+        id=job_id,
+        source=source,
+        filename=filename,
+        path=path,
+        update_on_conflict=update_on_conflict,
+        workers=workers,
+        bytes_total=os.path.getsize(path) if bytes_total is None else bytes_total,
+        reader=reader,
+        content_sha256=content_sha256,
+        force=force,
+        bulk_load=bulk_load,
+    )
+    if reader is not None:
+        # A job reading an upload that is still arriving mostly waits for
+        # chunks, so it gets its own thread rather than one of the
+        # import_job_workers slots queued jobs are waiting for.
+        with _lock:
+            _jobs[job_id] = job
+        threading.Thread(target=_run, args=(job,), name=f"import-stream-{job_id[:8]}", daemon=True).start()
+        log.info("Started streaming import job %s source=%s", job_id, source)
+        return job
+    executor = _get_executor()
+    with _lock:
+        _jobs[job_id] = job
+        _futures[job_id] = executor.submit(_run, job)
+    log.info("Queued import job %s source=%s bytes=%d", job_id, source, job.bytes_total)
+    return job
+
+
+def get_job(job_id: str) -> Optional[ImportJob]:
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def list_jobs() -> List[ImportJob]:
+    with _lock:
+        return sorted(_jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+
+def cancel_job(job_id: str) -> Optional[ImportJob]:
+    """Drop a queued job, or roll a running one back at its next COPY chunk or statement."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        job.cancel_requested = True
+        fut = _futures.get(job_id)
+    if job.status == QUEUED and fut is not None and fut.cancel():
+        with _lock:
+            job.status, job.phase, job.finished_at = CANCELLED, "cancelled", time.time()
+            _futures.pop(job_id, None)
+        try: os.remove(job.path)
+        except OSError: pass
+    return job
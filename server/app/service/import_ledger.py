@@ -0,0 +1,182 @@
+"""Ledger of imports keyed by the SHA-256 of the uploaded bytes, for skipping repeats."""
+from __future__ import annotations
+import base64, logging, uuid
+from typing import Any, Dict, Optional
+import psycopg
+from app.config.db.connection import get_cursor
+
+log = logging.getLogger("app.service.import_ledger")
+
+SUCCEEDED, FAILED, CANCELLED, DUPLICATE = "SUCCEEDED", "FAILED", "CANCELLED", "DUPLICATE"
+REMOVED = "REMOVED"  # not an import: sales rows were deleted (see record_removal)
+
+# First key of the per-hash transaction lock claim_import takes; the second
+# is hashtext(content_sha256).
+CONTENT_LOCK_KEY = 0x5A1E9
+
+DDL_LEDGER = """
+CREATE TABLE IF NOT EXISTS import_ledger (
+  id                BIGSERIAL   PRIMARY KEY,
+  import_id         TEXT        NOT NULL UNIQUE,
+  source            TEXT        NOT NULL,
+  content_sha256    TEXT,
+  bytes             BIGINT,
+  update_mode       TEXT        NOT NULL,
+  engine            TEXT,
+  workers           INT,
+  status            TEXT        NOT NULL,
+  error             TEXT,
+  duplicate_of      TEXT,
+  total_rows        BIGINT,
+  invalid_rows      BIGINT,
+  dup_in_file       BIGINT,
+  inserted          BIGINT,
+  skipped_conflicts BIGINT,
+  duration_ms       DOUBLE PRECISION,
+  finished_at       TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_import_ledger_hash ON import_ledger(content_sha256, update_mode, id);
+CREATE INDEX IF NOT EXISTS idx_import_ledger_source ON import_ledger(source, id);
+"""
+
+LEDGER_COLUMNS = """
+  import_id, source, content_sha256, bytes, update_mode, engine, workers, status, error,
+  duplicate_of, total_rows, invalid_rows, dup_in_file, inserted, skipped_conflicts, duration_ms,
+  finished_at
+"""
+
+# An earlier successful import of the same bytes. Re-running a DO_NOTHING
+# import of it would skip every row; a DO_UPDATE one would rewrite the same
+# values, unless a later import changed rows in between. Either is void once
+# rows were removed after it, as those may have been its own.
+FIND_IMPORT = f"""
+SELECT {LEDGER_COLUMNS}
+FROM import_ledger l
+WHERE content_sha256 = %s AND update_mode = %s AND status = 'SUCCEEDED'
+  AND NOT EXISTS (
+    SELECT 1 FROM import_ledger n
+    WHERE n.id > l.id
+      AND (n.status = 'REMOVED' OR (l.update_mode = 'DO_UPDATE' AND n.status = 'SUCCEEDED' AND n.inserted > 0)))
+ORDER BY id DESC
+LIMIT 1
+"""
+LOCK_CONTENT = "SELECT pg_advisory_xact_lock(%s, hashtext(%s))"
+
+INSERT_LEDGER = """
+INSERT INTO import_ledger (
+  import_id, source, content_sha256, bytes, update_mode, engine, workers, status, error,
+  duplicate_of, total_rows, invalid_rows, dup_in_file, inserted, skipped_conflicts, duration_ms
+) VALUES (
+  %(import_id)s, %(source)s, %(content_sha256)s, %(bytes)s, %(update_mode)s, %(engine)s, %(workers)s,
+  %(status)s, %(error)s, %(duplicate_of)s, %(total_rows)s, %(invalid_rows)s, %(dup_in_file)s,
+  %(inserted)s, %(skipped_conflicts)s, %(duration_ms)s
+)
+ON CONFLICT (import_id) DO UPDATE SET duration_ms = EXCLUDED.duration_ms, finished_at = now()
+"""
+
+
+def _entry(r) -> Dict[str, Any]:
+    keys = [c.strip() for c in LEDGER_COLUMNS.split(",")]
+    entry = dict(zip(keys, r))
+    entry["finished_at"] = entry["finished_at"].isoformat()
+    return entry
+
+
+def find_import(content_sha256: str, update_mode: str) -> Optional[Dict[str, Any]]:
+    with get_cursor() as cur:
+        cur.execute(FIND_IMPORT, [content_sha256, update_mode])
+        r = cur.fetchone()
+    return _entry(r) if r else None
+
+
+def claim_import(
+    cur: psycopg.Cursor, content_sha256: str, update_mode: str, force: bool = False
+) -> Optional[Dict[str, Any]]:
+    """find_import in ``cur``'s transaction, after locking the hash until it ends."""
+    cur.execute(LOCK_CONTENT, [CONTENT_LOCK_KEY, content_sha256])
+    if force:
+        return None
+    cur.execute(FIND_IMPORT, [content_sha256, update_mode])
+    r = cur.fetchone()
+    return _entry(r) if r else None
+
+
+def record_import(
+    *,
+    import_id: str,
+    source: str,
+    update_mode: str,
+    status: str,
+    content_sha256: Optional[str] = None,
+    bytes: Optional[int] = None,
+    engine: Optional[str] = None,
+    workers: Optional[int] = None,
+    error: Optional[str] = None,
+    duplicate_of: Optional[str] = None,
+    cur: Optional[psycopg.Cursor] = None,
+    **counts: Any,
+) -> None:
+    """Write the ledger row for one import, in ``cur``'s transaction if given."""
+    row = {
+        "import_id": import_id, "source": source, "content_sha256": content_sha256, "bytes": bytes,
+        "update_mode": update_mode, "engine": engine, "workers": workers, "status": status,
+        "error": error and error.replace("\x00", ""), "duplicate_of": duplicate_of,
+    }
+    for k in ("total_rows", "invalid_rows", "dup_in_file", "inserted", "skipped_conflicts", "duration_ms"):
+        row[k] = counts.get(k)
+    if cur is not None:
+        cur.execute(INSERT_LEDGER, row)
+        return
+    try:  # never masks the import's own outcome
+        with get_cursor() as cur:
+            cur.execute(INSERT_LEDGER, row)
+    except Exception:
+        log.exception("Could not record import %s in the ledger", import_id)
+
+
+def record_removal(cur: psycopg.Cursor, what: str) -> None:
+    """Note that sales rows were deleted, so no earlier import counts as a duplicate."""
+    cur.execute(INSERT_LEDGER, {
+        "import_id": uuid.uuid4().hex, "source": what, "content_sha256": None, "bytes": None,
+        "update_mode": "DELETE", "engine": None, "workers": None, "status": REMOVED, "error": None,
+        "duplicate_of": None, "total_rows": None, "invalid_rows": None, "dup_in_file": None,
+        "inserted": None, "skipped_conflicts": None, "duration_ms": None,
+    })
+
+
+def _enc(lid: int) -> str:
+    return base64.urlsafe_b64encode(str(int(lid)).encode("ascii")).decode("ascii")
+
+def _dec(cur: str) -> int:
+    return int(base64.urlsafe_b64decode(cur.encode("ascii")).decode("ascii"))
+
+
+def query_import_history(first: int, after: Optional[str], source: Optional[str] = None) -> Dict[str, Any]:
+    """Ledger entries, newest first."""
+    first = max(1, min(first, 500))
+    c, params = [], []
+    if source:
+        c += ["source = %s"]; params += [source]
+    if after:
+        c += ["id < %s"]; params += [_dec(after)]
+    ws = ("WHERE " + " AND ".join(c)) if c else ""
+
+    with get_cursor() as cur:
+        cur.execute(f"""
+          SELECT id, {LEDGER_COLUMNS}
+          FROM import_ledger
+          {ws}
+          ORDER BY id DESC
+          LIMIT %s
+        """, params + [first + 1])
+        rows = cur.fetchall()
+
+    has_next = len(rows) > first
+    if has_next:
+        rows = rows[:first]
+
+    edges = [{"cursor": _enc(r[0]), "node": {"id": r[0], **_entry(r[1:])}} for r in rows]
+    return {
+        "edges": edges,
+        "pageInfo": {"endCursor": (edges[-1]["cursor"] if edges else after), "hasNextPage": has_next},
+    }
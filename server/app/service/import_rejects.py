@@ -0,0 +1,88 @@
+from __future__ import annotations
+import base64
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from psycopg import sql
+from app.config.db.connection import get_async_cursor, get_cursor
+
+REJECT_CSV_HEADER = [
+    "Line", "Reason",
+    "Region", "Country", "Item Type", "Sales Channel", "Order Priority",
+    "Order Date", "Order ID", "Ship Date", "Units Sold", "Unit Price",
+    "Unit Cost", "Total Revenue", "Total Cost", "Total Profit",
+]
+
+
+def _enc(rid: int) -> str:
+    return base64.urlsafe_b64encode(str(int(rid)).encode("ascii")).decode("ascii")
+
+def _dec(cur: str) -> int:
+    return int(base64.urlsafe_b64decode(cur.encode("ascii")).decode("ascii"))
+
+def _where(source: str, import_id: Optional[str]) -> Tuple[str, List[Any]]:
+    c, p = ["source = %s"], [source]
+    if import_id:
+        c += ["import_id = %s"]; p += [import_id]
+    return "WHERE " + " AND ".join(c), p
+
+
+def query_import_rejects(source: str, first: int, after: Optional[str], import_id: Optional[str] = None) -> Dict[str, Any]:
+    first = max(1, min(first, 500))
+    ws, params = _where(source, import_id)
+    if after:
+        ws += " AND id > %s"; params += [_dec(after)]
+
+    with get_cursor() as cur:
+        cur.execute(f"""
+          SELECT id, import_id, source, line_no, reason, raw, rejected_at
+          FROM import_rejects
+          {ws}
+          ORDER BY id
+          LIMIT %s
+        """, params + [first + 1])
+        rows = cur.fetchall()
+
+    has_next = len(rows) > first
+    if has_next:
+        rows = rows[:first]
+
+    edges = [{
+        "cursor": _enc(r[0]),
+        "node": {
+            "id": r[0], "import_id": r[1], "source": r[2], "line_no": r[3],
+            "reason": r[4], "raw": list(r[5]), "rejected_at": r[6].isoformat(),
+        },
+    } for r in rows]
+    return {
+        "edges": edges,
+        "pageInfo": {"endCursor": (edges[-1]["cursor"] if edges else after), "hasNextPage": has_next},
+    }
+
+
+def iter_rejects_csv(source: str, import_id: Optional[str] = None) -> Iterator[bytes]:
+    """Stream the rejects for ``source`` as CSV straight from ``COPY ... TO STDOUT``."""
+    stmt, params = _rejects_copy(source, import_id)
+    with get_cursor() as cur:
+        with cur.copy(stmt, params) as cp:
+            for block in cp:
+                yield bytes(block)
+
+async def aiter_rejects_csv(source: str, import_id: Optional[str] = None) -> AsyncIterator[bytes]:
+    """iter_rejects_csv on the async pool."""
+    stmt, params = _rejects_copy(source, import_id)
+    async with get_async_cursor() as cur:
+        async with cur.copy(stmt, params) as cp:
+            async for block in cp:
+                yield bytes(block)
+
+def _rejects_copy(source: str, import_id: Optional[str]) -> Tuple[sql.Composed, List[Any]]:
+    ws, params = _where(source, import_id)
+    cols = sql.SQL(", ").join(
+        [sql.SQL("line_no AS {}").format(sql.Identifier(REJECT_CSV_HEADER[0])),
+         sql.SQL("reason AS {}").format(sql.Identifier(REJECT_CSV_HEADER[1]))]
+        + [sql.SQL("raw[{}] AS {}").format(sql.Literal(i + 1), sql.Identifier(name))
+           for i, name in enumerate(REJECT_CSV_HEADER[2:])]
+    )
+    stmt = sql.SQL("COPY (SELECT {} FROM import_rejects {} ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER true)").format(
+        cols, sql.SQL(ws)
+    )
+    return stmt, params
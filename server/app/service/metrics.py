@@ -0,0 +1,344 @@
+"""Per-process metrics in the Prometheus text format, served at /metrics."""
+from __future__ import annotations
+import bisect, inspect, os, re, threading, time
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import psycopg
+from strawberry.extensions import SchemaExtension
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+IMPORT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+PHASE_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+ROWS_PER_SEC_BUCKETS = (1e3, 2.5e3, 5e3, 1e4, 2.5e4, 5e4, 1e5, 2.5e5, 5e5, 1e6)
+RSS_BUCKETS = tuple(float(mb << 20) for mb in (1, 4, 16, 64, 256, 1024, 4096))
+
+
+def _labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    esc = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, esc)) + "}"
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *label_values: Any) -> None:
+        key = tuple(str(v) for v in label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"] + [
+            f"{self.name}{_labels(self.labels, k)} {_num(v)}" for k, v in values
+        ]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: Any) -> None:
+        key = tuple(str(v) for v in label_values)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((k, list(counts), total) for k, (counts, total) in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+_registry: List[Any] = []
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+IMPORT_SECONDS = register(Histogram(
+    "csv_import_duration_seconds", "Wall time of sales imports.", ("engine", "status"), IMPORT_BUCKETS,
+))
+IMPORT_ROWS_PER_SEC = register(Histogram(
+    "csv_import_rows_per_second", "Rows read per second by successful imports.", ("engine",), ROWS_PER_SEC_BUCKETS,
+))
+IMPORT_PHASE_SECONDS = register(Histogram(
+    "csv_import_phase_seconds", "Time imports spent in each phase.", ("phase",), PHASE_BUCKETS,
+))
+IMPORT_ROWS = register(Counter("csv_import_rows_total", "Rows read by successful imports, by outcome.", ("outcome",)))
+IMPORT_BYTES = register(Counter("csv_import_bytes_total", "Upload bytes read by imports."))
+IMPORT_RSS_GROWTH = register(Histogram(
+    "csv_import_rss_growth_bytes", "Peak resident memory of the process during an import, less that at its start.",
+    (), RSS_BUCKETS,
+))
+RESOLVER_SECONDS = register(Histogram(
+    "graphql_resolver_duration_seconds", "Latency of root GraphQL fields.", ("field",),
+))
+RESOLVER_ERRORS = register(Counter("graphql_resolver_errors_total", "Root GraphQL fields that raised.", ("field",)))
+STATEMENT_SECONDS = register(Histogram(
+    "db_statement_duration_seconds", "Latency of SQL statements, by verb and first table.", ("statement",),
+))
+POOL_CHECKOUT_SECONDS = register(Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled connection.", ("pool",),
+))
+READ_ROUTES = register(Counter(
+    "db_read_routes_total", "Read-only cursors by where they were served (read pool, replica or primary and why).", ("route",),
+))
+
+# psycopg_pool get_stats() keys exported per pool; counters in ms become seconds.
+POOL_GAUGES = {
+    "pool_size": ("db_pool_size", "Connections open or being opened."),
+    "pool_available": ("db_pool_available", "Idle connections in the pool."),
+    "requests_waiting": ("db_pool_requests_waiting", "Requests waiting for a connection right now."),
+}
+POOL_COUNTERS = {
+    "requests_num": ("db_pool_requests_total", "Connections requested from the pool."),
+    "requests_queued": ("db_pool_requests_queued_total", "Requests that had to wait for a connection."),
+    "requests_errors": ("db_pool_requests_errors_total", "Requests that timed out or failed."),
+    "requests_wait_ms": ("db_pool_requests_wait_seconds_total", "Total time requests waited for a connection."),
+    "usage_ms": ("db_pool_usage_seconds_total", "Total time connections were checked out."),
+    "connections_num": ("db_pool_connections_total", "Connection attempts."),
+    "connections_errors": ("db_pool_connections_errors_total", "Failed connection attempts."),
+}
+
+
+def _pool_lines() -> List[str]:
+    from app.config.db import connection
+
+    pools = [
+        (name, p.get_stats()) for name, p in (
+            ("sync", connection._pool), ("async", connection._async_pool),
+            ("sync_read", connection._read_pool), ("async_read", connection._async_read_pool),
+        ) if p
+    ]
+    lines = []
+    for key, (metric, help) in POOL_GAUGES.items():
+        lines += [f"# HELP {metric} {help}", f"# TYPE {metric} gauge"]
+        lines += [f'{metric}{{pool="{name}"}} {stats.get(key, 0)}' for name, stats in pools]
+    for key, (metric, help) in POOL_COUNTERS.items():
+        lines += [f"# HELP {metric} {help}", f"# TYPE {metric} counter"]
+        scale = 1000.0 if key.endswith("_ms") else 1
+        lines += [f'{metric}{{pool="{name}"}} {_num(stats.get(key, 0) / scale)}' for name, stats in pools]
+    return lines
+
+
+def _cache_lines() -> List[str]:
+    from app.service.cache import cache_stats
+
+    stats = cache_stats()
+    lines = []
+    for key in ("hits", "misses", "evictions"):
+        lines += [f"# HELP query_cache_{key}_total Query cache {key}.", f"# TYPE query_cache_{key}_total counter"]
+        lines += [f'query_cache_{key}_total{{cache="{s["name"]}"}} {s[key]}' for s in stats]
+    return lines
+
+
+def _process_lines() -> List[str]:
+    rss = resident_memory()
+    if rss is None:
+        return []
+    return [
+        "# HELP process_resident_memory_bytes Resident memory of this server process.",
+        "# TYPE process_resident_memory_bytes gauge",
+        f"process_resident_memory_bytes {rss}",
+    ]
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines += metric.render()
+    return "\n".join(lines + _pool_lines() + _cache_lines() + _process_lines()) + "\n"
+
+
+# --- SQL statements ---------------------------------------------------------
+
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE(?:\s+IF\s+(?:NOT\s+)?EXISTS)?)\s+([A-Za-z_][\w.]*)", re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def statement_label(query: str) -> str:
+    """``VERB table`` for a statement, e.g. ``INSERT sales``; bounded label set."""
+    words = query.split(None, 1)
+    if not words:
+        return "EMPTY"
+    verb = words[0].upper()
+    m = _TABLE.search(query)
+    table = m.group(1).lower() if m else ""
+    # Per-import staging tables would make one label each.
+    table = re.sub(r"_[0-9a-f]{32}$", "", table)
+    return f"{verb} {table}" if table else verb
+
+
+def _query_text(query: Any, cur: Any) -> str:
+    if isinstance(query, str):
+        return query
+    if isinstance(query, bytes):
+        return query.decode("utf-8", "replace")
+    try:
+        return query.as_string(cur)
+    except Exception:
+        return type(query).__name__
+
+
+class TimedCursor(psycopg.Cursor):
+    """Cursor recording the latency of every execute() (pool cursor_factory)."""
+
+    def execute(self, query, params=None, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(query, params, **kwargs)
+        finally:
+            STATEMENT_SECONDS.observe(time.perf_counter() - t0, statement_label(_query_text(query, self)))
+
+
+class AsyncTimedCursor(psycopg.AsyncCursor):
+    async def execute(self, query, params=None, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            STATEMENT_SECONDS.observe(time.perf_counter() - t0, statement_label(_query_text(query, self)))
+
+
+# --- GraphQL ----------------------------------------------------------------
+
+class ResolverMetrics(SchemaExtension):
+    """Times root fields (salesPage, importSales, ...) by ``Type.field``; nested ones are attribute reads."""
+
+    def resolve(self, _next: Callable, root: Any, info: Any, *args: Any, **kwargs: Any) -> Any:
+        if info.path.prev is not None:
+            return _next(root, info, *args, **kwargs)
+        field = f"{info.parent_type.name}.{info.field_name}"
+        t0 = time.perf_counter()
+        try:
+            result = _next(root, info, *args, **kwargs)
+        except Exception:
+            RESOLVER_ERRORS.inc(1, field)
+            RESOLVER_SECONDS.observe(time.perf_counter() - t0, field)
+            raise
+        if inspect.isawaitable(result):
+            return _observe_async(result, field, t0)
+        RESOLVER_SECONDS.observe(time.perf_counter() - t0, field)
+        return result
+
+
+async def _observe_async(result: Any, field: str, t0: float) -> Any:
+    try:
+        return await result
+    except Exception:
+        RESOLVER_ERRORS.inc(1, field)
+        raise
+    finally:
+        RESOLVER_SECONDS.observe(time.perf_counter() - t0, field)
+
+
+# --- Import phases ----------------------------------------------------------
+
+IMPORT_PHASES = ("read", "decode", "copy", "dedupe", "validate", "insert", "commit", "indexes", "analyze")
+
+class PhaseClock:
+    """Wall time per import phase, adding up to the import's wall time."""
+
+    def __init__(self) -> None:
+        self.seconds: Dict[str, float] = {}
+        self._phase: Optional[str] = None
+        self._t0 = 0.0
+
+    def mark(self, phase: Optional[str]) -> None:
+        now = time.perf_counter()
+        if self._phase is not None:
+            self.seconds[self._phase] = self.seconds.get(self._phase, 0.0) + now - self._t0
+        self._phase, self._t0 = phase, now
+
+    def stop(self) -> None:
+        self.mark(None)
+
+    def carve(self, phase: str, **parts: float) -> None:
+        # Moves time measured inside ``phase`` (read and decode during copy) out of it.
+        total = self.seconds.get(phase, 0.0)
+        for name, sec in parts.items():
+            sec = max(0.0, min(sec, total))
+            if sec:
+                self.seconds[name] = self.seconds.get(name, 0.0) + sec
+                total -= sec
+        self.seconds[phase] = total
+
+    def as_ms(self) -> Dict[str, float]:
+        return {p: round(self.seconds[p] * 1000.0, 3) for p in IMPORT_PHASES if p in self.seconds}
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def resident_memory() -> Optional[int]:
+    """Resident set size of this process in bytes; None where /proc is not available."""
+    try:
+        with open("/proc/self/statm", "rb") as fh:
+            return int(fh.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+class MemoryWatermark:
+    """Highest resident memory (of the whole process) seen while an import runs."""
+
+    def __init__(self) -> None:
+        self.start = resident_memory()
+        self.peak = self.start
+
+    def sample(self) -> None:
+        if self.start is not None:
+            rss = resident_memory()
+            if rss is not None and rss > self.peak:
+                self.peak = rss
+
+    def as_dict(self) -> Dict[str, Optional[int]]:
+        self.sample()
+        return {
+            "peak_rss_bytes": self.peak,
+            "rss_growth_bytes": None if self.start is None else self.peak - self.start,
+        }
+
+
+def observe_import(engine: str, status: str, duration_sec: float, phases_ms: Dict[str, float],
+                   rows: Optional[int] = None, bytes: Optional[int] = None,
+                   rss_growth: Optional[int] = None, **outcomes: int) -> None:
+    IMPORT_SECONDS.observe(duration_sec, engine, status)
+    if rss_growth is not None:
+        IMPORT_RSS_GROWTH.observe(rss_growth)
+    for phase, ms in phases_ms.items():
+        IMPORT_PHASE_SECONDS.observe(ms / 1000.0, phase)
+    if bytes:
+        IMPORT_BYTES.inc(bytes)
+    if rows and duration_sec > 0:
+        IMPORT_ROWS_PER_SEC.observe(rows / duration_sec, engine)
+    for outcome, n in outcomes.items():
+        if n:
+            IMPORT_ROWS.inc(n, outcome)
@@ -0,0 +1,94 @@
+"""Automatic persisted queries (Apollo APQ, version 1) and a cache of parsed GraphQL documents."""
+from __future__ import annotations
+import hashlib
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from graphql import GraphQLError
+from strawberry.extensions import SchemaExtension
+from strawberry.http import GraphQLRequestData
+from strawberry.types import ExecutionContext, ExecutionResult
+from app.config.db_setup import settings
+from app.service.cache import register_cache
+
+# Neither depends on the data, so imports leave them alone; the TTL only
+# keeps the stats honest about entries nobody uses any more.
+_ENTRY_TTL_SEC = 24 * 3600.0
+_documents = register_cache("graphql_document", settings.graphql_document_cache_entries, _ENTRY_TTL_SEC, generational=False)
+_queries = register_cache("persisted_query", settings.persisted_query_entries, _ENTRY_TTL_SEC, generational=False)
+
+
+class DocumentCache(SchemaExtension):
+    """Hands Strawberry the cached document of a query text, skipping parse and validation."""
+
+    # Strawberry assigns each request's context to one shared instance.
+    _context: ContextVar[ExecutionContext] = ContextVar("graphql_execution_context")
+
+    @property
+    def execution_context(self) -> ExecutionContext:
+        return self._context.get()
+
+    @execution_context.setter
+    def execution_context(self, ctx: ExecutionContext) -> None:
+        self._context.set(ctx)
+
+    def on_parse(self) -> Iterator[None]:
+        ctx = self.execution_context
+        if ctx.query and (document := _documents.get((id(ctx.schema), ctx.query))) is not None:
+            ctx.graphql_document = document
+        yield
+
+    def on_validate(self) -> Iterator[None]:
+        ctx = self.execution_context
+        key = (id(ctx.schema), ctx.query)
+        cached = ctx.graphql_document is not None and _documents.get(key) is ctx.graphql_document
+        if cached:
+            ctx.pre_execution_errors = []  # i.e. validated: Strawberry skips validation
+        yield
+        if not cached and ctx.graphql_document is not None and ctx.pre_execution_errors == []:
+            _documents.put(key, ctx.graphql_document)
+
+
+class PersistedQueryError(Exception):
+    """A persistedQuery extension that cannot be served; ``code`` goes in the error's extensions."""
+
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.code = code
+
+    def result(self) -> ExecutionResult:
+        return ExecutionResult(data=None, errors=[GraphQLError(str(self), extensions={"code": self.code})])
+
+
+def resolve_persisted_query(data: GraphQLRequestData) -> GraphQLRequestData:
+    """Fill in the query text of a hash-only request, or remember the text sent with a hash."""
+    pq = (data.extensions or {}).get("persistedQuery")
+    if pq is None:
+        return data
+    if not isinstance(pq, dict) or pq.get("version") != 1 or not isinstance(pq.get("sha256Hash"), str):
+        raise PersistedQueryError("PersistedQueryNotSupported", "PERSISTED_QUERY_NOT_SUPPORTED")
+    digest = pq["sha256Hash"].lower()
+    if data.query is None:
+        query = _queries.get(digest)
+        if query is None:
+            raise PersistedQueryError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+        data.query = query
+    elif hashlib.sha256(data.query.encode("utf-8")).hexdigest() != digest:
+        raise PersistedQueryError("provided sha does not match query", "PERSISTED_QUERY_HASH_MISMATCH")
+    else:
+        _queries.put(digest, data.query)
+    return data
+
+
+def cache_control() -> str:
+    """Cache-Control of a successful GET query; private as responses depend on the caller's cookies."""
+    return f"private, max-age={max(0, settings.graphql_get_max_age_sec)}"
+
+def body_etag(body: bytes) -> str:
+    """Strong entity tag (unquoted) of a response body."""
+    return hashlib.sha256(body).hexdigest()[:32]
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any(t.removeprefix("W/").strip('"') == etag for t in tags)
@@ -0,0 +1,196 @@
+"""Page jumps and total counts for salesPage from per-day order counts."""
+from __future__ import annotations
+import argparse, json, logging
+from typing import Any, Dict, List, Optional, Tuple
+import psycopg
+from app.config.db.connection import get_cursor, get_read_cursor
+from app.config.db_setup import settings
+from app.service.cache import register_cache
+from app.service.sales_query import _enc, _filter_key, _ranked, _where
+from app.service.sales_summary import ROLLUP_LOCK_KEY
+
+log = logging.getLogger("app.service.sales_checkpoints")
+
+_jump_cache = register_cache("sales_checkpoints", settings.query_cache_entries, settings.query_cache_ttl_sec)
+
+# Filters with an exact count: one of these (or none) and an order date range.
+CHECKPOINT_DIMENSIONS = ("region", "country", "item_type", "sales_channel")
+
+# Orders per (scope, order_date); scope '' is all sales, 'country=Norway' one
+# filter value. Kept current by imports like sales_rollup_monthly.
+DDL_CHECKPOINTS = """
+CREATE TABLE IF NOT EXISTS sales_checkpoints (
+  scope       TEXT    NOT NULL,
+  order_date  DATE    NOT NULL,
+  orders      BIGINT  NOT NULL,
+  PRIMARY KEY (scope, order_date)
+);
+"""
+
+_SCOPES = "(VALUES (''), " + ", ".join(f"('{d}=' || r.{d})" for d in CHECKPOINT_DIMENSIONS) + ") s(scope)"
+
+# {rows} must be aliased r. The ORDER BY keeps concurrent imports locking
+# checkpoint rows in the same order, as for the rollup.
+_CHECKPOINT_UPSERT = """
+INSERT INTO sales_checkpoints AS c (scope, order_date, orders)
+SELECT s.scope, r.order_date, {sign}COUNT(*)
+FROM {rows}
+CROSS JOIN LATERAL """ + _SCOPES + """
+GROUP BY 1, 2
+ORDER BY 1, 2
+ON CONFLICT (scope, order_date) DO UPDATE SET orders = c.orders + EXCLUDED.orders"""
+
+# CTE body counting the rows RETURNed by an `ins` CTE (sales_summary.ROLLUP_RETURNING).
+CHECKPOINT_CTE = "counted AS (" + _CHECKPOINT_UPSERT.format(sign="", rows="ins r") + "\n)"
+
+# Counterpart of sales_summary.SUBTRACT_ROLLUP, with the same placeholders.
+SUBTRACT_CHECKPOINTS = _CHECKPOINT_UPSERT.format(
+    sign="-",
+    rows="(SELECT * FROM sales WHERE ({key}) IN ({ids}) FOR UPDATE) r",
+)
+
+DELETE_EMPTY_CHECKPOINTS = "DELETE FROM sales_checkpoints WHERE orders = 0;"
+
+REBUILD_CHECKPOINTS = """
+TRUNCATE sales_checkpoints;
+""" + _CHECKPOINT_UPSERT.format(sign="", rows="sales r") + ";"
+
+# First day in {dir} order whose running total passes %s, and the rows before it.
+JUMP_DAY = """
+SELECT order_date, upto - orders FROM (
+  SELECT order_date, orders, SUM(orders) OVER (ORDER BY order_date {dir}) AS upto
+  FROM sales_checkpoints
+  WHERE scope = %s{bounds}
+) d
+WHERE upto > %s
+ORDER BY order_date {dir}
+LIMIT 1
+"""
+
+TOTAL = "SELECT COALESCE(SUM(orders), 0) FROM sales_checkpoints WHERE scope = %s{bounds}"
+
+
+def rebuild_sales_checkpoints(cur: Optional[psycopg.Cursor] = None) -> None:
+    """Recount from scratch (backfill or repair)."""
+    if cur is None:
+        with get_cursor() as cur:
+            rebuild_sales_checkpoints(cur)
+        return
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", [ROLLUP_LOCK_KEY])
+    cur.execute(REBUILD_CHECKPOINTS)
+
+def backfill_sales_checkpoints(cur: psycopg.Cursor) -> None:
+    """Fill an empty sales_checkpoints from existing sales, e.g. right after it is created."""
+    cur.execute("""
+      SELECT NOT EXISTS (SELECT 1 FROM sales_checkpoints)
+         AND EXISTS (SELECT 1 FROM sales)
+    """)
+    if cur.fetchone()[0]:
+        rebuild_sales_checkpoints(cur)
+
+
+def _scope(f: Optional[Dict[str, Any]]) -> Optional[Tuple[str, str, List[Any]]]:
+    """Scope, date bounds SQL and parameters when the checkpoints count ``f`` exactly."""
+    f = {k: v for k, v in (f or {}).items() if v and k != "search_mode"}
+    bounds, params = "", []
+    if (v := f.pop("order_date_from", None)): bounds += " AND order_date >= %s"; params += [v]
+    if (v := f.pop("order_date_to", None)):   bounds += " AND order_date <= %s"; params += [v]
+    if not f:
+        return "", bounds, params
+    if len(f) == 1:
+        (k, v), = f.items()
+        if k in CHECKPOINT_DIMENSIONS:
+            return f"{k}={v}", bounds, params
+    return None
+
+
+def _total_count(f: Optional[Dict[str, Any]]) -> Tuple[int, bool]:
+    scope = _scope(f)
+    with get_read_cursor() as cur:
+        if scope is not None:
+            name, bounds, params = scope
+            cur.execute(TOTAL.format(bounds=bounds), [name] + params)
+            return int(cur.fetchone()[0]), True
+        ws, params = _where(f)
+        try:
+            cur.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM sales {ws}", params)
+        except psycopg.errors.UndefinedFunction as e:
+            raise ValueError("RANKED search requires the pg_trgm extension") from e
+        plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"]), False
+
+def sales_total_count(filter: Optional[Dict[str, Any]]) -> Tuple[int, bool]:
+    """Rows matching ``filter`` and whether that is exact (else a planner estimate)."""
+    return _jump_cache.get_or_load(("count", _filter_key(filter)), lambda: _total_count(filter))
+
+
+def _page_cursor(skip: int, f: Optional[Dict[str, Any]], direction: str) -> Optional[str]:
+    ws, params = _where(f)
+    joiner = "AND" if ws else "WHERE"
+    order = f"ORDER BY order_date {direction}, order_id {direction}"
+    scope = _scope(f)
+    with get_read_cursor() as cur:
+        if scope is None:
+            if skip > settings.page_jump_max_offset:
+                raise ValueError(
+                    f"Page jumps past row {settings.page_jump_max_offset} need a filter on at most one of "
+                    f"{', '.join(CHECKPOINT_DIMENSIONS)} and an order date range; page with after instead"
+                )
+            cur.execute(f"SELECT order_date, order_id FROM sales {ws} {order} OFFSET %s LIMIT 1", params + [skip - 1])
+        else:
+            name, bounds, bound_params = scope
+            cur.execute(JUMP_DAY.format(dir=direction, bounds=bounds), [name] + bound_params + [skip - 1])
+            day = cur.fetchone()
+            if day is None:
+                # Past the end: the last row, so the page comes back empty.
+                back = "ASC" if direction == "DESC" else "DESC"
+                cur.execute(
+                    f"SELECT order_date, order_id FROM sales {ws} ORDER BY order_date {back}, order_id {back} LIMIT 1",
+                    params,
+                )
+            else:
+                cur.execute(
+                    f"SELECT order_date, order_id FROM sales {ws} {joiner} order_date = %s"
+                    f" ORDER BY order_id {direction} OFFSET %s LIMIT 1",
+                    params + [day[0], skip - 1 - day[1]],
+                )
+        row = cur.fetchone()
+    return _enc(row[0], row[1]) if row else None
+
+def sales_page_cursor(page: int, first: int, filter: Optional[Dict[str, Any]], direction: str = "DESC") -> Optional[str]:
+    """The ``after`` cursor that makes a page of ``first`` rows page number ``page`` (from 1)."""
+    if page < 1:
+        raise ValueError("page starts at 1")
+    if _ranked(filter):
+        raise ValueError("Page jumps are not supported for RANKED search; page with after instead")
+    first = max(1, min(first, 200))
+    direction = "ASC" if str(direction).upper() == "ASC" else "DESC"
+    skip = (page - 1) * first
+    if skip == 0:
+        return None
+    key = ("jump", skip, _filter_key(filter), direction)
+    return _jump_cache.get_or_load(key, lambda: _page_cursor(skip, filter, direction))
+
+
+def main() -> None:
+    from app.config.db.connection import init_pool
+
+    ap = argparse.ArgumentParser(description="Maintain the salesPage checkpoints.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("rebuild", help="recount sales_checkpoints from sales")
+    ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_pool()
+    with get_cursor() as cur:
+        cur.execute(DDL_CHECKPOINTS)
+        rebuild_sales_checkpoints(cur)
+        cur.execute("SELECT COUNT(*), COUNT(DISTINCT scope) FROM sales_checkpoints")
+        days, scopes = cur.fetchone()
+    print(json.dumps({"checkpoints": days, "scopes": scopes}))
+
+
+if __name__ == "__main__":
+    main()
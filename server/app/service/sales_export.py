@@ -0,0 +1,91 @@
+from __future__ import annotations
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from app.config.db.connection import get_async_read_cursor, get_read_cursor
+from app.service.sales_query import SEARCH_TEXT, _ranked, _require_search_index, _require_search_index_async, _where
+
+# Same header, column order and date format the importer reads, so an export
+# can be imported again as is.
+EXPORT_COLUMNS = """
+  region         AS "Region",
+  country        AS "Country",
+  item_type      AS "Item Type",
+  sales_channel  AS "Sales Channel",
+  order_priority AS "Order Priority",
+  to_char(order_date, 'MM/DD/YYYY') AS "Order Date",
+  order_id       AS "Order ID",
+  to_char(ship_date, 'MM/DD/YYYY')  AS "Ship Date",
+  units_sold     AS "Units Sold",
+  unit_price     AS "Unit Price",
+  unit_cost      AS "Unit Cost",
+  total_revenue  AS "Total Revenue",
+  total_cost     AS "Total Cost",
+  total_profit   AS "Total Profit"
+"""
+
+GZIP_LEVEL = 6
+
+
+def filter_from_args(args) -> Dict[str, Any]:
+    """SalesFilter from query parameters named like its GraphQL fields."""
+    number = lambda k: float(args[k]) if args.get(k) else None
+    return {
+        "region": args.get("region"),
+        "country": args.get("country"),
+        "item_type": args.get("itemType"),
+        "sales_channel": args.get("salesChannel"),
+        "order_priority": args.get("orderPriority"),
+        "order_date_from": args.get("orderDateFrom"),
+        "order_date_to": args.get("orderDateTo"),
+        "min_profit": number("minProfit"),
+        "max_profit": number("maxProfit"),
+        "q": args.get("q"),
+        "search_mode": args.get("searchMode", "CONTAINS").upper(),
+    }
+
+
+def _export_copy(filter: Optional[Dict[str, Any]], direction: str) -> Tuple[str, List[Any]]:
+    direction = "ASC" if str(direction).upper() == "ASC" else "DESC"
+    ws, params = _where(filter)
+    order_sql = f"ORDER BY order_date {direction}, order_id {direction}"
+    if _ranked(filter):
+        order_sql = f"ORDER BY word_similarity(%s, {SEARCH_TEXT}) DESC, order_date DESC, order_id DESC"
+        params = params + [filter["q"]]
+    stmt = f"COPY (SELECT {EXPORT_COLUMNS} FROM sales {ws} {order_sql}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+    return stmt, params
+
+def _gzip(compress: bool):
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None  # wbits=31: gzip container
+
+
+def iter_sales_csv(filter: Optional[Dict[str, Any]], direction: str = "DESC", compress: bool = False) -> Iterator[bytes]:
+    """Stream the sales matching ``filter`` as CSV (gzip when ``compress``) from ``COPY ... TO STDOUT``."""
+    stmt, params = _export_copy(filter, direction)
+    gz = _gzip(compress)
+    with get_read_cursor() as cur:
+        if _ranked(filter):
+            _require_search_index(cur)
+        with cur.copy(stmt, params) as cp:
+            for block in cp:
+                if gz is None:
+                    yield bytes(block)
+                elif (out := gz.compress(block)):
+                    yield out
+    if gz is not None:
+        yield gz.flush()
+
+async def aiter_sales_csv(filter: Optional[Dict[str, Any]], direction: str = "DESC", compress: bool = False) -> AsyncIterator[bytes]:
+    """iter_sales_csv on the async pool."""
+    stmt, params = _export_copy(filter, direction)
+    gz = _gzip(compress)
+    async with get_async_read_cursor() as cur:
+        if _ranked(filter):
+            await _require_search_index_async(cur)
+        async with cur.copy(stmt, params) as cp:
+            async for block in cp:
+                if gz is None:
+                    yield bytes(block)
+                elif (out := gz.compress(block)):
+                    yield out
+    if gz is not None:
+        yield gz.flush()
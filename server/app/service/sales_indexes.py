@@ -0,0 +1,109 @@
+"""Sales indexes built CONCURRENTLY by maintenance once sales has rows."""
+from __future__ import annotations
+import argparse, json, logging, time
+from typing import Dict, List
+import psycopg
+from psycopg import sql
+from app.service.bulk_load import BULK_LOAD_LOCK_KEY, INDEX_VALID, _connect, _create, _partitioned, _try_lock
+from app.service.sales_query import SEARCH_INDEX, SEARCH_TEXT
+
+log = logging.getLogger("app.service.sales_indexes")
+
+# name -> definition, in the pg_get_indexdef form bulk_load._create rewrites.
+SALES_INDEXES: Dict[str, str] = {
+    # The keyset order of salesPage and the in-day offset of page jumps (see
+    # app.service.sales_checkpoints).
+    "idx_sales_order_date_id": "CREATE INDEX idx_sales_order_date_id ON sales USING btree (order_date, order_id)",
+    # SalesFilter.q; RANKED search is refused without it (see sales_query).
+    SEARCH_INDEX: f"CREATE INDEX {SEARCH_INDEX} ON sales USING gin ({SEARCH_TEXT} gin_trgm_ops)",
+}
+# Skipped while the extension they need is not installed (see csv_import.DDL_SALES_INDEXES).
+EXTENSIONS = {SEARCH_INDEX: "pg_trgm"}
+# Dropped once the index that replaces them is valid.
+REPLACES = {"idx_sales_order_date_id": "idx_sales_order_date"}
+
+SALES_HAS_ROWS = "SELECT EXISTS (SELECT 1 FROM sales)"
+INSTALLED = "SELECT extname FROM pg_extension"
+
+
+def _valid(cur: psycopg.Cursor, name: str) -> bool:
+    row = cur.execute(INDEX_VALID, [name]).fetchone()
+    return bool(row and row[0])
+
+
+def _buildable(cur: psycopg.Cursor) -> List[str]:
+    installed = {name for (name,) in cur.execute(INSTALLED).fetchall()}
+    return [name for name in SALES_INDEXES if name not in EXTENSIONS or EXTENSIONS[name] in installed]
+
+
+def missing_sales_indexes(cur: psycopg.Cursor) -> List[str]:
+    """Indexes absent or invalid, among those whose extension is installed."""
+    return [name for name in _buildable(cur) if not _valid(cur, name)]
+
+
+def create_sales_indexes(cur: psycopg.Cursor) -> None:
+    """Plain builds in the caller's transaction: for an empty or locked sales table."""
+    for name in _buildable(cur):
+        cur.execute(_create(SALES_INDEXES[name], concurrently=False))
+        if name in REPLACES:
+            cur.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(REPLACES[name])))
+
+
+def ensure_sales_indexes(cur: psycopg.Cursor) -> List[str]:
+    """Create the missing indexes if sales is empty; return those still missing."""
+    missing = missing_sales_indexes(cur)
+    if missing and cur.execute(SALES_HAS_ROWS).fetchone()[0]:
+        log.warning("sales lacks %s; run python -m app.service.sales_indexes build", ", ".join(missing))
+        return missing
+    if missing:
+        create_sales_indexes(cur)
+    return []
+
+
+def build_sales_indexes() -> List[str]:
+    """Build the missing indexes CONCURRENTLY, then drop the ones they replace."""
+    with _connect() as conn:
+        if not _try_lock(conn):
+            raise ValueError("A bulk load is running; retry once it has finished")
+        try:
+            # Partitioned indexes cannot be built CONCURRENTLY (see bulk_load).
+            concurrently = not _partitioned(conn)
+            built = []
+            for name in missing_sales_indexes(conn.cursor()):
+                t0 = time.perf_counter()
+                if conn.execute(INDEX_VALID, [name]).fetchone() is not None:
+                    # Left invalid by a CONCURRENTLY build that died.
+                    conn.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(name)))
+                conn.execute(_create(SALES_INDEXES[name], concurrently))
+                built.append(name)
+                log.info("Built index %s in %.1f s", name, time.perf_counter() - t0)
+            drop = "DROP INDEX CONCURRENTLY IF EXISTS {}" if concurrently else "DROP INDEX IF EXISTS {}"
+            for name, old in REPLACES.items():
+                if _valid(conn.cursor(), name):
+                    conn.execute(sql.SQL(drop).format(sql.Identifier(old)))
+        finally:
+            conn.execute("SELECT pg_advisory_unlock(%s)", [BULK_LOAD_LOCK_KEY])
+    return built
+
+
+def sales_index_status() -> Dict[str, List[str]]:
+    with _connect() as conn:
+        return {"missing": missing_sales_indexes(conn.cursor())}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Build the sales indexes ensure_schema leaves to maintenance.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="which of the indexes are missing or invalid")
+    sub.add_parser("build", help="build the missing indexes CONCURRENTLY")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.cmd == "status":
+        print(json.dumps(sales_index_status()))
+    else:
+        print(json.dumps({"built": build_sales_indexes()}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Per-request batching of order lookups: the first salesById loads its siblings' ids too."""
+from __future__ import annotations
+from typing import Any, Dict, Iterator, List, Optional
+from graphql import FieldNode, InlineFragmentNode, SelectionSetNode
+from graphql.utilities import value_from_ast_untyped
+from app.service.sales_query import cached_sales_by_ids
+
+CONTEXT_KEY = "sales_loader"
+
+
+class SalesLoader:
+    def __init__(self) -> None:
+        self._rows: Dict[int, Optional[Dict[str, Any]]] = {}
+        self.batches = 0
+        self._prefetched = False
+
+    def load_many(self, order_ids: List[int]) -> List[Optional[Dict[str, Any]]]:
+        ids = [int(i) for i in order_ids]
+        missing = [i for i in dict.fromkeys(ids) if i not in self._rows]
+        if missing:
+            self.batches += 1
+            self._rows.update(cached_sales_by_ids(missing))
+        return [self._rows[i] for i in ids]
+
+    def load(self, order_id: int) -> Optional[Dict[str, Any]]:
+        return self.load_many([order_id])[0]
+
+    def prefetch(self, info: Any, arg_name: str = "orderId") -> None:
+        """Load the ``arg_name`` of every root field named like ``info``'s, once."""
+        if self._prefetched:
+            return
+        self._prefetched = True
+        ids = []
+        # info.selected_fields only holds the field being resolved, not its
+        # siblings, hence the operation. Strawberry's Info does not expose
+        # named fragments; fields in those are loaded one by one.
+        for field in _root_fields(info.operation.selection_set):
+            if field.name.value != info.field_name:
+                continue
+            for arg in field.arguments:
+                if arg.name.value == arg_name:
+                    value = value_from_ast_untyped(arg.value, info.variable_values)
+                    try: ids.append(int(value))
+                    except (TypeError, ValueError): pass  # the resolver reports it
+        if ids:
+            self.load_many(ids)
+
+
+def _root_fields(selection_set: SelectionSetNode) -> Iterator[FieldNode]:
+    for sel in selection_set.selections:
+        if isinstance(sel, FieldNode):
+            yield sel
+        elif isinstance(sel, InlineFragmentNode):
+            yield from _root_fields(sel.selection_set)
+
+
+def get_loader(info: Any) -> SalesLoader:
+    """The loader for this request, kept in the GraphQL context dict."""
+    ctx = info.context
+    if not isinstance(ctx, dict):
+        return SalesLoader()
+    loader = ctx.get(CONTEXT_KEY)
+    if loader is None:
+        loader = ctx[CONTEXT_KEY] = SalesLoader()
+    return loader
@@ -0,0 +1,180 @@
+"""Monthly range partitions of ``sales`` (settings.sales_partitioned), named sales_pYYYYMM."""
+from __future__ import annotations
+import argparse, json, logging, re
+from datetime import date
+from typing import Any, Dict, Iterable, List, Set
+import psycopg
+from psycopg import sql
+from app.config.db.connection import get_cursor, pin_reads_to_primary
+from app.config.db_setup import settings
+
+log = logging.getLogger("app.service.sales_partitions")
+
+PARTITION_LOCK_KEY = 0x5A1E7  # serialises partition DDL across servers
+PARTITION_NAME = re.compile(r"^sales_p(\d{4})(\d{2})$")
+
+IS_PARTITIONED = "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('sales')"
+
+LIST_PARTITIONS = """
+SELECT c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid)
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = 'sales'::regclass
+ORDER BY c.relname
+"""
+
+# The partition is created on its own and then attached: ATTACH PARTITION
+# takes only SHARE UPDATE EXCLUSIVE on sales, so reads and other imports
+# carry on, where CREATE TABLE ... PARTITION OF would lock them all out.
+CREATE_PARTITION = "CREATE TABLE IF NOT EXISTS {part} (LIKE sales INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+ATTACH_PARTITION = "ALTER TABLE sales ATTACH PARTITION {part} FOR VALUES FROM ({lo}) TO ({hi})"
+
+def partition_name(month: date) -> str:
+    return f"sales_p{month.year:04d}{month.month:02d}"
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def _month_of(name: str) -> date:
+    m = PARTITION_NAME.match(name)
+    if not m:
+        raise ValueError(f"{name} is not a monthly sales partition")
+    return date(int(m.group(1)), int(m.group(2)), 1)
+
+
+def sales_is_partitioned(cur: psycopg.Cursor) -> bool:
+    cur.execute(IS_PARTITIONED)
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def _existing_months(cur: psycopg.Cursor) -> Set[date]:
+    cur.execute(LIST_PARTITIONS)
+    return {_month_of(name) for name, *_ in cur.fetchall() if PARTITION_NAME.match(name)}
+
+
+def create_sales_partitions(cur: psycopg.Cursor, months: Iterable[date]) -> List[str]:
+    """Create and attach the missing partitions for ``months`` in ``cur``'s transaction."""
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", [PARTITION_LOCK_KEY])
+    existing = _existing_months(cur)
+    created = []
+    for month in sorted({m.replace(day=1) for m in months} - existing):
+        part = sql.Identifier(partition_name(month))
+        cur.execute(sql.SQL(CREATE_PARTITION).format(part=part))
+        cur.execute(sql.SQL(ATTACH_PARTITION).format(
+            part=part, lo=sql.Literal(month), hi=sql.Literal(_next_month(month))
+        ))
+        created.append(partition_name(month))
+    if created:
+        log.info("Created sales partitions %s", ", ".join(created))
+    return created
+
+
+def ensure_sales_partitions(months: Iterable[date]) -> None:
+    """Make sure ``months`` have partitions, committing any new ones at once."""
+    months = {m.replace(day=1) for m in months}
+    if not months:
+        return
+    with get_cursor() as cur:
+        if months - _existing_months(cur):
+            create_sales_partitions(cur, months)
+
+
+def list_sales_partitions() -> List[Dict[str, Any]]:
+    with get_cursor() as cur:
+        cur.execute(LIST_PARTITIONS)
+        rows = cur.fetchall()
+    return [
+        {"name": name, "month": _month_of(name).isoformat(), "rows_estimate": max(int(rows), 0), "bytes": int(size)}
+        for name, rows, size in rows if PARTITION_NAME.match(name)
+    ]
+
+
+def migrate_to_partitioned() -> int:
+    """Rebuild an unpartitioned sales table as monthly partitions; returns the rows moved."""
+    from app.service.csv_import import DDL_SALES_INDEXES, DDL_SALES_PARTITIONED, SCHEMA_LOCK_KEY
+    from app.service.sales_indexes import create_sales_indexes
+
+    with get_cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", [SCHEMA_LOCK_KEY])
+        if sales_is_partitioned(cur):
+            log.info("sales is already partitioned")
+            return 0
+        cur.execute("LOCK TABLE sales IN ACCESS EXCLUSIVE MODE")
+        # Index names are schema-wide; move the old ones out of the way.
+        cur.execute("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'sales'")
+        for (index,) in cur.fetchall():
+            cur.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+                sql.Identifier(index), sql.Identifier(f"{index}_unpartitioned")
+            ))
+        cur.execute("ALTER TABLE sales RENAME TO sales_unpartitioned")
+        cur.execute(DDL_SALES_PARTITIONED)
+        cur.execute("SELECT DISTINCT date_trunc('month', order_date)::date FROM sales_unpartitioned")
+        create_sales_partitions(cur, [m for (m,) in cur.fetchall()])
+        cur.execute("INSERT INTO sales SELECT * FROM sales_unpartitioned")
+        moved = cur.rowcount
+        cur.execute("DROP TABLE sales_unpartitioned")
+        cur.execute(DDL_SALES_INDEXES)
+        create_sales_indexes(cur)
+    log.info("Migrated %d sales rows to monthly partitions", moved)
+    return moved
+
+
+def drop_sales_partitions(before: date, detach_only: bool = False) -> List[str]:
+    """Detach and drop (or only detach) every partition whose month ends on or before ``before``."""
+    from app.service.cache import bump_generation
+    from app.service.import_ledger import record_removal
+    from app.service.sales_summary import ROLLUP_LOCK_KEY
+
+    with get_cursor() as cur:
+        months = sorted(m for m in _existing_months(cur) if _next_month(m) <= before)
+    done = []
+    for month in months:
+        part = sql.Identifier(partition_name(month))
+        with get_cursor() as cur:
+            record_removal(cur, partition_name(month))
+        # DETACH ... CONCURRENTLY cannot run inside a transaction block.
+        with psycopg.connect(settings.database_url, autocommit=True) as conn:
+            conn.execute(sql.SQL("ALTER TABLE sales DETACH PARTITION {} CONCURRENTLY").format(part))
+        with get_cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", [ROLLUP_LOCK_KEY])
+            cur.execute("DELETE FROM sales_rollup_monthly WHERE month = %s", [month])
+            cur.execute(
+                "DELETE FROM sales_checkpoints WHERE order_date >= %s AND order_date < %s", [month, _next_month(month)]
+            )
+            if not detach_only:
+                cur.execute(sql.SQL("DROP TABLE {}").format(part))
+        done.append(partition_name(month))
+        log.info("%s sales partition %s", "Detached" if detach_only else "Dropped", partition_name(month))
+    if done:
+        bump_generation()
+        pin_reads_to_primary()
+    return done
+
+
+def main() -> None:
+    from app.config.db.connection import init_pool
+
+    ap = argparse.ArgumentParser(description="Manage the monthly partitions of the sales table.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="partitions with estimated rows and size")
+    sub.add_parser("migrate", help="rebuild an unpartitioned sales table as partitions (locks sales; restart the servers after)")
+    drop = sub.add_parser("drop-before", help="drop (or detach) partitions for months before YYYY-MM")
+    drop.add_argument("month", help="first month to keep, YYYY-MM")
+    drop.add_argument("--detach-only", action="store_true", help="keep the detached tables")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_pool()
+    if args.cmd == "list":
+        for p in list_sales_partitions():
+            print(json.dumps(p))
+    elif args.cmd == "migrate":
+        print(json.dumps({"rows_moved": migrate_to_partitioned()}))
+    else:
+        year, month = (int(x) for x in args.month.split("-"))
+        print(json.dumps({"removed": drop_sales_partitions(date(year, month, 1), args.detach_only)}))
+
+
+if __name__ == "__main__":
+    main()
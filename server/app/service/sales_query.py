@@ -2,19 +2,68 @@ from __future__ import annotations
 import base64, json
 from datetime import date
 from decimal import Decimal
-from typing import Dict, List, Optional, Tuple, Any
-from app.config.db.connection import get_cursor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union, Any
+import psycopg
+from psycopg.types.numeric import FloatLoader
+from app.config.db.connection import get_async_read_cursor, get_read_cursor
+from app.config.db_setup import settings
+from app.service.cache import register_cache
 
+_page_cache = register_cache("sales_page", settings.query_cache_entries, settings.query_cache_ttl_sec)
+_by_id_cache = register_cache("sales_by_id", settings.query_cache_entries, settings.query_cache_ttl_sec)
 
-def _enc(od: date, oid: int) -> str:
-    return base64.urlsafe_b64encode(
-        json.dumps({"od": od.isoformat(), "id": int(oid)}).encode("utf-8")
-    ).decode("ascii")
+
+# Text SalesFilter.q is matched against. It must stay identical to the
+# expression of idx_sales_search_trgm (app.service.sales_indexes) for the planner
+# to use that index. Fields are joined with a newline so a pattern cannot
+# match across two of them.
+SEARCH_TEXT = "(region || chr(10) || country || chr(10) || item_type)"
+
+SEARCH_MODES = ("CONTAINS", "RANKED")
+
+# Unindexed, RANKED search scores every row, so it is refused until the index
+# is built. Once seen valid it is not looked up again in this process.
+SEARCH_INDEX = "idx_sales_search_trgm"
+SEARCH_INDEX_VALID = "SELECT COALESCE((SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)), false)"
+SEARCH_UNINDEXED = f"RANKED search is unavailable until {SEARCH_INDEX} is built (python -m app.service.sales_indexes build)"
+_search_indexed = False
+
+
+def _enc(od: Union[date, str], oid: int, rank: Optional[float] = None) -> str:
+    d = {"od": od if isinstance(od, str) else od.isoformat(), "id": int(oid)}
+    if rank is not None:
+        d["r"] = rank
+    return base64.urlsafe_b64encode(json.dumps(d).encode("utf-8")).decode("ascii")
 
 def _dec(cur: str) -> Tuple[date, int]:
     d = json.loads(base64.urlsafe_b64decode(cur.encode("ascii")).decode("utf-8"))
     return date.fromisoformat(d["od"]), int(d["id"])
 
+def _dec_rank(cur: str) -> float:
+    d = json.loads(base64.urlsafe_b64decode(cur.encode("ascii")).decode("utf-8"))
+    if "r" not in d:
+        raise ValueError("Cursor was not produced by a RANKED search")
+    return float(d["r"])
+
+def _ranked(f: Optional[Dict[str, Any]]) -> bool:
+    return bool(f and f.get("q") and f.get("search_mode") == "RANKED")
+
+def _require_search_index(cur: psycopg.Cursor) -> None:
+    global _search_indexed
+    if not _search_indexed:
+        cur.execute(SEARCH_INDEX_VALID, [SEARCH_INDEX])
+        if not cur.fetchone()[0]:
+            raise ValueError(SEARCH_UNINDEXED)
+        _search_indexed = True
+
+async def _require_search_index_async(cur: psycopg.AsyncCursor) -> None:
+    global _search_indexed
+    if not _search_indexed:
+        await cur.execute(SEARCH_INDEX_VALID, [SEARCH_INDEX])
+        if not (await cur.fetchone())[0]:
+            raise ValueError(SEARCH_UNINDEXED)
+        _search_indexed = True
+
 def _where(f: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
     if not f: return "", []
     c, p = [], []
@@ -27,71 +76,170 @@ def _where(f: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
     if (v := f.get("order_date_to")):  c += ["order_date <= %s"];    p += [v]
     if (v := f.get("min_profit")):     c += ["total_profit >= %s"];  p += [v]
     if (v := f.get("max_profit")):     c += ["total_profit <= %s"];  p += [v]
-    if (v := f.get("q")):              c += ["(country ILIKE %s OR region ILIKE %s OR item_type ILIKE %s)"]; p += [f"%{v}%", f"%{v}%", f"%{v}%"]
+    if (v := f.get("q")):
+        # Both forms are answered by the trigram index; RANKED also accepts
+        # near misses (typos) via pg_trgm's word-similarity operator.
+        if _ranked(f): c += [f"({SEARCH_TEXT} ILIKE %s OR %s <%% {SEARCH_TEXT})"]; p += [f"%{v}%", v]
+        else:          c += [f"{SEARCH_TEXT} ILIKE %s"];                             p += [f"%{v}%"]
     return ("WHERE " + " AND ".join(c)) if c else "", p
 
 
-def query_sales_page(first: int, after: Optional[str], filter: Optional[Dict[str, Any]], direction: str = "DESC") -> Dict[str, Any]:
-    first = max(1, min(first, 200))
-    direction = "ASC" if str(direction).upper() == "ASC" else "DESC"
+# Sales node fields in the order node types take them positionally, each with
+# the SQL that yields it in output form: dates are formatted by the server and
+# NUMERIC columns load as float (see query_sales_page), so rows need no
+# per-value Python conversion.
+SALES_FIELD_SQL = {
+    "order_id": "order_id",
+    "region": "region",
+    "country": "country",
+    "item_type": "item_type",
+    "sales_channel": "sales_channel",
+    "order_priority": "order_priority",
+    "order_date": "to_char(order_date, 'YYYY-MM-DD')",
+    "ship_date": "to_char(ship_date, 'YYYY-MM-DD')",
+    "units_sold": "units_sold",
+    "unit_price": "unit_price",
+    "unit_cost": "unit_cost",
+    "total_revenue": "total_revenue",
+    "total_cost": "total_cost",
+    "total_profit": "total_profit",
+}
+SALES_FIELDS = tuple(SALES_FIELD_SQL)
+
+def _dict_node(*values: Any) -> Dict[str, Any]:
+    return dict(zip(SALES_FIELDS, values))
+
+def _dict_edge(cursor: str, node: Any) -> Dict[str, Any]:
+    return {"cursor": cursor, "node": node}
+
+def _edge_cursor(edge: Any) -> str:
+    return edge["cursor"] if isinstance(edge, dict) else edge.cursor
+
+def _select_list(fields: Optional[Iterable[str]]) -> str:
+    """All node fields, in order; those not in ``fields`` are selected as NULL."""
+    wanted = SALES_FIELDS if fields is None else set(fields)
+    return ", ".join(SALES_FIELD_SQL[f] if f in wanted else "NULL" for f in SALES_FIELDS)
+
+def _page_rows(node_type: Callable[..., Any], edge_type: Callable[[str, Any], Any], ranked: bool):
+    """Row factory building ``edge_type(cursor, node_type(*fields))`` from a page row and its keyset columns."""
+    n = len(SALES_FIELDS)
+    def factory(cur: psycopg.Cursor):
+        def make(values):
+            return edge_type(_enc(values[n], values[n + 1], values[n + 2] if ranked else None), node_type(*values[:n]))
+        return make
+    return factory
 
+
+def _page_query(
+    first: int, after: Optional[str], filter: Optional[Dict[str, Any]], direction: str, fields: Optional[Iterable[str]],
+) -> Tuple[str, List[Any], bool]:
+    """SQL and parameters for one page, and whether it is a RANKED search."""
     ws, params = _where(filter)
     cur_pred, cur_params = "", []
+    ranked = _ranked(filter)
+
+    # RANKED orders by similarity to q, best first, then newest first; the
+    # rank is part of the keyset so paging stays stable.
+    rank_sql, rank_params = "", []
+    if ranked:
+        direction = "DESC"
+        rank_sql, rank_params = f", word_similarity(%s, {SEARCH_TEXT}) AS rank", [filter["q"]]
 
     if after:
         od, oid = _dec(after)
         comp = "<" if direction == "DESC" else ">"
         joiner = "AND" if ws else "WHERE"
-        cur_pred = f" {joiner} (order_date, order_id) {comp} (%s, %s)"
-        cur_params = [od, oid]
+        if ranked:
+            cur_pred = f" {joiner} (word_similarity(%s, {SEARCH_TEXT}), order_date, order_id) < (%s::real, %s, %s)"
+            cur_params = [filter["q"], _dec_rank(after), od, oid]
+        else:
+            # The plain order_date bound is implied by the row comparison but,
+            # unlike it, lets the planner prune partitions and bound the index scan.
+            cur_pred = f" {joiner} order_date {comp}= %s AND (order_date, order_id) {comp} (%s, %s)"
+            cur_params = [od, od, oid]
 
     order_sql = f"ORDER BY order_date {direction}, order_id {direction}"
+    if ranked:
+        order_sql = "ORDER BY rank DESC, order_date DESC, order_id DESC"
     sql = f"""
-      SELECT order_id, region, country, item_type, sales_channel, order_priority,
-             order_date, ship_date, units_sold, unit_price, unit_cost,
-             total_revenue, total_cost, total_profit
+      SELECT {_select_list(fields)},
+             to_char(order_date, 'YYYY-MM-DD'), order_id{rank_sql}
       FROM sales
       {ws}{cur_pred}
       {order_sql}
       LIMIT %s
     """
-    params2 = params + cur_params + [first + 1]
-    with get_cursor() as cur:
-        cur.execute(sql, params2)
-        rows = cur.fetchall()
-
-    has_next = len(rows) > first
-    if has_next:
-        rows = rows[:first]
-
-    def node(r):
-        to_f = lambda x: float(x) if isinstance(x, Decimal) else x
-        return {
-            "order_id": r[0], "region": r[1], "country": r[2], "item_type": r[3],
-            "sales_channel": r[4], "order_priority": r[5],
-            "order_date": r[6].isoformat(), "ship_date": r[7].isoformat(),
-            "units_sold": int(r[8]), "unit_price": to_f(r[9]), "unit_cost": to_f(r[10]),
-            "total_revenue": to_f(r[11]), "total_cost": to_f(r[12]), "total_profit": to_f(r[13]),
-        }
-
-    edges = [{"cursor": _enc(r[6], r[0]), "node": node(r)} for r in rows]
+    return sql, rank_params + params + cur_params + [first + 1], ranked
+
+def _page_payload(edges: List[Any], has_next: bool, after: Optional[str]) -> Dict[str, Any]:
+    last = edges[-1] if edges else None
     return {
         "edges": edges,
-        "pageInfo": {"endCursor": (edges[-1]["cursor"] if edges else after), "hasNextPage": has_next},
+        "pageInfo": {"endCursor": (_edge_cursor(last) if last is not None else after), "hasNextPage": has_next},
     }
 
 
-def get_sales_by_id(order_id: int) -> Optional[Dict[str, Any]]:
-    with get_cursor() as cur:
-        cur.execute("""
-          SELECT order_id, region, country, item_type, sales_channel, order_priority,
-                 order_date, ship_date, units_sold, unit_price, unit_cost,
-                 total_revenue, total_cost, total_profit
-          FROM sales WHERE order_id = %s
-        """, [order_id])
-        r = cur.fetchone()
-    if not r:
-        return None
+def query_sales_page(
+    first: int,
+    after: Optional[str],
+    filter: Optional[Dict[str, Any]],
+    direction: str = "DESC",
+    fields: Optional[Iterable[str]] = None,
+    node_type: Callable[..., Any] = _dict_node,
+    edge_type: Callable[[str, Any], Any] = _dict_edge,
+) -> Dict[str, Any]:
+    """One page of sales in keyset order, reading only ``fields`` (default: all)."""
+    first = max(1, min(first, 200))
+    direction = "ASC" if str(direction).upper() == "ASC" else "DESC"
+    sql, params, ranked = _page_query(first, after, filter, direction, fields)
+    with get_read_cursor() as cur:
+        if ranked:
+            _require_search_index(cur)
+        cur.row_factory = _page_rows(node_type, edge_type, ranked)
+        cur.adapters.register_loader("numeric", FloatLoader)  # this cursor only
+        try:
+            cur.execute(sql, params)
+        except psycopg.errors.UndefinedFunction as e:
+            raise ValueError("RANKED search requires the pg_trgm extension") from e
+        # The probe row past the page only tells us there is a next page.
+        edges = cur.fetchmany(first)
+        has_next = cur.fetchone() is not None
+    return _page_payload(edges, has_next, after)
+
+async def query_sales_page_async(
+    first: int,
+    after: Optional[str],
+    filter: Optional[Dict[str, Any]],
+    direction: str = "DESC",
+    fields: Optional[Iterable[str]] = None,
+    node_type: Callable[..., Any] = _dict_node,
+    edge_type: Callable[[str, Any], Any] = _dict_edge,
+) -> Dict[str, Any]:
+    """query_sales_page on the async pool."""
+    first = max(1, min(first, 200))
+    direction = "ASC" if str(direction).upper() == "ASC" else "DESC"
+    sql, params, ranked = _page_query(first, after, filter, direction, fields)
+    async with get_async_read_cursor() as cur:
+        if ranked:
+            await _require_search_index_async(cur)
+        cur.row_factory = _page_rows(node_type, edge_type, ranked)
+        cur.adapters.register_loader("numeric", FloatLoader)
+        try:
+            await cur.execute(sql, params)
+        except psycopg.errors.UndefinedFunction as e:
+            raise ValueError("RANKED search requires the pg_trgm extension") from e
+        edges = await cur.fetchmany(first)
+        has_next = await cur.fetchone() is not None
+    return _page_payload(edges, has_next, after)
+
+
+SALES_BY_ID_COLUMNS = """
+  order_id, region, country, item_type, sales_channel, order_priority,
+  order_date, ship_date, units_sold, unit_price, unit_cost,
+  total_revenue, total_cost, total_profit
+"""
+
+def _sales_node(r) -> Dict[str, Any]:
     to_f = lambda x: float(x) if isinstance(x, Decimal) else x
     return {
         "order_id": r[0], "region": r[1], "country": r[2], "item_type": r[3],
@@ -101,3 +249,92 @@ def get_sales_by_id(order_id: int) -> Optional[Dict[str, Any]]:
         "total_revenue": to_f(r[11]), "total_cost": to_f(r[12]), "total_profit": to_f(r[13]),
     }
 
+# A partitioned sales table is keyed by (order_id, order_date), so one
+# order_id may occur on several dates. Lookups by id alone return the latest;
+# get_sales_by_id takes the date to pick another one.
+SALES_BY_ID = "SELECT" + SALES_BY_ID_COLUMNS + "FROM sales WHERE order_id = %s ORDER BY order_date DESC LIMIT 1"
+SALES_BY_ID_AND_DATE = "SELECT" + SALES_BY_ID_COLUMNS + "FROM sales WHERE order_id = %s AND order_date = %s::date"
+SALES_BY_IDS = (
+    "SELECT DISTINCT ON (order_id)" + SALES_BY_ID_COLUMNS
+    + "FROM sales WHERE order_id = ANY(%s) ORDER BY order_id, order_date DESC"
+)
+
+def get_sales_by_id(order_id: int, order_date: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    with get_read_cursor() as cur:
+        if order_date:
+            cur.execute(SALES_BY_ID_AND_DATE, [order_id, order_date])
+        else:
+            cur.execute(SALES_BY_ID, [order_id])
+        r = cur.fetchone()
+    return _sales_node(r) if r else None
+
+def get_sales_by_ids(order_ids: List[int]) -> Dict[int, Optional[Dict[str, Any]]]:
+    """Look up many orders in one round trip; unknown ids map to None."""
+    out: Dict[int, Optional[Dict[str, Any]]] = {int(i): None for i in order_ids}
+    if not out:
+        return out
+    with get_read_cursor() as cur:
+        cur.execute(SALES_BY_IDS, [list(out)])
+        for r in cur.fetchall():
+            out[r[0]] = _sales_node(r)
+    return out
+
+async def get_sales_by_ids_async(order_ids: List[int]) -> Dict[int, Optional[Dict[str, Any]]]:
+    out: Dict[int, Optional[Dict[str, Any]]] = {int(i): None for i in order_ids}
+    if not out:
+        return out
+    async with get_async_read_cursor() as cur:
+        await cur.execute(SALES_BY_IDS, [list(out)])
+        for r in await cur.fetchall():
+            out[r[0]] = _sales_node(r)
+    return out
+
+
+def _filter_key(f: Optional[Dict[str, Any]]) -> Tuple[Tuple[str, Any], ...]:
+    # Falsy values are ignored by _where, so they must not split the key either.
+    return tuple(sorted((k, v) for k, v in (f or {}).items() if v))
+
+def cached_sales_page(
+    first: int,
+    after: Optional[str],
+    filter: Optional[Dict[str, Any]],
+    direction: str = "DESC",
+    fields: Optional[Iterable[str]] = None,
+    node_type: Callable[..., Any] = _dict_node,
+    edge_type: Callable[[str, Any], Any] = _dict_edge,
+) -> Dict[str, Any]:
+    first = max(1, min(first, 200))
+    direction = "ASC" if str(direction).upper() == "ASC" else "DESC"
+    fields = None if fields is None else tuple(sorted(set(fields)))
+    key = (first, after or None, _filter_key(filter), direction, fields, node_type, edge_type)
+    return _page_cache.get_or_load(
+        key, lambda: query_sales_page(first, after, filter, direction, fields, node_type, edge_type)
+    )
+
+async def cached_sales_page_async(
+    first: int,
+    after: Optional[str],
+    filter: Optional[Dict[str, Any]],
+    direction: str = "DESC",
+    fields: Optional[Iterable[str]] = None,
+    node_type: Callable[..., Any] = _dict_node,
+    edge_type: Callable[[str, Any], Any] = _dict_edge,
+) -> Dict[str, Any]:
+    # Shares entries with cached_sales_page: both produce the same payloads.
+    first = max(1, min(first, 200))
+    direction = "ASC" if str(direction).upper() == "ASC" else "DESC"
+    fields = None if fields is None else tuple(sorted(set(fields)))
+    key = (first, after or None, _filter_key(filter), direction, fields, node_type, edge_type)
+    return await _page_cache.get_or_load_async(
+        key, lambda: query_sales_page_async(first, after, filter, direction, fields, node_type, edge_type)
+    )
+
+def cached_sales_by_id(order_id: int, order_date: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    key = (int(order_id), order_date) if order_date else int(order_id)
+    return _by_id_cache.get_or_load(key, lambda: get_sales_by_id(order_id, order_date))
+
+def cached_sales_by_ids(order_ids: List[int]) -> Dict[int, Optional[Dict[str, Any]]]:
+    return _by_id_cache.get_many([int(i) for i in order_ids], get_sales_by_ids)
+
+async def cached_sales_by_ids_async(order_ids: List[int]) -> Dict[int, Optional[Dict[str, Any]]]:
+    return await _by_id_cache.get_many_async([int(i) for i in order_ids], get_sales_by_ids_async)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+import psycopg
+from app.config.db.connection import get_cursor, get_read_cursor
+
+# One row per (month, region, country, item_type, sales_channel). Imports keep
+# it current incrementally (see ROLLUP_CTE / SUBTRACT_ROLLUP below), so summary
+# queries read a few thousand rows per month instead of scanning sales.
+DDL_ROLLUP = """
+CREATE TABLE IF NOT EXISTS sales_rollup_monthly (
+  month          DATE           NOT NULL,
+  region         TEXT           NOT NULL,
+  country        TEXT           NOT NULL,
+  item_type      TEXT           NOT NULL,
+  sales_channel  TEXT           NOT NULL,
+  orders         BIGINT         NOT NULL,
+  units_sold     BIGINT         NOT NULL,
+  total_revenue  NUMERIC(20,2)  NOT NULL,
+  total_cost     NUMERIC(20,2)  NOT NULL,
+  total_profit   NUMERIC(20,2)  NOT NULL,
+  PRIMARY KEY (month, region, country, item_type, sales_channel)
+);
+"""
+
+ROLLUP_KEYS = "month, region, country, item_type, sales_channel"
+ROLLUP_MEASURES = "orders, units_sold, total_revenue, total_cost, total_profit"
+
+_ROLLUP_UPSERT = """
+INSERT INTO sales_rollup_monthly AS r (""" + ROLLUP_KEYS + ", " + ROLLUP_MEASURES + """)
+SELECT date_trunc('month', order_date)::date, region, country, item_type, sales_channel,
+       {sign}COUNT(*), {sign}SUM(units_sold), {sign}SUM(total_revenue), {sign}SUM(total_cost), {sign}SUM(total_profit)
+FROM {rows}
+GROUP BY 1, 2, 3, 4, 5
+ORDER BY 1, 2, 3, 4, 5
+ON CONFLICT (""" + ROLLUP_KEYS + """) DO UPDATE SET
+  orders        = r.orders        + EXCLUDED.orders,
+  units_sold    = r.units_sold    + EXCLUDED.units_sold,
+  total_revenue = r.total_revenue + EXCLUDED.total_revenue,
+  total_cost    = r.total_cost    + EXCLUDED.total_cost,
+  total_profit  = r.total_profit  + EXCLUDED.total_profit"""
+
+# Columns an INSERT INTO sales must RETURN for ROLLUP_CTE to fold them in.
+ROLLUP_RETURNING = "RETURNING order_date, region, country, item_type, sales_channel, units_sold, total_revenue, total_cost, total_profit"
+
+# CTE body adding the rows RETURNed by an `ins` CTE to the rollup.
+ROLLUP_CTE = "rolled AS (" + _ROLLUP_UPSERT.format(sign="", rows="ins") + "\n)"
+
+# Removes the current values of rows an upsert is about to overwrite; the rows
+# are locked so nothing changes them before the upsert adds the new values.
+# Callers fill in the conflict key columns and the subquery producing the
+# incoming keys.
+SUBTRACT_ROLLUP = _ROLLUP_UPSERT.format(
+    sign="-",
+    rows="(SELECT * FROM sales WHERE ({key}) IN ({ids}) FOR UPDATE) old",
+)
+
+DELETE_EMPTY_ROLLUP = "DELETE FROM sales_rollup_monthly WHERE orders = 0;"
+
+# Imports hold this advisory lock while they write sales: shared for
+# DO_NOTHING, exclusive for DO_UPDATE. Otherwise an upsert could overwrite a
+# row another import inserted after our SUBTRACT_ROLLUP ran, and that row's
+# values would never be subtracted. The ORDER BY above keeps concurrent
+# DO_NOTHING imports locking rollup rows in the same order.
+ROLLUP_LOCK_KEY = 0x5A1E6
+
+REBUILD_ROLLUP = """
+TRUNCATE sales_rollup_monthly;
+""" + _ROLLUP_UPSERT.format(sign="", rows="sales") + ";"
+
+
+def rebuild_sales_rollups(cur: Optional[psycopg.Cursor] = None) -> None:
+    """Recompute the rollup from scratch (backfill or repair)."""
+    if cur is None:
+        with get_cursor() as cur:
+            rebuild_sales_rollups(cur)
+        return
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", [ROLLUP_LOCK_KEY])
+    cur.execute(REBUILD_ROLLUP)
+
+def backfill_sales_rollups(cur: psycopg.Cursor) -> None:
+    """Fill an empty rollup from existing sales, e.g. right after it is created."""
+    cur.execute("""
+      SELECT NOT EXISTS (SELECT 1 FROM sales_rollup_monthly)
+         AND EXISTS (SELECT 1 FROM sales)
+    """)
+    if cur.fetchone()[0]:
+        rebuild_sales_rollups(cur)
+
+
+DIMENSIONS = {
+    "month": "month",
+    "year": "date_trunc('year', month)::date",
+    "region": "region",
+    "country": "country",
+    "item_type": "item_type",
+    "sales_channel": "sales_channel",
+}
+
+def _where(f: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+    if not f: return "", []
+    c, p = [], []
+    if (v := f.get("region")):         c += ["region = %s"];         p += [v]
+    if (v := f.get("country")):        c += ["country = %s"];        p += [v]
+    if (v := f.get("item_type")):      c += ["item_type = %s"];      p += [v]
+    if (v := f.get("sales_channel")):  c += ["sales_channel = %s"];  p += [v]
+    if (v := f.get("month_from")):     c += ["month >= date_trunc('month', %s::date)"]; p += [v]
+    if (v := f.get("month_to")):       c += ["month <= date_trunc('month', %s::date)"]; p += [v]
+    return ("WHERE " + " AND ".join(c)) if c else "", p
+
+
+def query_sales_summary(group_by: List[str], filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    dims = list(dict.fromkeys(group_by))
+    unknown = [d for d in dims if d not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown summary dimension(s): {', '.join(unknown)}")
+
+    ws, params = _where(filter)
+    keys = [f"{DIMENSIONS[d]} AS {d}" for d in dims]
+    group = ("GROUP BY " + ", ".join(str(i + 1) for i in range(len(dims)))) if dims else ""
+    order = ("ORDER BY " + ", ".join(str(i + 1) for i in range(len(dims)))) if dims else ""
+    sql = f"""
+      SELECT {", ".join(keys + [""])}
+             SUM(orders), SUM(units_sold), SUM(total_revenue), SUM(total_cost), SUM(total_profit)
+      FROM sales_rollup_monthly
+      {ws}
+      {group}
+      HAVING SUM(orders) > 0
+      {order}
+    """
+    with get_read_cursor() as cur:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+
+    to_f = lambda x: float(x) if isinstance(x, Decimal) else x
+    n = len(dims)
+    out = []
+    for r in rows:
+        row: Dict[str, Any] = {d: (r[i].isoformat() if isinstance(r[i], date) else r[i]) for i, d in enumerate(dims)}
+        row.update({
+            "orders": int(r[n]), "units_sold": int(r[n + 1]),
+            "total_revenue": to_f(r[n + 2]), "total_cost": to_f(r[n + 3]), "total_profit": to_f(r[n + 4]),
+        })
+        out.append(row)
+    return out
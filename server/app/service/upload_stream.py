@@ -0,0 +1,139 @@
+"""Imports read from the request body as it arrives, for POST /imports/stream."""
+from __future__ import annotations
+import io, threading
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, Mapping, Optional, Tuple, Union
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import NEED_DATA, Data, Epilogue, File, MultipartDecoder
+from app.config.db_setup import settings
+from app.service.csv_import import ImportLimitExceeded
+
+_slots = threading.BoundedSemaphore(max(1, settings.upload_stream_max_concurrent))
+
+
+class StreamBusy(Exception):
+    """All upload_stream_max_concurrent streaming imports are running."""
+
+
+@contextmanager
+def stream_slot() -> Iterator[None]:
+    # Never blocks, so the ASGI server can take a slot on its event loop.
+    if not _slots.acquire(blocking=False):
+        raise StreamBusy(f"{settings.upload_stream_max_concurrent} streaming imports are already running")
+    try:
+        yield
+    finally:
+        _slots.release()
+
+
+def _flag(args: Mapping[str, str], name: str) -> bool:
+    return args.get(name, "").lower() in ("1", "true", "yes")
+
+def stream_options(args: Mapping[str, str]) -> Tuple[str, Dict[str, Any]]:
+    """Source and import keyword arguments from the query parameters; ValueError when invalid."""
+    source = args.get("source")
+    if not source:
+        raise ValueError("source is required")
+    options: Dict[str, Any] = {
+        "update_on_conflict": _flag(args, "updateOnConflict"),
+        "force": _flag(args, "force"),
+        "bulk_load": _flag(args, "bulkLoad"),
+        "engine": args.get("engine") or "single_pass",
+    }
+    if args.get("workers"):
+        try:
+            options["workers"] = int(args["workers"])
+        except ValueError:
+            raise ValueError("workers must be an integer") from None
+    return source, options
+
+
+def check_content_length(length: Union[int, str, None]) -> None:
+    """Refuse a body declared larger than settings.upload_max_bytes before reading any of it."""
+    limit = settings.upload_max_bytes
+    if limit is not None and length is not None and int(length) > limit:
+        raise ImportLimitExceeded(f"Upload of {length} bytes exceeds {limit} bytes")
+
+
+def _boundary(content_type: Optional[str]) -> Optional[bytes]:
+    mimetype, params = parse_options_header(content_type or "")
+    if mimetype != "multipart/form-data":
+        return None
+    if not params.get("boundary"):
+        raise ValueError("multipart/form-data without a boundary")
+    return params["boundary"].encode("latin-1")
+
+
+class _FilePart:
+    """Picks the bytes of the first file part out of a multipart body fed in pieces."""
+
+    def __init__(self, boundary: bytes):
+        self._decoder = MultipartDecoder(boundary)
+        self._in_file = self._done = False
+
+    def feed(self, data: Optional[bytes]) -> bytes:
+        """File bytes found in ``data``; None marks the end of the body."""
+        self._decoder.receive_data(data)
+        out = []
+        while True:
+            event = self._decoder.next_event()
+            if event is NEED_DATA or isinstance(event, Epilogue):
+                break
+            if isinstance(event, File) and not self._done:
+                self._in_file = True
+            elif isinstance(event, Data) and self._in_file:
+                out.append(event.data)
+                if not event.more_data:
+                    self._in_file, self._done = False, True
+        if data is None and not self._done:
+            raise ValueError("The multipart body has no complete file part")
+        return b"".join(out)
+
+
+class RequestBody(io.RawIOBase):
+    """The upload in a WSGI request body (``request.stream``), read on demand."""
+
+    def __init__(self, stream: BinaryIO, content_type: Optional[str]):
+        boundary = _boundary(content_type)
+        self._stream = stream
+        self._part = _FilePart(boundary) if boundary else None
+        self._pending = memoryview(b"")
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._pending:
+            if self._eof:
+                return 0
+            data = self._stream.read(len(b))
+            self._eof = not data
+            if self._part is not None:
+                data = self._part.feed(data or None)
+            self._pending = memoryview(data)
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+class AsyncRequestBody:
+    """The upload in an ASGI request body (Starlette's ``request.stream()``), with ``await read(n)``."""
+
+    def __init__(self, chunks: AsyncIterator[bytes], content_type: Optional[str]):
+        boundary = _boundary(content_type)
+        self._chunks = chunks
+        self._part = _FilePart(boundary) if boundary else None
+        self._eof = False
+
+    async def read(self, size: int) -> bytes:
+        # Servers hand the body over in small pieces; gather about ``size``.
+        out = bytearray()
+        while len(out) < size and not self._eof:
+            data = await anext(self._chunks, b"")
+            self._eof = not data
+            if self._part is not None:
+                data = self._part.feed(data or None)
+            out += data
+        return bytes(out)
@@ -0,0 +1,77 @@
+"""Compare the single_pass and arrow import engines on one generated file, rolled back."""
+from __future__ import annotations
+import argparse, json, os, tempfile, time
+from typing import Optional
+import psycopg
+from app.config.db_setup import settings
+from app.service.csv_import import (
+    CHUNK_SIZE, COPY_STAGE, DDL_SALES_TABLE, DDL_STAGE, SCHEMA_DDL, _merge_arrow, _merge_staged, _start_line_numbers,
+)
+from bench.bench_single_pass import write_csv
+
+
+def backend_cpu_ms(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/stat") as fh:
+            fields = fh.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) * 1000.0 / os.sysconf("SC_CLK_TCK")
+
+
+def run_engine(conn: psycopg.Connection, path: str, engine: str) -> dict:
+    pid = conn.info.backend_pid
+    cpu0, srv0, t0 = time.process_time(), backend_cpu_ms(pid), time.perf_counter()
+    with conn.cursor() as cur:
+        if engine == "arrow":
+            with open(path, "rb") as fh:
+                counts = _merge_arrow(cur, fh, False)
+        else:
+            cur.execute(DDL_STAGE)
+            _start_line_numbers(cur, 2)
+            with open(path, "r", encoding="utf-8", newline="") as fh, cur.copy(COPY_STAGE) as cp:
+                for chunk in iter(lambda: fh.read(CHUNK_SIZE), ""):
+                    cp.write(chunk)
+            counts = _merge_staged(cur, "sales_import", False, engine=engine)
+    wall_ms = (time.perf_counter() - t0) * 1000.0
+    cpu_ms = (time.process_time() - cpu0) * 1000.0
+    srv1 = backend_cpu_ms(pid)
+    conn.rollback()
+    return {
+        "engine": engine,
+        "wall_ms": round(wall_ms, 1),
+        "client_cpu_ms": round(cpu_ms, 1),
+        "server_cpu_ms": round(srv1 - srv0, 1) if srv0 is not None and srv1 is not None else None,
+        **counts,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--dsn", default=settings.database_url)
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--file", help="import this CSV instead of generating one")
+    args = ap.parse_args()
+
+    path = args.file
+    if not path:
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+        write_csv(path, args.rows)
+    try:
+        with psycopg.connect(args.dsn) as conn:
+            with conn.cursor() as cur:
+                for ddl in (DDL_SALES_TABLE, *SCHEMA_DDL):
+                    cur.execute(ddl)
+            conn.commit()
+            for _ in range(args.repeat):
+                for engine in ("single_pass", "arrow"):
+                    print(json.dumps({"file": os.path.basename(path), **run_engine(conn, path, engine)}), flush=True)
+    finally:
+        if not args.file:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Per-row Python cost of salesPage: dict decoding vs. row factories."""
+from __future__ import annotations
+import argparse, json, time
+from decimal import Decimal
+from psycopg_pool import ConnectionPool
+from app.config.db import connection
+from app.config.db_setup import settings
+from app.models.schema import Sales, SalesEdge, _sales_edge, _sales_node
+from app.service.sales_query import _enc, query_sales_page
+
+LEGACY_SQL = """
+  SELECT order_id, region, country, item_type, sales_channel, order_priority,
+         order_date, ship_date, units_sold, unit_price, unit_cost,
+         total_revenue, total_cost, total_profit
+  FROM sales
+  ORDER BY order_date DESC, order_id DESC
+  LIMIT %s
+"""
+
+
+def legacy_page(first: int) -> list:
+    with connection.get_cursor() as cur:
+        cur.execute(LEGACY_SQL, [first + 1])
+        rows = cur.fetchall()[:first]
+
+    def node(r):
+        to_f = lambda x: float(x) if isinstance(x, Decimal) else x
+        return {
+            "order_id": r[0], "region": r[1], "country": r[2], "item_type": r[3],
+            "sales_channel": r[4], "order_priority": r[5],
+            "order_date": r[6].isoformat(), "ship_date": r[7].isoformat(),
+            "units_sold": int(r[8]), "unit_price": to_f(r[9]), "unit_cost": to_f(r[10]),
+            "total_revenue": to_f(r[11]), "total_cost": to_f(r[12]), "total_profit": to_f(r[13]),
+        }
+
+    edges = [{"cursor": _enc(r[6], r[0]), "node": node(r)} for r in rows]
+    return [SalesEdge(cursor=e["cursor"], node=Sales(**e["node"])) for e in edges]
+
+
+def measure(name: str, fetch, pages: int) -> dict:
+    fetch()  # warm up
+    rows, cpu, wall = 0, time.process_time(), time.perf_counter()
+    for _ in range(pages):
+        rows += len(fetch())
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return {
+        "mode": name, "pages": pages, "rows": rows,
+        "client_cpu_us_per_row": round(cpu / max(rows, 1) * 1e6, 2),
+        "wall_ms_per_page": round(wall / pages * 1000, 3),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--dsn", default=settings.database_url)
+    ap.add_argument("--pages", type=int, default=500)
+    ap.add_argument("--first", type=int, default=200)
+    args = ap.parse_args()
+
+    connection._pool = ConnectionPool(args.dsn, min_size=1, max_size=1, open=True)
+    first = args.first
+    modes = {
+        "legacy": lambda: legacy_page(first),
+        "full": lambda: query_sales_page(first, None, None, "DESC", None, _sales_node, _sales_edge)["edges"],
+        "projected": lambda: query_sales_page(
+            first, None, None, "DESC", ("order_id", "country", "total_profit"), _sales_node, _sales_edge
+        )["edges"],
+    }
+    for name, fetch in modes.items():
+        print(json.dumps(measure(name, fetch, args.pages)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
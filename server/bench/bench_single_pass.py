@@ -0,0 +1,69 @@
+"""Compare the multi_pass and single_pass import engines on one staged file, rolled back."""
+from __future__ import annotations
+import argparse, json, os, tempfile, time
+import psycopg
+from app.config.db_setup import settings
+from app.service.csv_import import (
+    CHUNK_SIZE, COPY_STAGE, DDL_SALES_TABLE, DDL_STAGE, SCHEMA_DDL, _merge_staged, _start_line_numbers,
+)
+from bench.gen_sales_csv import generate
+
+SCANS = """
+SELECT relname, seq_scan FROM pg_stat_xact_user_tables
+WHERE relname IN ('sales_import', 'sales_typed')
+"""
+
+
+def write_csv(path: str, rows: int, seed: int = 42) -> None:
+    generate(path, rows, seed=seed)
+
+
+def run_engine(conn: psycopg.Connection, path: str, engine: str) -> dict:
+    with conn.cursor() as cur:
+        cur.execute(DDL_STAGE)
+        _start_line_numbers(cur, 2)
+        with open(path, "r", encoding="utf-8", newline="") as fh, cur.copy(COPY_STAGE) as cp:
+            for chunk in iter(lambda: fh.read(CHUNK_SIZE), ""):
+                cp.write(chunk)
+        cur.execute(SCANS)
+        before = dict(cur.fetchall())
+        t0 = time.perf_counter()
+        counts = _merge_staged(cur, "sales_import", False, engine=engine)
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        cur.execute(SCANS)
+        after = dict(cur.fetchall())
+    conn.rollback()
+    return {
+        "engine": engine,
+        "merge_ms": round(elapsed_ms, 1),
+        "stage_seq_scans": after.get("sales_import", 0) - before.get("sales_import", 0),
+        "typed_seq_scans": after.get("sales_typed", 0) - before.get("sales_typed", 0),
+        **counts,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--dsn", default=settings.database_url)
+    ap.add_argument("--rows", type=int, default=5_000_000)
+    ap.add_argument("--repeat", type=int, default=1)
+    args = ap.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        write_csv(path, args.rows)
+        with psycopg.connect(args.dsn) as conn:
+            with conn.cursor() as cur:
+                for ddl in (DDL_SALES_TABLE, *SCHEMA_DDL):
+                    cur.execute(ddl)
+            conn.commit()
+            for _ in range(args.repeat):
+                for engine in ("multi_pass", "single_pass"):
+                    print(json.dumps({"rows": args.rows, **run_engine(conn, path, engine)}), flush=True)
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
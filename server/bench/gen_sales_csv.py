@@ -0,0 +1,140 @@
+"""Deterministic synthetic sales CSVs in the import's 14-column format."""
+from __future__ import annotations
+import argparse, csv, gzip, hashlib, io, json, random, sys
+from datetime import date, timedelta
+from typing import Any, Dict, List, TextIO
+
+HEADER = [
+    "Region", "Country", "Item Type", "Sales Channel", "Order Priority",
+    "Order Date", "Order ID", "Ship Date", "Units Sold", "Unit Price",
+    "Unit Cost", "Total Revenue", "Total Cost", "Total Profit",
+]
+
+COUNTRIES = {
+    "Europe": ["Norway", "Germany", "France", "Portugal", "Poland", "Iceland"],
+    "Sub-Saharan Africa": ["South Africa", "Kenya", "Ghana", "Botswana", "Rwanda"],
+    "Asia": ["Japan", "Vietnam", "Mongolia", "Sri Lanka", "Laos"],
+    "Middle East and North Africa": ["Morocco", "Jordan", "Oman", "Tunisia"],
+    "Central America and the Caribbean": ["Panama", "Jamaica", "Honduras", "Haiti"],
+    "North America": ["Canada", "Mexico", "United States of America", "Greenland"],
+    "Australia and Oceania": ["Australia", "Fiji", "Samoa", "New Zealand"],
+}
+REGIONS = sorted(COUNTRIES)
+ITEM_TYPES = [
+    "Baby Food", "Beverages", "Cereal", "Clothes", "Cosmetics", "Fruits",
+    "Household", "Meat", "Office Supplies", "Personal Care", "Snacks", "Vegetables",
+]
+CHANNELS = ["Online", "Offline"]
+PRIORITIES = ["C", "H", "L", "M"]
+
+FIRST_DAY = date(2010, 1, 1)
+DAYS = 5000
+FIRST_ORDER_ID = 100_000_000
+
+# One way each to trip a validator check (csv_import.REJECT_REASON_EXPR).
+DIRTY_KINDS = ("order_id", "order_date", "ship_date", "units", "price", "missing")
+
+
+def _clean_row(rnd: random.Random, order_id: int) -> List[Any]:
+    region = rnd.choice(REGIONS)
+    od = FIRST_DAY + timedelta(days=rnd.randrange(DAYS))
+    units, price, cost = rnd.randrange(1, 10000), rnd.randrange(100, 70000) / 100, rnd.randrange(50, 50000) / 100
+    return [
+        region, rnd.choice(COUNTRIES[region]), rnd.choice(ITEM_TYPES), rnd.choice(CHANNELS), rnd.choice(PRIORITIES),
+        od.strftime("%m/%d/%Y"), order_id, (od + timedelta(days=rnd.randrange(50))).strftime("%m/%d/%Y"),
+        units, f"{price:.2f}", f"{cost:.2f}",
+        f"{units * price:.2f}", f"{units * cost:.2f}", f"{units * (price - cost):.2f}",
+    ]
+
+
+def _dirty(rnd: random.Random, row: List[Any]) -> List[Any]:
+    kind = rnd.choice(DIRTY_KINDS)
+    if kind == "order_id":
+        row[6] = f"X{row[6]}"
+    elif kind == "order_date":
+        row[5] = "13/32/2015"
+    elif kind == "ship_date":
+        row[7] = "not a date"
+    elif kind == "units":
+        row[8] = f"-{row[8]}"
+    elif kind == "price":
+        row[9] = "12,50"
+    else:
+        row[rnd.randrange(len(row))] = ""
+    return row
+
+
+def write_sales(
+    fh: TextIO,
+    rows: int,
+    *,
+    seed: int = 42,
+    dirty_ratio: float = 0.0,
+    dup_ratio: float = 0.0,
+    first_order_id: int = FIRST_ORDER_ID,
+) -> Dict[str, int]:
+    """Write a header and ``rows`` data rows to ``fh``, Order IDs from ``first_order_id``; returns what was written."""
+    rnd = random.Random(seed)
+    w = csv.writer(fh, lineterminator="\n")
+    w.writerow(HEADER)
+    next_id, dirty, dups = first_order_id, 0, 0
+    for _ in range(rows):
+        roll = rnd.random()
+        if roll < dup_ratio and next_id > first_order_id:
+            w.writerow(_clean_row(rnd, rnd.randrange(first_order_id, next_id)))
+            dups += 1
+        elif roll < dup_ratio + dirty_ratio:
+            w.writerow(_dirty(rnd, _clean_row(rnd, next_id)))
+            next_id += 1
+            dirty += 1
+        else:
+            w.writerow(_clean_row(rnd, next_id))
+            next_id += 1
+    return {
+        "rows": rows, "dirty": dirty, "duplicates": dups,
+        "first_order_id": first_order_id, "last_order_id": next_id - 1,
+    }
+
+
+def generate(path: str, rows: int, *, compress: bool = False, **options: Any) -> Dict[str, Any]:
+    """``write_sales`` to ``path`` (gzipped when ``compress``); adds the size and SHA-256."""
+    with open(path, "wb") as raw:
+        # mtime=0 and no file name in the header keep the bytes reproducible.
+        out = gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0) if compress else raw
+        with io.TextIOWrapper(out, encoding="utf-8", newline="") as fh:
+            stats = write_sales(fh, rows, **options)
+    h = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+            size += len(block)
+    return {"path": path, **stats, "gzip": compress, "bytes": size, "sha256": h.hexdigest()}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--dirty-ratio", type=float, default=0.0, help="fraction of rows the validator rejects")
+    ap.add_argument("--dup-ratio", type=float, default=0.0, help="fraction of rows repeating an earlier Order ID")
+    ap.add_argument("--first-order-id", type=int, default=FIRST_ORDER_ID)
+    ap.add_argument("--gzip", action="store_true", help="gzip the output")
+    ap.add_argument("--out", help="output file; stdout when omitted (no --gzip)")
+    args = ap.parse_args()
+    if args.dirty_ratio + args.dup_ratio > 1:
+        ap.error("--dirty-ratio and --dup-ratio add up to more than 1")
+
+    options = dict(
+        seed=args.seed, dirty_ratio=args.dirty_ratio, dup_ratio=args.dup_ratio, first_order_id=args.first_order_id,
+    )
+    if args.out is None:
+        if args.gzip:
+            ap.error("--gzip needs --out")
+        write_sales(sys.stdout, args.rows, **options)
+        return
+    print(json.dumps(generate(args.out, args.rows, compress=args.gzip, **options)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Benchmark suite: import throughput and read latency against one database."""
+from __future__ import annotations
+import argparse, json, os, platform, random, resource, subprocess, sys, tempfile, time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from psycopg_pool import ConnectionPool
+from app.config.db import connection
+from app.config.db_setup import settings
+from app.service.csv_import import import_sales_csv_detailed
+from app.service.sales_query import _enc, get_sales_by_id, query_sales_page
+from bench.gen_sales_csv import COUNTRIES, FIRST_ORDER_ID, ITEM_TYPES, generate
+
+# Metrics compared by --baseline, and whether higher is better.
+COMPARED = {"rows_per_sec": True, "ops_per_sec": True, "p50_ms": False, "p95_ms": False, "p99_ms": False}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def _pct(sorted_ms: List[float], p: float) -> float:
+    if not sorted_ms:
+        return float("nan")
+    return round(sorted_ms[min(len(sorted_ms) - 1, int(p / 100 * len(sorted_ms)))], 3)
+
+
+def run_imports(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    results = []
+    fd, path = tempfile.mkstemp(suffix=".csv.gz" if args.gzip else ".csv")
+    os.close(fd)
+    try:
+        for n in range(args.imports):
+            file = generate(
+                path, args.rows, compress=args.gzip, seed=args.seed + n,
+                dirty_ratio=args.dirty_ratio, dup_ratio=args.dup_ratio,
+                first_order_id=args.first_order_id + n * args.rows,
+            )
+            t0 = time.perf_counter()
+            with open(path, "rb") as fh:
+                r = import_sales_csv_detailed(fh, "bench", engine=args.engine, workers=args.workers, force=True)
+            elapsed = time.perf_counter() - t0
+            results.append({
+                "scenario": "import", "run": n, "engine": r.get("engine", args.engine), "workers": args.workers,
+                "rows": args.rows, "bytes": file["bytes"], "gzip": args.gzip, "sha256": file["sha256"],
+                "inserted": r["inserted"], "invalid_rows": r["invalid_rows"], "dup_in_file": r["dup_in_file"],
+                "seconds": round(elapsed, 3),
+                "rows_per_sec": round(args.rows / elapsed, 1),
+                "mb_per_sec": round(file["bytes"] / elapsed / (1 << 20), 2),
+                "phases_ms": r["phases_ms"], "peak_rss_mb": peak_rss_mb(),
+            })
+            print(json.dumps(results[-1]), flush=True)
+    finally:
+        os.remove(path)
+    return results
+
+
+def _deep_cursors(count: int, rnd: random.Random) -> List[str]:
+    """Cursors at random depths of the newest-first order (found outside the timing)."""
+    with connection.get_cursor() as cur:
+        cur.execute("SELECT count(*) FROM sales")
+        total = cur.fetchone()[0]
+        cursors = []
+        for _ in range(count if total else 0):
+            cur.execute(
+                "SELECT order_date, order_id FROM sales ORDER BY order_date DESC, order_id DESC OFFSET %s LIMIT 1",
+                [rnd.randrange(total)],
+            )
+            od, oid = cur.fetchone()
+            cursors.append(_enc(od, oid))
+    return cursors
+
+
+def _order_id_range() -> tuple:
+    with connection.get_cursor() as cur:
+        cur.execute("SELECT min(order_id), max(order_id) FROM sales")
+        lo, hi = cur.fetchone()
+    return (lo or FIRST_ORDER_ID), (hi or FIRST_ORDER_ID)
+
+
+def measure(name: str, op: Callable[[int], Any], iterations: int, warmup: int) -> Dict[str, Any]:
+    for i in range(warmup):
+        op(i)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        op(i)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    elapsed = time.perf_counter() - start
+    ms = sorted(latencies)
+    return {
+        "scenario": name, "iterations": iterations,
+        "ops_per_sec": round(iterations / elapsed, 1),
+        "p50_ms": _pct(ms, 50), "p95_ms": _pct(ms, 95), "p99_ms": _pct(ms, 99),
+        "max_ms": round(ms[-1], 3) if ms else float("nan"),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_queries(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    rnd = random.Random(args.seed)
+    first = args.first
+    cursors = _deep_cursors(args.deep_cursors, rnd)
+    lo, hi = _order_id_range()
+    # ~10% of lookups miss: ids past the end of the imported range.
+    ids = [rnd.randrange(lo, hi + 1 + (hi - lo) // 10 + 1) for _ in range(args.iterations)]
+    countries = [c for cs in COUNTRIES.values() for c in cs]
+    terms = [t.lower()[:5] for t in ITEM_TYPES]
+
+    def page(filter: Optional[Dict[str, Any]] = None, direction: str = "DESC", after: Optional[str] = None):
+        return query_sales_page(first, after, filter, direction)
+
+    scenarios: Dict[str, Callable[[int], Any]] = {
+        "page_first": lambda i: page(),
+        "page_first_asc": lambda i: page(direction="ASC"),
+        "page_country": lambda i: page({"country": countries[i % len(countries)]}),
+        "page_range": lambda i: page({"order_date_from": f"{2010 + i % 12}-01-01", "order_date_to": f"{2010 + i % 12}-03-31"}),
+        "page_profit": lambda i: page({"min_profit": 1_000_000 + (i % 10) * 100_000}),
+        "page_q": lambda i: page({"q": terms[i % len(terms)], "search_mode": "CONTAINS"}),
+        "page_q_ranked": lambda i: page({"q": terms[i % len(terms)], "search_mode": "RANKED"}),
+        "by_id": lambda i: get_sales_by_id(ids[i % len(ids)]),
+    }
+    if cursors:
+        scenarios["page_deep"] = lambda i: page(after=cursors[i % len(cursors)])
+
+    results = []
+    for name, op in scenarios.items():
+        if args.scenario and name not in args.scenario:
+            continue
+        try:
+            r = measure(name, op, args.iterations, args.warmup)
+        except ValueError as e:  # RANKED without pg_trgm
+            r = {"scenario": name, "skipped": str(e)}
+        results.append(r)
+        print(json.dumps(r), flush=True)
+    return results
+
+
+def environment(args: argparse.Namespace) -> Dict[str, Any]:
+    with connection.get_cursor() as cur:
+        cur.execute("SHOW server_version")
+        server_version = cur.fetchone()[0]
+        cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass('sales')")
+        row = cur.fetchone()
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "postgres": server_version,
+        "sales_rows_estimate": int(row[0]) if row and row[0] is not None else None,
+        "sales_partitioned": settings.sales_partitioned,
+        "args": {k: v for k, v in vars(args).items() if k not in ("dsn", "out", "baseline")},
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> List[Dict[str, Any]]:
+    """Per scenario, the change of each COMPARED metric against the baseline run (percent)."""
+    with open(baseline_path) as fh:
+        base = {(r["scenario"], r.get("run")): r for r in json.load(fh)["results"]}
+    deltas = []
+    for r in results:
+        b = base.get((r["scenario"], r.get("run")))
+        if b is None:
+            continue
+        d = {"scenario": r["scenario"], **({"run": r["run"]} if "run" in r else {})}
+        for metric, higher_is_better in COMPARED.items():
+            if metric in r and b.get(metric):
+                change = (r[metric] - b[metric]) / b[metric] * 100
+                d[f"{metric}_change_pct"] = round(change, 1)
+                d[f"{metric}_better"] = (change > 0) == higher_is_better if change else None
+        deltas.append(d)
+    return deltas
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--dsn", default=settings.database_url, help="a scratch database: the imports add rows to sales")
+    ap.add_argument("--rows", type=int, default=200_000, help="rows per generated file")
+    ap.add_argument("--imports", type=int, default=1, help="files to import, each with new Order IDs")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--dirty-ratio", type=float, default=0.01)
+    ap.add_argument("--dup-ratio", type=float, default=0.01)
+    ap.add_argument("--gzip", action="store_true")
+    ap.add_argument("--first-order-id", type=int, default=FIRST_ORDER_ID)
+    ap.add_argument("--engine", default="single_pass", help="multi_pass needs --dirty-ratio 0")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--skip-import", action="store_true", help="only time reads of the existing data")
+    ap.add_argument("--iterations", type=int, default=200, help="timed calls per read scenario")
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--first", type=int, default=50, help="page size")
+    ap.add_argument("--deep-cursors", type=int, default=50)
+    ap.add_argument("--scenario", action="append", help="only run this read scenario; repeatable")
+    ap.add_argument("--out", help="write meta and results as one JSON document")
+    ap.add_argument("--baseline", help="JSON document of an earlier run to compare against")
+    args = ap.parse_args()
+
+    connection._pool = ConnectionPool(args.dsn, min_size=1, max_size=max(2, args.workers + 1), open=True)
+    connection._read_pool = ConnectionPool(args.dsn, min_size=1, max_size=2, open=True)
+    meta = environment(args)
+    results = [] if args.skip_import else run_imports(args)
+    results += run_queries(args)
+
+    doc: Dict[str, Any] = {"meta": meta, "results": results}
+    if args.baseline:
+        doc["comparison"] = compare(results, args.baseline)
+        for d in doc["comparison"]:
+            print(json.dumps({"compare": d}), flush=True)
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(doc, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Concurrent salesPage load against running servers: latency percentiles per URL."""
+from __future__ import annotations
+import argparse, asyncio, json, statistics, time
+from urllib.parse import urlsplit
+
+QUERY = """
+query Page($first: Int!) {
+  salesPage(first: $first) {
+    edges { cursor node { orderId region country itemType orderDate totalProfit } }
+    pageInfo { endCursor hasNextPage }
+  }
+}
+"""
+
+
+def _request(url: str, first: int) -> bytes:
+    parts = urlsplit(url)
+    body = json.dumps({"query": QUERY, "variables": {"first": first}}).encode()
+    head = (
+        f"POST {parts.path or '/'} HTTP/1.1\r\n"
+        f"Host: {parts.netloc}\r\n"
+        "Content-Type: application/json\r\n"
+        "Accept: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: keep-alive\r\n\r\n"
+    )
+    return head.encode() + body
+
+
+async def _read_response(reader: asyncio.StreamReader) -> tuple:
+    """Read one response; returns (status, whether the connection stays open)."""
+    status = int((await reader.readline()).split()[1])
+    length, chunked, keep_alive = 0, False, True
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding" and "chunked" in value.lower():
+            chunked = True
+        elif name == "connection" and "close" in value.lower():
+            keep_alive = False
+    if not chunked:
+        await reader.readexactly(length)
+        return status, keep_alive
+    while (size := int((await reader.readline()).strip(), 16)):
+        await reader.readexactly(size + 2)
+    await reader.readline()
+    return status, keep_alive
+
+
+async def _client(url: str, payload: bytes, deadline: float, timeout: float, latencies: list, errors: list) -> None:
+    # A server that answers "Connection: close" (the Flask dev server does) is
+    # reconnected to; the connect time then counts towards that request.
+    parts = urlsplit(url)
+    writer = None
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            writer.write(payload)
+            await writer.drain()
+            status, keep_alive = await asyncio.wait_for(_read_response(reader), timeout)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError, IndexError) as e:
+            errors.append(repr(e))
+            keep_alive, status = False, None
+        else:
+            if status == 200:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors.append(status)
+        if not keep_alive and writer is not None:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+def _pct(sorted_ms: list, p: float) -> float:
+    if not sorted_ms:
+        return float("nan")
+    return round(sorted_ms[min(len(sorted_ms) - 1, int(p / 100 * len(sorted_ms)))], 2)
+
+
+async def run(url: str, clients: int, seconds: float, first: int, timeout: float) -> dict:
+    payload = _request(url, first)
+    latencies: list = []
+    errors: list = []
+    start = time.perf_counter()
+    deadline = start + seconds
+    await asyncio.gather(*(_client(url, payload, deadline, timeout, latencies, errors) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    ms = sorted(x * 1000 for x in latencies)
+    return {
+        "url": url, "clients": clients, "requests": len(ms), "errors": len(errors),
+        "rps": round(len(ms) / elapsed, 1),
+        "p50_ms": _pct(ms, 50), "p95_ms": _pct(ms, 95), "p99_ms": _pct(ms, 99),
+        "mean_ms": round(statistics.fmean(ms), 2) if ms else float("nan"),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--url", action="append", required=True, help="GraphQL endpoint; repeat to compare servers")
+    ap.add_argument("--clients", type=int, default=500)
+    ap.add_argument("--seconds", type=float, default=20.0)
+    ap.add_argument("--first", type=int, default=50)
+    ap.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    args = ap.parse_args()
+
+    for url in args.url:
+        print(json.dumps(asyncio.run(run(url, args.clients, args.seconds, args.first, args.timeout))), flush=True)
+
+
+if __name__ == "__main__":
+    main()
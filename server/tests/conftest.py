@@ -0,0 +1,24 @@
+import os
+import psycopg
+import pytest
+from app.config.db_setup import settings
+
+# Tests that touch PostgreSQL use the `db` fixture; TEST_DB_* override settings.
+_DB_ENV = {"db_host": "TEST_DB_HOST", "db_port": "TEST_DB_PORT", "db_name": "TEST_DB_NAME",
+           "db_user": "TEST_DB_USER", "db_password": "TEST_DB_PASSWORD"}
+
+
+@pytest.fixture(scope="session")
+def db():
+    for field, var in _DB_ENV.items():
+        if var in os.environ:
+            value = os.environ[var]
+            object.__setattr__(settings, field, int(value) if field == "db_port" else value)
+    try:
+        psycopg.connect(settings.database_url, connect_timeout=3).close()
+    except psycopg.Error as e:
+        pytest.skip(f"no test database at {settings.db_host}:{settings.db_port}: {e}")
+    from app.config.db.connection import init_pool
+    from app.service.csv_import import ensure_schema
+    init_pool(1, 10)
+    ensure_schema()
@@ -0,0 +1,69 @@
+import io
+from app.config.db.connection import get_cursor
+from app.service.arrow_import import HEADER, stage_arrow
+from app.service.csv_import import COPY_STAGE, DDL_STAGE, DDL_TYPED, STAGE_TYPED, _start_line_numbers
+
+VALID = ["Europe", "Norway", "Cereal", "Online", "H", "2/28/2020", "1001", "3/1/2020", "7",
+         "205.70", "117.11", "1439.90", "819.77", "620.13"]
+
+# (column, value) replacing one field of VALID; None leaves the field empty.
+EDGES = [
+    (None, None),
+    ("Region", None),
+    ("Region", '""'),
+    ("Order ID", "10x1"),
+    ("Order ID", "1234567890123456789"),
+    ("Order Date", "2/30/2020"),
+    ("Order Date", "13/01/2020"),
+    ("Order Date", "2/29/2021"),
+    ("Order Date", "2/29/2024"),
+    ("Ship Date", "1/1/0000"),
+    ("Units Sold", "-1"),
+    ("Units Sold", "1234567890"),
+    ("Unit Price", "1.2.3"),
+    ("Unit Price", "99999999.994"),
+    ("Unit Price", "99999999.995"),
+    ("Unit Price", "000000001.5"),
+    ("Unit Cost", "0.12345678901234567"),
+    ("Total Revenue", "12345678901234567"),
+    ("Total Cost", ""),
+    ("Total Profit", "-12.345"),
+    ("Total Profit", "--1"),
+    ("Total Profit", "-9999999999999999.995"),
+]
+
+TYPED_ROWS = "SELECT * FROM sales_typed ORDER BY line_no"
+
+
+def _csv() -> bytes:
+    lines = [",".join(HEADER)]
+    for col, value in EDGES:
+        row = list(VALID)
+        if col is not None:
+            row[HEADER.index(col)] = value or ""
+        lines.append(",".join(row))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def test_arrow_engine_matches_reject_reason_expr(db):
+    data = _csv()
+    with get_cursor() as cur:
+        cur.execute(DDL_STAGE)
+        _start_line_numbers(cur, 2)
+        with cur.copy(COPY_STAGE) as cp:
+            cp.write(data)
+        cur.execute(DDL_TYPED)
+        cur.execute(STAGE_TYPED.format(stage="sales_import"))
+        cur.execute(TYPED_ROWS)
+        expected = cur.fetchall()
+        cur.execute("TRUNCATE sales_typed")
+
+        assert stage_arrow(cur, io.BytesIO(data)) == (len(EDGES), sum(r[0] is None for r in expected))
+        cur.execute(TYPED_ROWS)
+        assert cur.fetchall() == expected
+        cur.connection.rollback()
+
+    reasons = [r[0] for r in expected]
+    assert reasons[:3] == [None, "missing_field", None]
+    assert {"bad_order_id", "bad_order_date", "bad_ship_date", "bad_units_sold", "bad_unit_price",
+            "bad_total_cost", "bad_total_profit", "out_of_range"} <= set(reasons)
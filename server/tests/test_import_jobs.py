@@ -0,0 +1,44 @@
+from app.models.schema import schema
+from app.service import import_jobs
+
+QUERY = "query($id: ID!) { importJob(id: $id) { status bytesTotal bytesCopied rowsStaged rowsInserted } }"
+
+
+def test_import_job_counters_past_32_bits():
+    job = import_jobs.ImportJob(
+        id="big", source="t", filename="big.csv", path="/nonexistent", update_on_conflict=False,
+        workers=None, bytes_total=3 << 30, status=import_jobs.RUNNING,
+        bytes_copied=(3 << 30) - 1, rows_staged=5_000_000_000, rows_inserted=2**31,
+    )
+    import_jobs._jobs[job.id] = job
+    try:
+        result = schema.execute_sync(QUERY, variable_values={"id": job.id})
+    finally:
+        import_jobs._jobs.pop(job.id, None)
+    assert result.errors is None
+    assert result.data["importJob"] == {
+        "status": "RUNNING", "bytesTotal": 3 << 30, "bytesCopied": (3 << 30) - 1,
+        "rowsStaged": 5_000_000_000, "rowsInserted": 2**31,
+    }
+
+
+def test_import_result_counters_past_32_bits():
+    big = 3_000_000_000
+    job = import_jobs.ImportJob(
+        id="done", source="t", filename="big.csv", path="/nonexistent", update_on_conflict=False,
+        workers=None, bytes_total=1, status=import_jobs.SUCCEEDED,
+        result={"inserted": big, "skipped_conflicts": big, "dup_in_file": big, "invalid_rows": big,
+                "total_rows": 4 * big, "duration_ms": 1.0, "source": "t", "update_mode": "DO_NOTHING"},
+    )
+    import_jobs._jobs[job.id] = job
+    try:
+        result = schema.execute_sync(
+            "query($id: ID!) { importJob(id: $id) { result { inserted skippedConflicts dupInFile invalidRows totalRows } } }",
+            variable_values={"id": job.id},
+        )
+    finally:
+        import_jobs._jobs.pop(job.id, None)
+    assert result.errors is None
+    assert result.data["importJob"]["result"] == {
+        "inserted": big, "skippedConflicts": big, "dupInFile": big, "invalidRows": big, "totalRows": 4 * big,
+    }
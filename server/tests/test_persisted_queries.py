@@ -0,0 +1,73 @@
+import hashlib, threading
+import pytest
+from app.models.schema import schema
+from app.service.persisted_queries import DocumentCache, _documents
+
+QUERY = "{ typename: __typename }"
+SHA = hashlib.sha256(QUERY.encode()).hexdigest()
+
+
+def _apq(sha, query=None):
+    body = {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": sha}}}
+    if query is not None:
+        body["query"] = query
+    return body
+
+
+@pytest.fixture(scope="module")
+def client(db):
+    from app.main import create_app
+    return create_app().test_client()
+
+
+def _error_code(resp):
+    return resp.get_json()["errors"][0]["extensions"]["code"]
+
+
+def test_unknown_hash_is_not_found(client):
+    resp = client.post("/graphql", json=_apq(hashlib.sha256(b"never sent").hexdigest()))
+    assert _error_code(resp) == "PERSISTED_QUERY_NOT_FOUND"
+
+
+def test_hash_mismatch(client):
+    resp = client.post("/graphql", json=_apq(SHA, "{ other: __typename }"))
+    assert _error_code(resp) == "PERSISTED_QUERY_HASH_MISMATCH"
+
+
+def test_registered_hash_is_served(client):
+    assert client.post("/graphql", json=_apq(SHA, QUERY)).get_json()["data"] == {"typename": "Query"}
+    assert client.post("/graphql", json=_apq(SHA)).get_json()["data"] == {"typename": "Query"}
+    assert client.post("/graphql", json=_apq(SHA.upper())).get_json()["data"] == {"typename": "Query"}
+
+
+def test_unsupported_version(client):
+    resp = client.post("/graphql", json={"query": QUERY, "extensions": {"persistedQuery": {"version": 2, "sha256Hash": SHA}}})
+    assert _error_code(resp) == "PERSISTED_QUERY_NOT_SUPPORTED"
+
+
+def test_documents_are_cached_once_valid():
+    query = "{ cachedOnce: __typename }"
+    assert schema.execute_sync(query).data == {"cachedOnce": "Query"}
+    document = _documents.get((id(schema), query))
+    assert document is not None
+    assert schema.execute_sync(query).data == {"cachedOnce": "Query"}
+    assert _documents.get((id(schema), query)) is document
+
+
+@pytest.mark.parametrize("query", ["{ noSuchField }", "{ unclosed"])
+def test_invalid_documents_are_reported_every_time(query):
+    for _ in range(2):
+        assert schema.execute_sync(query).errors
+    assert _documents.get((id(schema), query)) is None
+
+
+def test_execution_context_is_kept_per_thread():
+    # Strawberry assigns each request's context to the one shared extension instance.
+    ext = DocumentCache()
+    ext.execution_context = "main"
+    seen = []
+    thread = threading.Thread(target=lambda: (setattr(ext, "execution_context", "other"), seen.append(ext.execution_context)))
+    thread.start()
+    thread.join()
+    assert seen == ["other"]
+    assert ext.execution_context == "main"
@@ -0,0 +1,54 @@
+import io
+import pytest
+from app.config.db.connection import get_cursor
+from app.service.arrow_import import HEADER
+from app.service.csv_import import import_sales_csv_detailed
+from app.service.sales_checkpoints import sales_page_cursor
+from app.service.sales_query import _dec
+
+COUNTRY = "Checkpointia"
+FIRST_ID = 9_100_000_000
+
+
+@pytest.fixture(scope="module")
+def country_rows(db):
+    # Uneven days, so page boundaries fall inside days and on their edges.
+    lines, order_id = [",".join(HEADER)], FIRST_ID
+    for day in range(1, 16):
+        for _ in range((day % 4) * 5 + 1):
+            lines.append(f"Europe,{COUNTRY},Cereal,Online,H,3/{day}/2031,{order_id},3/20/2031,1,2.00,1.00,2.00,1.00,1.00")
+            order_id += 1
+    import_sales_csv_detailed(io.BytesIO(("\n".join(lines) + "\n").encode()), "test_sales_checkpoints.csv")
+    return order_id - FIRST_ID
+
+
+def _offset_row(skip, where, params, direction):
+    with get_cursor() as cur:
+        cur.execute(
+            f"SELECT order_date, order_id FROM sales {where}"
+            f" ORDER BY order_date {direction}, order_id {direction} OFFSET %s LIMIT 1",
+            params + [skip - 1],
+        )
+        return cur.fetchone()
+
+
+@pytest.mark.parametrize("direction", ["DESC", "ASC"])
+@pytest.mark.parametrize("first", [1, 7, 20])
+def test_page_jumps_match_offset_within_a_scope(country_rows, direction, first):
+    f = {"country": COUNTRY}
+    for page in range(2, country_rows // first + 2):
+        expected = _offset_row((page - 1) * first, "WHERE country = %s", [COUNTRY], direction)
+        assert _dec(sales_page_cursor(page, first, f, direction)) == tuple(expected)
+
+
+@pytest.mark.parametrize("direction", ["DESC", "ASC"])
+def test_page_jumps_match_offset_unscoped(country_rows, direction):
+    for page in (2, 3, 11):
+        expected = _offset_row((page - 1) * 9, "", [], direction)
+        assert _dec(sales_page_cursor(page, 9, None, direction)) == tuple(expected)
+
+
+def test_page_jump_past_the_end_lands_on_the_last_row(country_rows):
+    f = {"country": COUNTRY}
+    last = _offset_row(country_rows, "WHERE country = %s", [COUNTRY], "DESC")
+    assert _dec(sales_page_cursor(country_rows + 5, 1, f, "DESC")) == tuple(last)
@@ -0,0 +1,21 @@
+from app.models.schema import schema
+from app.service.sales_loader import CONTEXT_KEY
+
+QUERY = """
+query ($b: ID!) {
+  a: salesById(orderId: 1) { orderId }
+  b: salesById(orderId: $b) { orderId }
+  ... on Query { c: salesById(orderId: 3) { orderId } }
+  ...D
+}
+fragment D on Query { d: salesById(orderId: 4) { orderId } }
+"""
+
+
+def test_sibling_ids_are_loaded_in_one_batch(db):
+    ctx = {}
+    result = schema.execute_sync(QUERY, variable_values={"b": "2"}, context_value=ctx)
+    assert result.errors is None
+    assert set(result.data) == {"a", "b", "c", "d"}
+    # a, b and c together; d sits behind a named fragment and comes on its own.
+    assert ctx[CONTEXT_KEY].batches == 2
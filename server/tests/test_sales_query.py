@@ -0,0 +1,13 @@
+import pytest
+from app.service import sales_query
+from app.service.sales_query import query_sales_page
+
+
+def test_ranked_search_is_refused_without_its_index(db, monkeypatch):
+    monkeypatch.setattr(sales_query, "SEARCH_INDEX", "idx_sales_search_missing")
+    monkeypatch.setattr(sales_query, "_search_indexed", False)
+    with pytest.raises(ValueError, match="RANKED search is unavailable"):
+        query_sales_page(5, None, {"q": "Norway", "search_mode": "RANKED"})
+    # CONTAINS needs no index.
+    page = query_sales_page(5, None, {"q": "Norway", "search_mode": "CONTAINS"})
+    assert all("Norway" in e["node"]["country"] for e in page["edges"])
@@ -0,0 +1,50 @@
+import io
+import pytest
+from app.config.db.connection import get_cursor
+from app.service.arrow_import import HEADER
+from app.service.csv_import import ENGINES, import_sales_csv_detailed
+from app.service.sales_summary import ROLLUP_KEYS, ROLLUP_MEASURES
+
+ROLLUP = f"SELECT {ROLLUP_KEYS}, {ROLLUP_MEASURES} FROM sales_rollup_monthly WHERE country = %s ORDER BY 1, 5"
+FROM_SALES = f"""
+SELECT date_trunc('month', order_date)::date, region, country, item_type, sales_channel,
+       COUNT(*), SUM(units_sold), SUM(total_revenue), SUM(total_cost), SUM(total_profit)
+FROM sales WHERE country = %s GROUP BY 1, 2, 3, 4, 5 ORDER BY 1, 5"""
+
+
+def _import(country, first_id, rows, engine, update_on_conflict=False):
+    # rows: (order id offset, month/day, sales channel, units sold)
+    lines = [",".join(HEADER)]
+    for n, day, channel, units in rows:
+        lines.append(f"Europe,{country},Cereal,{channel},H,{day}/2032,{first_id + n},{day}/2032,"
+                     f"{units},2.00,1.00,{2 * units}.00,{units}.00,{units}.00")
+    data = io.BytesIO(("\n".join(lines) + "\n").encode())
+    import_sales_csv_detailed(data, "test_sales_rollups.csv", engine=engine,
+                              update_on_conflict=update_on_conflict, force=True)
+
+
+def _rollup(country):
+    with get_cursor() as cur:
+        return cur.execute(ROLLUP, [country]).fetchall(), cur.execute(FROM_SALES, [country]).fetchall()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_update_on_conflict_moves_rows_between_rollup_groups(db, engine):
+    country, first_id = f"Rollupia {engine}", 9_200_000_000 + ENGINES.index(engine) * 1000
+    # On a database an earlier run left these rows in, this import adds nothing.
+    _import(country, first_id, [(0, "1/5", "Online", 3), (1, "1/6", "Online", 4), (2, "2/1", "Offline", 5)], engine)
+    rollup, expected = _rollup(country)
+    assert rollup == expected
+
+    # 0 changes units, 1 moves from (Jan, Online) to (Mar, Offline), 2 is
+    # unchanged and 3 is new, listed twice: the last one wins.
+    rows = [(0, "1/5", "Online", 7), (1, "3/2", "Offline", 4), (2, "2/1", "Offline", 5),
+            (3, "3/9", "Offline", 1), (3, "3/9", "Offline", 2)]
+    _import(country, first_id, rows, engine, update_on_conflict=True)
+    rollup, expected = _rollup(country)
+    assert rollup == expected
+    assert [(r[0].month, r[4], r[5], r[6]) for r in rollup] == [(1, "Online", 1, 7), (2, "Offline", 1, 5), (3, "Offline", 2, 6)]
+
+    # Overwriting rows with their own values leaves the rollup as it was.
+    _import(country, first_id, rows[:3], engine, update_on_conflict=True)
+    assert _rollup(country)[0] == rollup